@@ -0,0 +1,7 @@
+"""Benchmarks for the elternbrief project.
+
+Every benchmark module can be run on its own, e.g.
+    python -m benchmarks.bench_admin
+It creates a throwaway in-memory database filled with a synthetic school
+and prints its timings.
+"""
@@ -0,0 +1,45 @@
+"""Benchmark for the admin changelists and change forms of large schools.
+
+Usage: python -m benchmarks.bench_admin [number of students]
+"""
+
+import sys
+
+from benchmarks.common import setup, create_school, measure, count_queries, \
+    report
+
+PAGES = [
+    ("Schüler-Liste", '/admin/letters/student/'),
+    ("Schüler-Liste, gefiltert", '/admin/letters/student/?class_group__id__exact=1'),
+    ("Schüler bearbeiten", '/admin/letters/student/1/change/'),
+    ("Brief-Liste", '/admin/letters/letter/'),
+    ("Brief bearbeiten", '/admin/letters/letter/1/change/'),
+    ("Nutzer bearbeiten", '/admin/auth/user/1/change/'),
+    ("Schüler-Suche", '/admin/autocomplete/?term=Nachname 1'
+     '&app_label=letters&model_name=profile&field_name=children'),
+]
+
+
+def main(students=20000):
+    setup()
+    school = create_school(students=students)
+
+    from django.test import Client
+
+    client = Client()
+    client.force_login(school['staff'])
+
+    rows = []
+    for name, url in PAGES:
+        def get():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+
+        queries = count_queries(get)
+        rows.append((name, queries, *measure(get, repeat=5)))
+
+    report(f"Admin mit {students} Schülern", rows)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
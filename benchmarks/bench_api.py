@@ -0,0 +1,89 @@
+"""Throughput benchmark for the JSON API.
+
+Every endpoint has a throughput target in requests per second for a single
+process and the default school size; the benchmark exits with status 1 if
+one of them is missed. The results grow with the letter's audience, so
+their throughput drops for larger schools.
+
+Usage: python -m benchmarks.bench_api [number of students]
+"""
+
+import json
+import sys
+
+from benchmarks.common import setup, create_school, measure, count_queries
+
+# Minimum requests per second per endpoint, including the overhead of
+# sessions, authentication and middleware of roughly 2 ms per request:
+TARGETS = {
+    "Kinder": 200,
+    "Briefe eines Kindes": 100,
+    "Brief": 100,
+    "Bestätigen": 80,
+    "Ergebnisse": 60,
+}
+
+
+def main(students=2000):
+    setup()
+    school = create_school(students=students)
+
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from letters.models import Response
+    from letters.pagination import student_letters
+
+    parent = User.objects.get(username='parent0')
+    student = parent.profile.children.get()
+    letter = student_letters(student).first()
+    letter.responseboolfield_set.create(description="Einverstanden?")
+    field = letter.responseboolfield_set.get()
+
+    client = Client()
+    client.force_login(parent)
+    staff_client = Client()
+    staff_client.force_login(school['staff'])
+
+    def confirm():
+        # Every confirmation needs a letter that has not been confirmed yet:
+        Response.objects.filter(letter=letter, student=student).delete()
+        return client.post(
+            f'/api/children/{student.id}/letters/{letter.id}/confirm/',
+            json.dumps({field.name: True}), content_type='application/json')
+
+    endpoints = [
+        ("Kinder", lambda: client.get('/api/children/')),
+        ("Briefe eines Kindes",
+         lambda: client.get(f'/api/children/{student.id}/letters/')),
+        ("Brief", lambda: client.get(
+            f'/api/children/{student.id}/letters/{letter.id}/')),
+        ("Bestätigen", confirm),
+        ("Ergebnisse", lambda: staff_client.get(
+            f'/api/letters/{letter.id}/results/')),
+    ]
+
+    print(f"JSON-API mit {students} Schülern")
+    print(f"{'':25} {'Queries':>8} {'Median (ms)':>12} {'Anfragen/s':>11} "
+          f"{'Ziel':>6}")
+
+    missed = False
+    for name, request in endpoints:
+        def call():
+            response = request()
+            assert response.status_code in (200, 201), \
+                (name, response.status_code)
+
+        queries = count_queries(call)
+        median = measure(call, repeat=50)[1]
+        throughput = 1000 / median
+        missed |= throughput < TARGETS[name]
+
+        print(f"{name:25} {queries:>8} {median:>12.2f} {throughput:>11.0f} "
+              f"{TARGETS[name]:>6}"
+              f"{'' if throughput >= TARGETS[name] else '  verfehlt'}")
+
+    sys.exit(1 if missed else 0)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,121 @@
+"""Benchmark for waiting clients under WSGI and ASGI.
+
+Clients waiting for events on /api/events/ are opened alongside a normal
+request to /api/children/, whose response time is measured.
+Under WSGI, every waiting client occupies one of a fixed number of worker
+threads, so the normal request is queued once all workers are busy.
+Under ASGI, waiting clients do not occupy a thread.
+
+Usage: python -m benchmarks.bench_asgi [number of WSGI workers]
+"""
+
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import setup, create_school
+
+# Seconds a waiting client waits for events:
+TIMEOUT = 2
+
+
+def wsgi_request(application, cookie, path, query=''):
+    """Send a GET request to a WSGI application and return its status."""
+
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SCRIPT_NAME': '', 'SERVER_NAME': 'testserver', 'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_COOKIE': cookie,
+        'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr,
+    }
+    b"".join(application(environ, lambda s, headers: status.append(s)))
+
+    return status[0]
+
+
+async def asgi_request(application, cookie, path, query=''):
+    """Send a GET request to an ASGI application and return its status."""
+
+    messages = []
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'root_path': '',
+        'query_string': query.encode(), 'scheme': 'http',
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+    }
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+
+    return messages[0]['status']
+
+
+def measure_wsgi(cookie, waiting, workers):
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(waiting):
+            executor.submit(wsgi_request, application, cookie,
+                            '/api/events/', 'after=0')
+        time.sleep(0.1)
+
+        start = time.perf_counter()
+        executor.submit(wsgi_request, application, cookie,
+                        '/api/children/').result()
+        return (time.perf_counter() - start) * 1000
+
+
+async def measure_asgi(cookie, waiting):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+    clients = [asyncio.ensure_future(asgi_request(
+        application, cookie, '/api/events/', 'after=0'))
+        for _ in range(waiting)]
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    await asgi_request(application, cookie, '/api/children/')
+    duration = (time.perf_counter() - start) * 1000
+
+    await asyncio.gather(*clients)
+    return duration
+
+
+def main(workers=8):
+    setup()
+    create_school(students=200)
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    settings.EVENTS_TIMEOUT = TIMEOUT
+    settings.EVENTS_POLL_INTERVAL = 0.1
+
+    client = Client()
+    client.force_login(User.objects.get(username='parent0'))
+    cookie = f"{settings.SESSION_COOKIE_NAME}=" \
+             f"{client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    print(f"Antwortzeit mit wartenden Clients ({workers} WSGI-Worker, "
+          f"{TIMEOUT} s Wartezeit)")
+    print(f"{'Wartende Clients':>16} {'WSGI (ms)':>10} {'ASGI (ms)':>10}")
+    for waiting in (0, workers // 2, workers, workers * 4, workers * 16):
+        wsgi = measure_wsgi(cookie, waiting, workers)
+        asgi = asyncio.run(measure_asgi(cookie, waiting))
+        print(f"{waiting:>16} {wsgi:>10.1f} {asgi:>10.1f}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,89 @@
+"""Benchmark for the startup of a worker process.
+
+Every run starts a fresh interpreter with -X importtime that sets up
+Django and loads the URLconf with all views, as a worker does before its
+first request. Reports the duration and peak memory of the start, the
+modules of the letters app and django_tables2 that were imported, and
+which rarely used modules were imported although no request needed them.
+
+Usage: python -m benchmarks.bench_startup [number of runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that are only needed by some pages and should be imported on
+# their first use:
+DEFERRED = ['csv', 'letters.tables', 'letters.user_import',
+            'letters.response_import']
+
+WORKER = """
+import resource, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print((time.perf_counter() - start) * 1000,
+      resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def start_worker():
+    """Start a worker process and return its import profile.
+
+    :return: Tuple of startup duration in milliseconds, peak resident
+        memory in KiB and a dictionary mapping module names to their
+        cumulative import time in microseconds
+    :rtype: tuple
+    """
+
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', WORKER],
+                            env=env, capture_output=True, text=True,
+                            check=True)
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative)
+
+    duration, memory = result.stdout.split()
+
+    return float(duration), int(memory), modules
+
+
+def main(runs=10):
+    durations = []
+    memory = []
+    for _ in range(runs):
+        duration, rss, modules = start_worker()
+        durations.append(duration)
+        memory.append(rss)
+
+    print(f"Start eines Workers ({runs} Läufe)")
+    print(f"{'Dauer (ms)':40} {min(durations):>10.1f} "
+          f"{statistics.median(durations):>12.1f}")
+    print(f"{'Speicher (MiB)':40} {min(memory) / 1024:>10.1f} "
+          f"{statistics.median(memory) / 1024:>12.1f}")
+
+    print()
+    print(f"{'Modul':40} {'Import, kumulativ (ms)':>23}")
+    app_modules = sorted(
+        ((time, name) for name, time in modules.items()
+         if name.split('.')[0] in ('letters', 'django_tables2')),
+        reverse=True)
+    for time, name in app_modules[:20]:
+        print(f"{name:40} {time / 1000:>23.1f}")
+
+    print()
+    loaded = [name for name in DEFERRED if name in modules]
+    print(f"Unnötig geladen: {', '.join(loaded) if loaded else 'nichts'}")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
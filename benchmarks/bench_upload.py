@@ -0,0 +1,62 @@
+"""Benchmark for uploading letter documents in the admin.
+
+Compares Django's default upload handlers, which buffer the document in a
+temporary file before the storage moves it, with DocumentUploadHandler,
+which streams it directly to its final location and hashes it.
+The storage only renames the temporary file if FILE_UPLOAD_TEMP_DIR is on
+the same file system as MEDIA_ROOT and copies it otherwise.
+
+Usage: python -m benchmarks.bench_upload [document size in MB]
+"""
+
+import shutil
+import sys
+import tempfile
+
+from benchmarks.common import setup, measure, count_queries, report
+
+def main(megabytes=40):
+    setup()
+
+    from django.contrib.auth.models import User
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client, override_settings
+    from letters.models import ClassGroup, Letter
+
+    class_group = ClassGroup.objects.create(name="5a")
+    client = Client()
+    client.force_login(User.objects.create_superuser(
+        'staff', 'staff@example.com', 'staff'))
+    content = b"%PDF-1.4\n" + b"x" * (megabytes * 1000000)
+
+    def upload():
+        data = {
+            'name': "Brief", 'teacher': "", 'date_published': '2020-01-01',
+            'date_due': '', 'classes_concerned': [class_group.id],
+            'document': SimpleUploadedFile("brief.pdf", content,
+                                           content_type='application/pdf'),
+        }
+        for prefix in ('responseboolfield_set', 'responseselectionfield_set'):
+            data.update({f'{prefix}-TOTAL_FORMS': 0,
+                         f'{prefix}-INITIAL_FORMS': 0})
+
+        response = client.post('/admin/letters/letter/add/', data)
+        assert response.status_code == 302, response.status_code
+
+    rows = []
+    for name, stream in (("Standard-Handler", False),
+                         ("DocumentUploadHandler", True)):
+        media_root = tempfile.mkdtemp()
+        with override_settings(STREAM_DOCUMENT_UPLOADS=stream,
+                               MEDIA_ROOT=media_root,
+                               DOCUMENT_MAX_SIZE=len(content)):
+            rows.append((name, count_queries(upload),
+                         *measure(upload, repeat=5)))
+        shutil.rmtree(media_root)
+        Letter.objects.all().delete()
+
+    report(f"Upload eines Dokuments mit {megabytes} MB", rows)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
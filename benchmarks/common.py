@@ -0,0 +1,140 @@
+"""Shared helpers for the benchmarks of the elternbrief project."""
+
+import os
+import statistics
+import time
+
+
+def setup():
+    """Set up Django and create an empty test database."""
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def create_school(students=2000, students_per_class=25, groups=50,
+                  groups_per_student=2, letters=100, parents_per_student=2):
+    """Fill the database with a synthetic school.
+
+    Everything is created with bulk inserts. Students are distributed
+    evenly over classes and groups; every letter concerns one class and
+    one group.
+
+    :return: Dictionary with the created staff user
+    :rtype: dict
+    """
+
+    from django.contrib.auth.models import User
+    from letters.models import ClassGroup, Group, Student, Letter, Profile
+
+    class_count = max(1, students // students_per_class)
+    ClassGroup.objects.bulk_create(
+        ClassGroup(name=f"{5 + i % 8}{chr(97 + i // 8 % 26)}{i // 208 or ''}")
+        for i in range(class_count))
+    class_ids = list(ClassGroup.objects.values_list('id', flat=True))
+
+    Group.objects.bulk_create(Group(name=f"Gruppe {i}") for i in range(groups))
+    group_ids = list(Group.objects.values_list('id', flat=True))
+
+    Student.objects.bulk_create(
+        Student(first_name=f"Vorname {i}", last_name=f"Nachname {i}",
+                class_group_id=class_ids[i % class_count])
+        for i in range(students))
+    student_ids = list(Student.objects.values_list('id', flat=True))
+
+    Student.groups.through.objects.bulk_create(
+        Student.groups.through(student_id=s,
+                               group_id=group_ids[(i + j) % groups])
+        for i, s in enumerate(student_ids) for j in range(groups_per_student))
+
+    # Parents are created without signals, so profiles are created here:
+    User.objects.bulk_create(
+        User(username=f"parent{i}", email=f"parent{i}@example.com")
+        for i in range(students * parents_per_student))
+    user_ids = list(User.objects.values_list('id', flat=True))
+    Profile.objects.bulk_create(Profile(user_id=u) for u in user_ids)
+    profile_ids = list(Profile.objects.values_list('id', flat=True))
+
+    Profile.children.through.objects.bulk_create(
+        Profile.children.through(
+            profile_id=profile_ids[i * parents_per_student + j],
+            student_id=s)
+        for i, s in enumerate(student_ids) for j in range(parents_per_student))
+
+    staff = User.objects.create_superuser('staff', 'staff@example.com',
+                                          'staff')
+
+    Letter.objects.bulk_create(
+        Letter(name=f"Brief {i}", teacher="Lehrkraft", created_by=staff,
+               document=f"documents/brief{i}.pdf")
+        for i in range(letters))
+    letter_ids = list(Letter.objects.values_list('id', flat=True))
+    Letter.classes_concerned.through.objects.bulk_create(
+        Letter.classes_concerned.through(
+            letter_id=l, classgroup_id=class_ids[i % class_count])
+        for i, l in enumerate(letter_ids))
+    Letter.groups_concerned.through.objects.bulk_create(
+        Letter.groups_concerned.through(
+            letter_id=l, group_id=group_ids[i % groups])
+        for i, l in enumerate(letter_ids))
+
+    return {'staff': staff}
+
+
+def measure(function, repeat=10):
+    """Call a function repeatedly and return timing statistics.
+
+    :param function: Function to be called without arguments
+    :param repeat: Number of calls
+    :type repeat: int
+    :return: Tuple of minimum and median duration in milliseconds
+    :rtype: tuple
+    """
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return min(durations), statistics.median(durations)
+
+
+def count_queries(function):
+    """Call a function once and return the number of database queries.
+
+    :param function: Function to be called without arguments
+    :return: Number of queries
+    :rtype: int
+    """
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as context:
+        function()
+
+    return len(context.captured_queries)
+
+
+def report(title, rows):
+    """Print a table of benchmark results.
+
+    :param title: Title of the benchmark
+    :type title: str
+    :param rows: List of (name, queries, min_ms, median_ms) tuples
+    :type rows: list
+    """
+
+    print(title)
+    print(f"{'':40} {'Queries':>8} {'Min (ms)':>10} {'Median (ms)':>12}")
+    for name, queries, minimum, median in rows:
+        print(f"{name:40} {queries:>8} {minimum:>10.1f} {median:>12.1f}")
@@ -0,0 +1,19 @@
+"""Django settings for running the benchmarks.
+
+Uses the project's settings, but with an in-memory SQLite database and
+debug mode turned off.
+"""
+
+from elternbrief.settings import *  # noqa: F401,F403
+
+SECRET_KEY = SECRET_KEY or 'benchmark'  # noqa: F405
+DEBUG = False
+ALLOWED_HOSTS = ['testserver']
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,23 @@
+"""
+ASGI config for elternbrief project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Long-polling requests to the events API and document downloads are
+asynchronous and do not occupy a worker when served via ASGI, e.g. with
+``uvicorn elternbrief.asgi:application``. All other views are synchronous,
+and Django runs them in a single shared thread under ASGI. Route only
+/api/events/ and /letters/document/ to this application and keep serving
+everything else via WSGI.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'elternbrief.settings')
+
+application = get_asgi_application()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+from datetime import timedelta
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -46,6 +47,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'letters.staticfiles.StaticFilesMiddleware',
+    'letters.tenants.SchoolMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,6 +76,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'elternbrief.wsgi.application'
+ASGI_APPLICATION = 'elternbrief.asgi.application'
 
 
 # Database
@@ -94,6 +98,9 @@ DATABASES = {
     }
 }
 
+# Keep 32 bit primary keys for existing tables:
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -113,6 +120,9 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Users may only log in at the school their profile belongs to:
+AUTHENTICATION_BACKENDS = ['letters.tenants.SchoolBackend']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.1/topics/i18n/
@@ -136,6 +146,25 @@ HOSTNAME = os.environ.get("HOSTNAME", default="localhost")
 STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 STATIC_URL = '/static/'
 
+# Static files are collected with hashed names and precompressed, see
+# letters/staticfiles.py. Files with hashed names may be cached by browsers
+# for STATIC_MAX_AGE:
+STATICFILES_STORAGE = 'letters.staticfiles.StaticFilesStorage'
+STATIC_MAX_AGE = timedelta(days=365)
+
+# Front-end libraries installed by 'yarn install':
+NODE_MODULES = os.path.join(BASE_DIR, 'node_modules')
+STATICFILES_DIRS = [
+    ('vendor/bootstrap', os.path.join(NODE_MODULES, 'bootstrap/dist/js')),
+    ('vendor/bs-custom-file-input',
+     os.path.join(NODE_MODULES, 'bs-custom-file-input/dist')),
+    ('vendor/ionicons', os.path.join(NODE_MODULES, 'ionicons/dist')),
+    ('vendor/jquery', os.path.join(NODE_MODULES, 'jquery/dist')),
+    ('vendor/montserrat', os.path.join(NODE_MODULES, '@fontsource/montserrat')),
+    ('vendor/pdfjs', os.path.join(NODE_MODULES, 'pdfjs-dist/build')),
+    ('vendor/popper', os.path.join(NODE_MODULES, 'popper.js/dist/umd')),
+]
+
 # Uploaded files
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'upload-files/')
@@ -159,3 +188,71 @@ EMAIL_USE_TLS = True
 EMAIL_USE_SSL = False
 DEFAULT_FROM_EMAIL = ''
 SERVER_EMAIL = ''
+
+# Number of mails sent over one SMTP connection at once
+MAIL_BATCH_SIZE = 100
+
+# Collect new letter notifications and send one digest mail per parent
+# instead of one mail per letter, student and parent.
+# Digests are sent by running 'manage.py send_digest' periodically:
+NEW_LETTER_DIGEST = False
+NEW_LETTER_DIGEST_WINDOW = timedelta(hours=1)
+
+# Cache for rendered page fragments and derived data.
+# Use a cache shared by all processes (e.g. memcached or FileBasedCache)
+# when running several worker processes.
+# Keys are prefixed with the school of the current request:
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'KEY_FUNCTION': 'letters.tenants.make_key',
+    }
+}
+
+# Logins are rejected without checking the password once there have been
+# this many failed logins from one IP address or for one username within
+# LOGIN_FAILURES_WINDOW, see letters/throttling.py. The counters are kept
+# in the cache LOGIN_THROTTLE_CACHE, which has to be shared by all worker
+# processes:
+LOGIN_FAILURES_PER_IP = 30
+LOGIN_FAILURES_PER_USERNAME = 5
+LOGIN_FAILURES_WINDOW = timedelta(minutes=15)
+LOGIN_THROTTLE_CACHE = 'default'
+
+# Seconds for which rendered parts of letter pages and the compiled
+# response fields of letters are cached. Both are renewed whenever the
+# letter or its fields change:
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Number of letters shown per child on the letters overview at once:
+LETTERS_PAGE_SIZE = 20
+
+# With EVENTS_LONG_POLL, requests to the events API wait up to
+# EVENTS_TIMEOUT seconds for new events, checking the cache every
+# EVENTS_POLL_INTERVAL seconds, and parents' overviews reload once there
+# are any. Waiting requests occupy a worker under WSGI, so only enable it
+# if the project is served via ASGI. Otherwise requests return at once and
+# clients are asked to poll again after EVENTS_RETRY seconds.
+# Events are kept for EVENTS_KEEP:
+EVENTS_LONG_POLL = False
+EVENTS_TIMEOUT = 25
+EVENTS_POLL_INTERVAL = 1
+EVENTS_RETRY = 60
+EVENTS_KEEP = timedelta(days=1)
+
+# Documents of letters uploaded by staff members are streamed to the media
+# directory while being uploaded, unless STREAM_DOCUMENT_UPLOADS is
+# disabled. Only PDF files up to DOCUMENT_MAX_SIZE bytes are accepted:
+STREAM_DOCUMENT_UPLOADS = True
+DOCUMENT_MAX_SIZE = 50 * 1000 * 1000
+DOCUMENT_CONTENT_TYPES = ['application/pdf', 'application/x-pdf']
+
+# 'manage.py extract_documents' stores smaller variants of documents,
+# which are served instead of the originals. JPEG images in documents are
+# recompressed with DOCUMENT_IMAGE_QUALITY if Pillow is installed:
+DOCUMENT_OPTIMIZATION = True
+DOCUMENT_IMAGE_QUALITY = 75
+
+# Letters published longer ago than this are moved to the archive
+# by running 'manage.py archive_letters':
+ARCHIVE_LETTERS_AFTER = timedelta(days=365)
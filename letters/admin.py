@@ -8,13 +8,143 @@ It registers all necessary models to allow staff members to
 - Create and edit groups that students can be assigned to.
 """
 
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.template.response import TemplateResponse
 from django.urls import reverse
+from django.utils.functional import cached_property
+from .bulk import move_students, add_students_to_group, add_classes_to_group, \
+    copy_letters, students_in, remove_students_from_group, intersect_group, \
+    set_group_members
+from .forms import ClassGroupChoiceForm, GroupChoiceForm, AudienceForm, \
+    LetterForm, GroupMembershipForm, ThrottledAdminAuthenticationForm
 from .models import Group, ClassGroup, Letter, Student, Profile, \
     ResponseTextField, ResponseBoolField, \
-    ResponseSelectionField
+    ResponseSelectionField, ArchivedLetter, School, LoginThrottle
+from .search import search
+from .tenants import for_current_school, current_school_id
+from .throttling import failures, rejections, reset
+from .uploads import streams_documents
+
+
+# Tables with more rows than this are counted using the database's estimate:
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Counts of the objects of a school are cached for this many seconds:
+SCHOOL_COUNT_TIMEOUT = 10 * 60
+SCHOOL_COUNT_KEY = 'letters:admin_count:{}'
+
+
+def estimate_row_count(model):
+    """Return an estimate of the number of rows of a model's table.
+
+    Counting all rows of a large table means scanning it completely, while
+    the database keeps an estimate that can be retrieved instantly.
+    On SQLite the highest primary key is used as an estimate.
+
+    The database only estimates whole tables, which all schools share. If
+    there is a current school, its objects are counted instead and the
+    count is cached for SCHOOL_COUNT_TIMEOUT seconds.
+
+    :param model: Model whose rows should be counted
+    :return: Estimated number of rows or None if no estimate is available
+    :rtype: int
+    """
+
+    if current_school_id() is not None:
+        # Cache keys are prefixed with the current school:
+        return cache.get_or_set(
+            SCHOOL_COUNT_KEY.format(model._meta.label_lower),
+            model._default_manager.count, SCHOOL_COUNT_TIMEOUT)
+
+    connection = connections[model.objects.db]
+    table = model._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                           "WHERE TABLE_SCHEMA = DATABASE() "
+                           "AND TABLE_NAME = %s", [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s",
+                           [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f"SELECT MAX({model._meta.pk.column}) "
+                           f"FROM {connection.ops.quote_name(table)}")
+        else:
+            return None
+
+        row = cursor.fetchone()
+
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that does not count the rows of large unfiltered tables.
+
+    Extends Django's Paginator class.
+    If the list is not filtered and the table is larger than
+    ESTIMATED_COUNT_THRESHOLD, the estimate of estimate_row_count is used
+    instead of a full COUNT(*). The filter of the current school added by
+    SchoolManager does not count as a filter.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and query.where == self.object_list.model \
+                ._default_manager.all().query.where:
+            estimate = estimate_row_count(self.object_list.model)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+
+        return super().count
+
+
+def bulk_action(modeladmin, request, queryset, form_class, title, apply):
+    """Run an admin action that needs additional input.
+
+    Show an intermediate page with a form asking for the action's
+    parameters first. Once that form has been submitted and is valid, call
+    apply with the form's cleaned data and show its result message.
+
+    :param modeladmin: ModelAdmin the action belongs to
+    :param request: Current request
+    :param queryset: Objects selected in the changelist
+    :param form_class: Form asking for the action's parameters
+    :param title: Title of the intermediate page
+    :type title: str
+    :param apply: Function performing the action, returns a result message
+    :return: Intermediate page or None to return to the changelist
+    """
+
+    if 'apply' in request.POST:
+        form = form_class(request.POST)
+        if form.is_valid():
+            modeladmin.message_user(request, apply(form.cleaned_data),
+                                    messages.SUCCESS)
+            return None
+    else:
+        form = form_class()
+
+    context = {
+        **modeladmin.admin_site.each_context(request),
+        'title': title,
+        'opts': modeladmin.model._meta,
+        'form': form,
+        'count': queryset.count(),
+        'preview': queryset[:20],
+        'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        'select_across': request.POST.get('select_across', 0),
+        'action': request.POST['action'],
+    }
+
+    return TemplateResponse(request, 'admin/letters/bulk_action.html', context)
 
 
 class ParentInline(admin.StackedInline):
@@ -31,6 +161,9 @@ class ParentInline(admin.StackedInline):
     can_delete = False
     verbose_name = "Elternteil"
 
+    # Search children instead of rendering all students into the page:
+    autocomplete_fields = ('children',)
+
 
 # Add ParentInline to the admin interface for the user model:
 admin.site.unregister(User)
@@ -55,6 +188,39 @@ class UserAdmin(BaseUserAdmin):
         else:
             return []
 
+    # Only show users of the current school:
+    def get_queryset(self, request):
+        return for_current_school(super().get_queryset(request),
+                                  'profile__school')
+
+
+@admin.register(School)
+class SchoolAdmin(admin.ModelAdmin):
+    """Admin interface for the schools sharing this deployment.
+
+    Only superusers that belong to no school may manage schools.
+    """
+
+    list_display = ('name', 'hostname')
+    search_fields = ('name', 'hostname')
+
+    def has_module_permission(self, request):
+        profile = getattr(request.user, 'profile', None)
+        return request.user.is_superuser \
+            and (profile is None or profile.school_id is None)
+
+    def has_view_permission(self, request, obj=None):
+        return self.has_module_permission(request)
+
+    def has_add_permission(self, request):
+        return self.has_module_permission(request)
+
+    def has_change_permission(self, request, obj=None):
+        return self.has_module_permission(request)
+
+    def has_delete_permission(self, request, obj=None):
+        return self.has_module_permission(request)
+
 
 class ResponseTextFieldInline(admin.StackedInline):
     """Inline for response text fields.
@@ -104,6 +270,7 @@ class LetterAdmin(admin.ModelAdmin):
     ResponseBoolFields as well as ResponseSelectionFields.
     """
 
+    form = LetterForm
     inlines = (ResponseBoolFieldInline, ResponseSelectionFieldInline)
     fieldsets = [
         (None, {'fields': ['name', 'confirmation', 'teacher', 'document']}),
@@ -118,6 +285,58 @@ class LetterAdmin(admin.ModelAdmin):
     # Add filters to list view:
     list_filter = ('date_published', 'date_due', 'classes_concerned', 'groups_concerned')
 
+    # Search groups and classes instead of rendering them all into the page:
+    autocomplete_fields = ('groups_concerned', 'classes_concerned')
+
+    # Searches use the full-text index, see get_search_results:
+    search_fields = ('name',)
+
+    # Avoid counting all letters twice for every page:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    actions = ('copy_to_audience',)
+
+    def get_urls(self):
+        """Stream documents uploaded to the add and change views."""
+
+        urls = super().get_urls()
+        info = self.model._meta.app_label, self.model._meta.model_name
+        for url in urls:
+            if url.name in ('%s_%s_add' % info, '%s_%s_change' % info):
+                url.callback = streams_documents(url.callback)
+
+        return urls
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search letters by name, teacher and document text.
+
+        Uses the full-text search index instead of LIKE queries.
+        """
+
+        if not search_term:
+            return queryset, False
+
+        return search(queryset, search_term), False
+
+    def copy_to_audience(self, request, queryset):
+        """Copy selected letters including their response fields.
+
+        Admin action that asks for the classes and groups the copies should
+        concern.
+        """
+
+        def apply(data):
+            copies = copy_letters(queryset, data['classes'], data['groups'],
+                                  request.user)
+            return f"{len(copies)} Briefe wurden kopiert."
+
+        return bulk_action(self, request, queryset, AudienceForm,
+                           "Briefe für andere Schüler kopieren", apply)
+
+    copy_to_audience.short_description = \
+        "Ausgewählte Briefe für andere Schüler kopieren"
+
     def view_on_site(self, obj):
         """View results of this letter.
 
@@ -127,7 +346,6 @@ class LetterAdmin(admin.ModelAdmin):
 
         return reverse('letters:letter_result', kwargs={'letter_id': obj.id})
 
-
     def save_model(self, request, obj, form, change):
         """Save this model to the database.
 
@@ -137,12 +355,16 @@ class LetterAdmin(admin.ModelAdmin):
 
         This method is called automatically when someone hits 'save' in the
         admin interface.
+        Also report the throughput of a document upload.
         """
 
         if not obj.created_by:
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
 
+        for upload in getattr(request, 'document_uploads', []):
+            messages.info(request, f"Dokument hochgeladen: {upload}")
+
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -151,15 +373,211 @@ class StudentAdmin(admin.ModelAdmin):
     # Add class group and names to list view as separate fields:
     list_display = ('class_group', 'last_name', 'first_name')
     list_display_links = ('first_name', 'last_name')
+    list_select_related = ('class_group',)
+    ordering = ('last_name', 'first_name')
 
     # Add filters to list view:
     list_filter = ('class_group', 'groups')
 
+    # Allow searching students, also needed for autocomplete fields:
+    search_fields = ('last_name', 'first_name', 'class_group__name')
+    autocomplete_fields = ('class_group', 'groups')
+
+    # Avoid counting all students twice for every page:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    actions = ('move_to_class_group', 'add_to_group')
+
+    def move_to_class_group(self, request, queryset):
+        """Move selected students to another class group.
+
+        Admin action that asks for the new class group.
+        """
+
+        def apply(data):
+            count = move_students(queryset, data['class_group'])
+            return f"{count} Schüler wurden in die Klasse " \
+                   f"{data['class_group']} verschoben."
+
+        return bulk_action(self, request, queryset, ClassGroupChoiceForm,
+                           "Schüler in andere Klasse verschieben", apply)
+
+    move_to_class_group.short_description = \
+        "Ausgewählte Schüler in andere Klasse verschieben"
+
+    def add_to_group(self, request, queryset):
+        """Add selected students to a group.
+
+        Admin action that asks for the group.
+        """
+
+        def apply(data):
+            count = add_students_to_group(queryset, data['group'])
+            return f"{count} Schüler wurden zur Gruppe {data['group']} " \
+                   f"hinzugefügt."
+
+        return bulk_action(self, request, queryset, GroupChoiceForm,
+                           "Schüler zu Gruppe hinzufügen", apply)
+
+    add_to_group.short_description = "Ausgewählte Schüler zu Gruppe hinzufügen"
+
+    def get_search_results(self, request, queryset, search_term):
+        """Return students matching the search term.
+
+        Fetch each student's class group along with it, because it is part of
+        the student's string representation shown in autocomplete results.
+        """
+
+        queryset, use_distinct = super().get_search_results(request, queryset,
+                                                            search_term)
+        return queryset.select_related('class_group'), use_distinct
+
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    """Custom admin interface for Group model."""
+
+    ordering = ('name',)
+    search_fields = ('name',)
+    actions = ('change_members',)
+
+    def change_members(self, request, queryset):
+        """Change the members of the selected groups by a set operation.
+
+        Admin action that asks for the operation and the classes and
+        groups whose students are added, kept or removed.
+        """
+
+        def apply(data):
+            students = students_in(data['classes'], data['groups'])
+            added = removed = 0
+            for group in queryset:
+                if data['operation'] == GroupMembershipForm.ADD:
+                    added += add_students_to_group(students, group)
+                elif data['operation'] == GroupMembershipForm.INTERSECT:
+                    removed += intersect_group(group, students)
+                elif data['operation'] == GroupMembershipForm.REMOVE:
+                    removed += remove_students_from_group(students, group)
+                else:
+                    group_removed, group_added = \
+                        set_group_members(group, students)
+                    removed += group_removed
+                    added += group_added
+
+            return f"{added} Mitgliedschaften hinzugefügt, {removed} entfernt."
+
+        return bulk_action(self, request, queryset, GroupMembershipForm,
+                           "Mitglieder der Gruppen ändern", apply)
+
+    change_members.short_description = \
+        "Mitglieder der ausgewählten Gruppen ändern"
+
+
+@admin.register(ClassGroup)
+class ClassGroupAdmin(admin.ModelAdmin):
+    """Custom admin interface for ClassGroup model."""
+
+    ordering = ('name',)
+    search_fields = ('name',)
+    actions = ('add_students_to_group',)
+
+    def add_students_to_group(self, request, queryset):
+        """Add all students of the selected class groups to a group.
+
+        Admin action that asks for the group.
+        """
+
+        def apply(data):
+            count = add_classes_to_group(queryset, data['group'])
+            return f"{count} Schüler wurden zur Gruppe {data['group']} " \
+                   f"hinzugefügt."
+
+        return bulk_action(self, request, queryset, GroupChoiceForm,
+                           "Klassen zu Gruppe hinzufügen", apply)
+
+    add_students_to_group.short_description = \
+        "Alle Schüler der ausgewählten Klassen zu Gruppe hinzufügen"
+
+
+@admin.register(ArchivedLetter)
+class ArchivedLetterAdmin(admin.ModelAdmin):
+    """Read-only admin interface for ArchivedLetter model.
+
+    Archived letters can neither be added nor changed.
+    Their results can be viewed via 'view on site'.
+    """
+
+    list_display = ('name', 'date_published', 'date_due', 'date_archived')
+    list_filter = ('date_published',)
+    search_fields = ('name', 'teacher')
+    exclude = ('original_id', 'audience', 'response_fields')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def view_on_site(self, obj):
+        """View results of this archived letter."""
+
+        return reverse('letters:archived_letter_result',
+                       kwargs={'archived_id': obj.id})
+
+
+@admin.register(LoginThrottle)
+class LoginThrottleAdmin(admin.ModelAdmin):
+    """Read-only admin interface for LoginThrottle model.
+
+    Shows which IP addresses and usernames have been throttled and lets
+    staff members lift throttles early.
+    """
+
+    list_display = ('__str__', 'recent_rejections', 'recent_failures',
+                    'first_rejected', 'last_rejected')
+    list_filter = ('kind',)
+    search_fields = ('value',)
+    ordering = ('-last_rejected',)
+    actions = ('lift',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def recent_failures(self, obj):
+        """Failed logins within the current sliding window."""
+
+        return round(failures(obj.kind, obj.value))
+
+    recent_failures.short_description = "Aktuelle Fehlversuche"
+
+    def recent_rejections(self, obj):
+        """Rejected logins within the current sliding window."""
+
+        return round(rejections(obj.kind, obj.value))
+
+    recent_rejections.short_description = "Aktuell abgewiesen"
+
+    def lift(self, request, queryset):
+        """Forget the failed logins of the selected throttles."""
+
+        count = 0
+        for throttle in queryset:
+            reset(throttle.kind, throttle.value)
+            throttle.delete()
+            count += 1
+
+        self.message_user(request, f"{count} Anmeldesperren aufgehoben.",
+                          messages.SUCCESS)
+
+    lift.short_description = "Ausgewählte Anmeldesperren aufheben"
 
-# Register models with the default ModelAdmin:
-admin.site.register(Group)
-admin.site.register(ClassGroup)
 
 # Change site name:
 admin.site.site_header = "Elternbrief Verwaltung"
-admin.site.site_title = "Elternbrief Verwaltung"
\ No newline at end of file
+admin.site.site_title = "Elternbrief Verwaltung"
+# Reject throttled logins before checking the password:
+admin.site.login_form = ThrottledAdminAuthenticationForm
\ No newline at end of file
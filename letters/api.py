@@ -0,0 +1,342 @@
+"""JSON API for the letters app of the elternbrief project.
+
+The API offers the data of the parent and staff pages to other clients,
+e.g. a mobile app. It uses the same session authentication as the rest
+of the site; POST requests need a CSRF token in the X-CSRFToken header.
+
+All data is fetched with values() querysets, so no model instances are
+created, and serialized without indentation or whitespace.
+"""
+
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+from django.http import JsonResponse, HttpResponseNotAllowed
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+
+from .audience import result_students
+from .events import last_event_id, wait_for_events
+from .models import Letter, Student, Response
+from .pagination import student_letters, letters_page
+from .schema import response_schema
+
+LETTER_FIELDS = ('id', 'name', 'date_published', 'date_due', 'teacher',
+                 'confirmation')
+
+
+def _json(data, status=200):
+    """Return a compact JSON response.
+
+    :param data: Dictionary to be serialized
+    :type data: dict
+    :param status: HTTP status code
+    :type status: int
+    :return: JSON response
+    """
+
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'separators': (',', ':')})
+
+
+def _error(message, status):
+    """Return a JSON response containing an error message.
+
+    :param message: Human-readable error message
+    :type message: str
+    :param status: HTTP status code
+    :type status: int
+    :return: JSON response
+    """
+
+    return _json({'error': message}, status=status)
+
+
+def login_required(view):
+    """Answer requests by users that are not logged in with 401."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error("Bitte loggen Sie sich ein.", 401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _child(request, student_id):
+    """Return a child of the current user.
+
+    :param request: Current request
+    :param student_id: ID of the student
+    :type student_id: int
+    :return: Student object with only id and class group loaded, or None if
+        the student is no child of the user
+    :rtype: Student
+    """
+
+    return Student.objects.filter(id=student_id, profile__user=request.user) \
+        .only('id', 'class_group_id').first()
+
+
+def _letter(student, letter_id):
+    """Return a published letter concerning a student.
+
+    :param student: Student the letter concerns
+    :type student: Student
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: Dictionary of the letter's fields and its 'viewed' and
+        'confirmed' flags, or None if there is no such letter
+    :rtype: dict
+    """
+
+    return _with_flags(student_letters(student), student) \
+        .filter(id=letter_id).values(*LETTER_FIELDS, 'document', 'viewed',
+                                     'confirmed').first()
+
+
+def _with_flags(query, student):
+    """Annotate letters with whether a student has confirmed them.
+
+    :param query: QuerySet of letters as returned by student_letters
+    :param student: Student the letters concern
+    :type student: Student
+    :return: QuerySet annotated with 'confirmed'
+    """
+
+    return query.annotate(confirmed=Exists(Response.objects.filter(
+        letter_id=OuterRef('pk'), student_id=student.id)))
+
+
+@require_GET
+@login_required
+def children(request):
+    """Return the children of the current user.
+
+    :param request: Current request
+    :return: JSON response
+    """
+
+    return _json({'children': list(
+        Student.objects.filter(profile__user=request.user)
+        .order_by('last_name', 'first_name')
+        .values('id', 'first_name', 'last_name',
+                class_group_name=F('class_group__name')))})
+
+
+@require_GET
+@login_required
+def letters(request, student_id):
+    """Return one page of the letters concerning a child of the user.
+
+    The query parameter 'viewed' (0 or 1) filters by view state, 'cursor'
+    selects the page following the cursor returned by a previous request.
+
+    :param request: Current request
+    :param student_id: ID of the student
+    :type student_id: int
+    :return: JSON response
+    """
+
+    student = _child(request, student_id)
+    if student is None:
+        return _error("Für diesen Schüler dürfen Sie keine Briefe betrachten.",
+                      403)
+
+    viewed = request.GET.get('viewed')
+    viewed = None if viewed is None else viewed == '1'
+    query = _with_flags(student_letters(student, viewed), student) \
+        .values(*LETTER_FIELDS, 'viewed', 'confirmed')
+
+    try:
+        page, cursor = letters_page(student, cursor=request.GET.get('cursor'),
+                                    query=query)
+    except ValueError:
+        return _error("Ungültiger Cursor.", 400)
+
+    return _json({'letters': page, 'cursor': cursor})
+
+
+@require_GET
+@login_required
+def letter(request, student_id, letter_id):
+    """Return a letter and the definitions of its response fields.
+
+    Like the detail page, this marks the letter as viewed.
+
+    :param request: Current request
+    :param student_id: ID of the student the letter is viewed for
+    :type student_id: int
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: JSON response
+    """
+
+    student = _child(request, student_id)
+    if student is None:
+        return _error("Für diesen Schüler dürfen Sie keine Briefe betrachten.",
+                      403)
+
+    data = _letter(student, letter_id)
+    if data is None:
+        return _error("Dieser Brief betrifft nicht diesen Schüler.", 404)
+
+    if not data['viewed']:
+        Letter.students_viewed.through.objects.bulk_create(
+            [Letter.students_viewed.through(letter_id=letter_id,
+                                            student_id=student_id)],
+            ignore_conflicts=True)
+
+    data['document'] = reverse('letters:letter_document',
+                               kwargs={'letter_id': letter_id})
+    data['fields'] = response_schema(letter_id).definitions() \
+        if data['confirmation'] else []
+
+    return _json(data)
+
+
+@require_POST
+@login_required
+def confirm(request, student_id, letter_id):
+    """Confirm a letter.
+
+    The request body is a JSON object mapping the names of the letter's
+    response fields to their values.
+
+    :param request: Current request
+    :param student_id: ID of the student the letter is confirmed for
+    :type student_id: int
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: JSON response
+    """
+
+    student = _child(request, student_id)
+    if student is None:
+        return _error("Für diesen Schüler dürfen Sie keine Briefe bestätigen.",
+                      403)
+
+    data = _letter(student, letter_id)
+    if data is None:
+        return _error("Dieser Brief betrifft nicht diesen Schüler.", 404)
+    if not data['confirmation']:
+        return _error("Dieser Brief muss nicht bestätigt werden.", 400)
+    if data['confirmed']:
+        return _error("Für diesen Brief und diesen Schüler liegt bereits "
+                      "eine Bestätigung vor.", 409)
+
+    try:
+        submitted = json.loads(request.body or '{}')
+        content = response_schema(letter_id).validate(submitted)
+    except (ValueError, AttributeError) as e:
+        return _error(str(e) or "Ungültige Anfrage.", 400)
+
+    response = Response.objects.create(letter_id=letter_id,
+                                       student_id=student_id,
+                                       content=json.dumps(content))
+
+    return _json({'response_date': response.response_date}, status=201)
+
+
+@require_GET
+@login_required
+def results(request, letter_id):
+    """Return the responses to a letter.
+
+    Every student concerned by the letter is listed, including students
+    who have responded and left the letter's audience since.
+    May only be requested by staff members.
+
+    :param request: Current request
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: JSON response
+    """
+
+    if not request.user.is_staff:
+        return _error("Nur für Lehrkräfte.", 403)
+
+    data = Letter.objects.filter(id=letter_id).values(*LETTER_FIELDS).first()
+    if data is None:
+        return _error("Brief nicht gefunden.", 404)
+
+    responses = {r['student_id']: r for r in Response.objects
+                 .filter(letter_id=letter_id)
+                 .values('student_id', 'response_date', 'content')}
+
+    students = result_students(letter_id) \
+        .order_by('class_group__name', 'last_name', 'first_name') \
+        .values('id', 'first_name', 'last_name',
+                class_group_name=F('class_group__name'))
+
+    data['fields'] = response_schema(letter_id).definitions()
+    data['results'] = []
+    for student in students:
+        response = responses.get(student['id'])
+        try:
+            content = json.loads(response['content']) if response else None
+        except json.JSONDecodeError:
+            content = None
+
+        data['results'].append({
+            'student': student,
+            'confirmed': response is not None,
+            'response_date': response['response_date'] if response else None,
+            'content': content,
+        })
+
+    return _json(data)
+
+
+async def events(request):
+    """Wait for new letters and confirmations.
+
+    Without the query parameter 'after', the ID of the latest event is
+    returned immediately. With it, the request returns as soon as there
+    are events after that ID or after EVENTS_TIMEOUT seconds without
+    events. Clients pass the returned cursor with their next request,
+    after waiting for the returned number of seconds to retry.
+
+    This view is asynchronous, so waiting clients do not occupy a worker
+    when the project is served via ASGI. Under WSGI they would, so the
+    view only waits if EVENTS_LONG_POLL is enabled and otherwise returns
+    at once, asking clients to retry after EVENTS_RETRY seconds.
+
+    Django's view decorators do not support asynchronous views yet, so
+    request method and login are checked here.
+
+    :param request: Current request
+    :return: JSON response
+    """
+
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    # Loading the user queries the database:
+    user = await sync_to_async(
+        lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return _error("Bitte loggen Sie sich ein.", 401)
+
+    retry = 0 if settings.EVENTS_LONG_POLL else settings.EVENTS_RETRY
+
+    if 'after' not in request.GET:
+        return _json({'events': [],
+                      'cursor': await sync_to_async(last_event_id)(),
+                      'retry': retry})
+
+    try:
+        after = int(request.GET['after'])
+    except ValueError:
+        return _error("Ungültiger Cursor.", 400)
+
+    events = await wait_for_events(
+        user, after, None if settings.EVENTS_LONG_POLL else 0)
+
+    return _json({'events': events,
+                  'cursor': events[-1]['id'] if events else after,
+                  'retry': retry})
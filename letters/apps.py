@@ -11,3 +11,13 @@ class LettersConfig(AppConfig):
 
     name = 'letters'
     verbose_name = "Elternbriefe"
+
+    def ready(self):
+        """Connect signal handlers.
+
+        Called automatically once the app registry is fully populated.
+        """
+
+        # Importing the modules registers their signal receivers:
+        from . import audience, events, extraction, family, indexes, mail, \
+            schema, search, throttling  # noqa: F401
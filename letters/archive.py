@@ -0,0 +1,150 @@
+"""Archival of old letters for the letters app of the elternbrief project.
+
+Letters, their responses and the rows recording which students have
+viewed them would otherwise grow forever, and every query for the letters
+of a student would have to scan all of them.
+Letters older than ARCHIVE_LETTERS_AFTER are therefore moved to the
+ArchivedLetter and ArchivedResponse tables, which are read-only and only
+used for showing results to staff members.
+Uploaded documents are kept.
+"""
+
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .audience import group_bitmaps
+from .models import Letter, Student, Response, ArchivedLetter, \
+    ArchivedResponse
+
+
+def letters_to_archive(age=None):
+    """Return all letters that are old enough to be archived.
+
+    A letter is archived once its publication is longer ago than age and
+    its deadline, if there is one, has passed.
+
+    :param age: Minimum age of letters; defaults to ARCHIVE_LETTERS_AFTER
+    :type age: datetime.timedelta
+    :return: QuerySet of Letter objects
+    """
+
+    today = timezone.localdate()
+    cutoff = today - (age or settings.ARCHIVE_LETTERS_AFTER)
+
+    return Letter.objects.filter(date_published__lt=cutoff) \
+        .exclude(date_due__gte=today)
+
+
+def _archive_batch(letter_ids):
+    """Move a batch of letters to the archive.
+
+    Responses, view rows, response fields and students of all letters are
+    fetched with one query each. Members of groups are taken from their
+    cached bitmaps.
+
+    :param letter_ids: IDs of the letters to be archived
+    :type letter_ids: list
+    :return: Number of letters archived
+    :rtype: int
+    """
+
+    letters = list(Letter.objects.filter(id__in=letter_ids).prefetch_related(
+        'classes_concerned', 'groups_concerned', 'responsetextfield_set',
+        'responseboolfield_set', 'responseselectionfield_set'))
+
+    responses = {(r.letter_id, r.student_id): r for r in
+                 Response.objects.filter(letter_id__in=letter_ids)}
+    viewed = set(Letter.students_viewed.through.objects
+                 .filter(letter_id__in=letter_ids)
+                 .values_list('letter_id', 'student_id'))
+
+    class_ids = {c.id for letter in letters
+                 for c in letter.classes_concerned.all()}
+    group_ids = {g.id for letter in letters
+                 for g in letter.groups_concerned.all()}
+    members_of = group_bitmaps(group_ids)
+    # Students that have responded may have left the audience since:
+    students = list(Student.objects.filter(
+        Q(class_group__in=class_ids) | Q(groups__in=group_ids)
+        | Q(id__in={student_id for (_, student_id) in responses}))
+        .select_related('class_group').distinct())
+
+    rows = []
+    for letter in letters:
+        classes = list(letter.classes_concerned.all())
+        groups = list(letter.groups_concerned.all())
+
+        response_fields = \
+            [{'name': f.name, 'description': f.description, 'type': 'text'}
+             for f in letter.responsetextfield_set.all()] + \
+            [{'name': f.name, 'description': f.description, 'type': 'bool'}
+             for f in letter.responseboolfield_set.all()] + \
+            [{'name': f.name, 'description': f.description, 'type': 'selection'}
+             for f in letter.responseselectionfield_set.all()]
+
+        archived = ArchivedLetter.objects.create(
+            original_id=letter.id, school_id=letter.school_id,
+            name=letter.name,
+            date_published=letter.date_published, date_due=letter.date_due,
+            teacher=letter.teacher, confirmation=letter.confirmation,
+            document=letter.document, created_by_id=letter.created_by_id,
+            audience=json.dumps({'classes': [c.name for c in classes],
+                                 'groups': [g.name for g in groups]}),
+            response_fields=json.dumps(response_fields))
+
+        letter_classes = {c.id for c in classes}
+        letter_members = 0
+        for group in groups:
+            letter_members |= members_of.get(group.id, 0)
+
+        for student in students:
+            response = responses.get((letter.id, student.id))
+            if response is None \
+                    and student.class_group_id not in letter_classes \
+                    and not letter_members >> student.id & 1:
+                continue
+            rows.append(ArchivedResponse(
+                letter=archived, student=student,
+                last_name=student.last_name, first_name=student.first_name,
+                class_group=student.class_group.name,
+                viewed=(letter.id, student.id) in viewed,
+                confirmed=response is not None,
+                response_date=response.response_date if response else None,
+                content=response.content if response else '{}'))
+
+    ArchivedResponse.objects.bulk_create(rows)
+
+    # Responses, response fields and view rows are deleted along with them:
+    Letter.objects.filter(id__in=letter_ids).delete()
+
+    return len(letters)
+
+
+def archive_letters(letters=None, batch_size=50):
+    """Move letters to the archive.
+
+    Letters are archived in batches, each batch in its own transaction.
+
+    :param letters: Letters to be archived; defaults to all letters returned
+        by letters_to_archive
+    :param batch_size: Number of letters archived per transaction
+    :type batch_size: int
+    :return: Number of letters archived
+    :rtype: int
+    """
+
+    if letters is None:
+        letters = letters_to_archive()
+
+    letter_ids = [getattr(letter, 'id', letter) for letter in letters]
+
+    count = 0
+    for i in range(0, len(letter_ids), batch_size):
+        with transaction.atomic():
+            count += _archive_batch(letter_ids[i:i + batch_size])
+
+    return count
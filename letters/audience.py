@@ -0,0 +1,379 @@
+"""Audiences of letters as bitmaps of student ids.
+
+The students of every class group and every group are kept in Django's
+cache as bitmaps: Python integers in which bit n is set if the student
+with ID n is a member. The audience of a letter is the union of the
+bitmaps of its classes and groups, and the students who still have to
+confirm it are the audience minus the bitmap of the students who have
+responded. These set operations work on whole integers at once, so the
+results page, the overview of staff members and the reminders count
+outstanding confirmations without fetching any students.
+
+Students are fetched with audience_students and outstanding_students
+instead, which select them by subqueries rather than by lists of ids, so
+they can be ordered and paginated by the database.
+
+Bitmaps are rebuilt with one query for all missing classes or groups.
+They are removed from the cache whenever memberships change, either one
+by one via m2m_changed or all at once via audience_changed after bulk
+operations. A version token in the cache lets all worker processes
+notice changes of all bitmaps, just like the family map does.
+"""
+
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import ClassGroup, Group, Letter, Response, Student
+from .signals import audience_changed
+
+CACHE_VERSION_KEY = 'letters:audience_version'
+CLASS_KEY = 'letters:audience:{}:class:{}'
+GROUP_KEY = 'letters:audience:{}:group:{}'
+
+# Positions of the set bits of every byte:
+_BITS = [tuple(bit for bit in range(8) if value >> bit & 1)
+         for value in range(256)]
+
+
+def bitmap(ids):
+    """Return the bitmap of some ids.
+
+    :param ids: Iterable of non-negative integers
+    :rtype: int
+    """
+
+    ids = list(ids)
+    if not ids:
+        return 0
+
+    data = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        data[i >> 3] |= 1 << (i & 7)
+
+    return int.from_bytes(data, 'little')
+
+
+def members(ids_bitmap):
+    """Return the ids contained in a bitmap.
+
+    :param ids_bitmap: Bitmap of ids
+    :type ids_bitmap: int
+    :return: Sorted list of ids
+    :rtype: list
+    """
+
+    data = ids_bitmap.to_bytes((ids_bitmap.bit_length() + 7) // 8, 'little')
+
+    return [index * 8 + bit for index, value in enumerate(data) if value
+            for bit in _BITS[value]]
+
+
+def count(ids_bitmap):
+    """Return the number of ids contained in a bitmap.
+
+    :param ids_bitmap: Bitmap of ids
+    :type ids_bitmap: int
+    :rtype: int
+    """
+
+    return bin(ids_bitmap).count("1")
+
+
+def _version():
+    return cache.get_or_set(CACHE_VERSION_KEY, lambda: uuid4().hex, None)
+
+
+def _bitmaps(key, ids, pairs):
+    """Return cached bitmaps, building the missing ones with one query.
+
+    :param key: Format string of the cache keys
+    :type key: str
+    :param ids: IDs of the class groups or groups
+    :param pairs: Function returning (id, student_id) pairs for a list of
+        class group or group ids
+    :return: Dictionary mapping each id to its bitmap
+    :rtype: dict
+    """
+
+    version = _version()
+    keys = {key.format(version, i): i for i in ids}
+    cached = cache.get_many(keys)
+    bitmaps = {keys[k]: value for k, value in cached.items()}
+
+    missing = [i for k, i in keys.items() if k not in cached]
+    if missing:
+        students = {i: [] for i in missing}
+        for i, student_id in pairs(missing):
+            students[i].append(student_id)
+        built = {i: bitmap(student_ids) for i, student_ids in students.items()}
+
+        cache.set_many({key.format(version, i): value
+                        for i, value in built.items()},
+                       settings.FRAGMENT_CACHE_TIMEOUT)
+        bitmaps.update(built)
+
+    return bitmaps
+
+
+def class_bitmaps(class_ids):
+    """Return the bitmaps of the students of some class groups.
+
+    :param class_ids: IDs of the class groups
+    :return: Dictionary mapping each class group id to its bitmap
+    :rtype: dict
+    """
+
+    return _bitmaps(CLASS_KEY, class_ids, lambda ids: Student.objects.filter(
+        class_group_id__in=ids).values_list('class_group_id', 'id'))
+
+
+def group_bitmaps(group_ids):
+    """Return the bitmaps of the members of some groups.
+
+    :param group_ids: IDs of the groups
+    :return: Dictionary mapping each group id to its bitmap
+    :rtype: dict
+    """
+
+    return _bitmaps(GROUP_KEY, group_ids, lambda ids: Student.groups.through
+                    .objects.filter(group_id__in=ids)
+                    .values_list('group_id', 'student_id'))
+
+
+def audiences(letter_ids):
+    """Return the bitmaps of all students concerned by some letters.
+
+    :param letter_ids: IDs of the letters
+    :return: Dictionary mapping each letter id to its bitmap
+    :rtype: dict
+    """
+
+    letter_ids = list(letter_ids)
+    classes = list(Letter.classes_concerned.through.objects
+                   .filter(letter_id__in=letter_ids)
+                   .values_list('letter_id', 'classgroup_id'))
+    groups = list(Letter.groups_concerned.through.objects
+                  .filter(letter_id__in=letter_ids)
+                  .values_list('letter_id', 'group_id'))
+
+    classes_bitmaps = class_bitmaps({i for _, i in classes})
+    groups_bitmaps = group_bitmaps({i for _, i in groups})
+
+    students = dict.fromkeys(letter_ids, 0)
+    for letter_id, class_id in classes:
+        students[letter_id] |= classes_bitmaps[class_id]
+    for letter_id, group_id in groups:
+        students[letter_id] |= groups_bitmaps[group_id]
+
+    return students
+
+
+def audience(letter_id):
+    """Return the bitmap of all students concerned by a letter.
+
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :rtype: int
+    """
+
+    return audiences([letter_id])[letter_id]
+
+
+def confirmations(letter_ids):
+    """Return the bitmaps of all students who have responded to some letters.
+
+    Include students who have left the letters' audience since.
+
+    :param letter_ids: IDs of the letters
+    :return: Dictionary mapping each letter id to its bitmap
+    :rtype: dict
+    """
+
+    students = {i: [] for i in letter_ids}
+    for letter_id, student_id in Response.objects \
+            .filter(letter_id__in=list(students)) \
+            .values_list('letter_id', 'student_id'):
+        students[letter_id].append(student_id)
+
+    return {i: bitmap(student_ids) for i, student_ids in students.items()}
+
+
+def confirmed(letter_id):
+    """Return the bitmap of all students who have responded to a letter.
+
+    Includes students who have left the letter's audience since.
+
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :rtype: int
+    """
+
+    return confirmations([letter_id])[letter_id]
+
+
+def outstanding(letter_id):
+    """Return the bitmap of all students who have not responded to a letter.
+
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :rtype: int
+    """
+
+    return audience(letter_id) & ~confirmed(letter_id)
+
+
+def outstanding_counts(letter_ids):
+    """Return how many students have not responded to some letters yet.
+
+    Takes three queries for any number of letters once the bitmaps of
+    their classes and groups are cached.
+
+    :param letter_ids: IDs of the letters
+    :return: Dictionary mapping each letter id to the number of students
+    :rtype: dict
+    """
+
+    letter_ids = list(letter_ids)
+    confirmed_bitmaps = confirmations(letter_ids)
+
+    return {i: count(students & ~confirmed_bitmaps[i])
+            for i, students in audiences(letter_ids).items()}
+
+
+def audience_students(letter_id):
+    """Return all students concerned by a letter.
+
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: QuerySet of Student objects
+    """
+
+    class_ids = Letter.classes_concerned.through.objects \
+        .filter(letter_id=letter_id).values('classgroup_id')
+    group_ids = Letter.groups_concerned.through.objects \
+        .filter(letter_id=letter_id).values('group_id')
+    member_ids = Student.groups.through.objects \
+        .filter(group_id__in=group_ids).values('student_id')
+
+    return Student.objects.filter(Q(class_group__in=class_ids)
+                                  | Q(id__in=member_ids))
+
+
+def responded(letter_id):
+    """Return whether a student has responded to a letter.
+
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: Expression for annotating or filtering Student querysets
+    :rtype: Exists
+    """
+
+    return Exists(Response.objects.filter(letter_id=letter_id,
+                                          student=OuterRef('pk')))
+
+
+def outstanding_students(letter_id):
+    """Return all students who have not responded to a letter.
+
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: QuerySet of Student objects
+    """
+
+    return audience_students(letter_id).filter(~responded(letter_id))
+
+
+def result_students(letter_id):
+    """Return all students shown in the results of a letter.
+
+    These are the students concerned by the letter and those who have
+    responded to it, who may have left its audience since.
+
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: QuerySet of Student objects annotated with 'responded'
+    """
+
+    return Student.objects.annotate(responded=responded(letter_id)).filter(
+        Q(id__in=audience_students(letter_id).values('id'))
+        | Q(responded=True))
+
+
+def invalidate_audiences():
+    """Mark the bitmaps of all class groups and groups as outdated."""
+
+    cache.set(CACHE_VERSION_KEY, uuid4().hex, None)
+
+
+def _invalidate_groups(group_ids):
+    version = _version()
+    cache.delete_many([GROUP_KEY.format(version, i) for i in group_ids])
+
+
+def _on_commit_too(function, *args):
+    """Call a function now and again after the current transaction.
+
+    The second call removes bitmaps that were built from the old
+    memberships in the meantime.
+    """
+
+    function(*args)
+    transaction.on_commit(lambda: function(*args))
+
+
+@receiver(audience_changed)
+def invalidate_on_audience_changed(sender, **kwargs):
+    """Invalidate all bitmaps after students have been changed in bulk.
+
+    The signal is only sent after the transaction has been committed.
+    """
+
+    invalidate_audiences()
+
+
+@receiver(m2m_changed, sender=Student.groups.through)
+def invalidate_on_groups_changed(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    """Invalidate the bitmaps of groups whose members have changed."""
+
+    if action in ('post_add', 'post_remove'):
+        _on_commit_too(_invalidate_groups,
+                       [instance.id] if reverse else list(pk_set))
+    elif action == 'post_clear':
+        _on_commit_too(invalidate_audiences)
+
+
+@receiver(post_save, sender=Student)
+def invalidate_on_student_saved(sender, instance, created, **kwargs):
+    """Invalidate the bitmaps after a student has been saved.
+
+    A new student only changes the bitmap of their class group, but an
+    existing one may have been moved from a class group that is unknown
+    here.
+    """
+
+    if created:
+        _on_commit_too(lambda: cache.delete(
+            CLASS_KEY.format(_version(), instance.class_group_id)))
+    else:
+        _on_commit_too(invalidate_audiences)
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=ClassGroup)
+@receiver(post_delete, sender=Group)
+def invalidate_on_delete(sender, **kwargs):
+    """Invalidate the bitmaps after a student, class or group was deleted.
+
+    Deleting a student removes its memberships without sending
+    m2m_changed, and the IDs of deleted class groups and groups may be
+    used again.
+    """
+
+    _on_commit_too(invalidate_audiences)
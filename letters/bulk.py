@@ -0,0 +1,239 @@
+"""Bulk operations on students, groups and letters.
+
+Every operation runs in a single transaction and changes all affected rows
+with a few set-based statements instead of saving objects one by one.
+Instead of one signal per row, audience_changed is sent once after the
+transaction has been committed.
+"""
+
+from django.db import transaction
+
+from .models import Student, Letter, ResponseTextField, ResponseBoolField, \
+    ResponseSelectionField
+from .signals import audience_changed
+
+
+def _ids(objects):
+    """Return list of primary keys of a QuerySet or an iterable of objects.
+
+    :param objects: QuerySet, iterable of model instances or of ids
+    :return: List of primary keys
+    :rtype: list
+    """
+
+    if hasattr(objects, 'values_list'):
+        return list(objects.values_list('pk', flat=True))
+
+    return [getattr(obj, 'pk', obj) for obj in objects]
+
+
+def _audience_changed(student_ids):
+    """Send audience_changed once the current transaction is committed.
+
+    :param student_ids: IDs of all affected students
+    :type student_ids: list
+    """
+
+    transaction.on_commit(lambda: audience_changed.send(
+        sender=Student, student_ids=student_ids))
+
+
+@transaction.atomic
+def move_students(students, class_group):
+    """Move students to another class group with one UPDATE.
+
+    :param students: Students to be moved
+    :param class_group: New class group of the students
+    :type class_group: ClassGroup
+    :return: Number of students moved
+    :rtype: int
+    """
+
+    student_ids = _ids(students)
+    count = Student.objects.filter(id__in=student_ids) \
+        .update(class_group=class_group)
+    _audience_changed(student_ids)
+
+    return count
+
+
+@transaction.atomic
+def add_students_to_group(students, group):
+    """Add students to a group with one bulk INSERT.
+
+    Students that already are members of the group are skipped.
+
+    :param students: Students to be added
+    :param group: Group the students are added to
+    :type group: Group
+    :return: Number of students added
+    :rtype: int
+    """
+
+    student_ids = _ids(students)
+    through = Student.groups.through
+    members = set(through.objects.filter(group=group,
+                                         student_id__in=student_ids)
+                  .values_list('student_id', flat=True))
+    new_ids = [s for s in student_ids if s not in members]
+
+    through.objects.bulk_create(
+        through(student_id=s, group_id=group.id) for s in new_ids)
+    _audience_changed(new_ids)
+
+    return len(new_ids)
+
+
+def _id_query(objects):
+    """Return something to filter primary keys by with __in.
+
+    QuerySets are used as subqueries, so that large sets of students are
+    not sent to the database as one parameter per student.
+
+    :param objects: QuerySet, iterable of model instances or of ids
+    :return: QuerySet of primary keys or list of primary keys
+    """
+
+    if hasattr(objects, 'values'):
+        return objects.values('pk')
+
+    return _ids(objects)
+
+
+def students_in(class_groups=(), groups=()):
+    """Return all students of some class groups and groups.
+
+    :param class_groups: Class groups whose students are returned
+    :param groups: Groups whose members are returned
+    :return: QuerySet of students
+    """
+
+    student_ids = Student.objects \
+        .filter(class_group__in=_ids(class_groups)).values('pk') \
+        .union(Student.groups.through.objects
+               .filter(group__in=_ids(groups)).values('student_id'))
+
+    return Student.objects.filter(id__in=student_ids)
+
+
+@transaction.atomic
+def remove_students_from_group(students, group):
+    """Remove students from a group with one bulk DELETE.
+
+    :param students: Students to be removed
+    :param group: Group the students are removed from
+    :type group: Group
+    :return: Number of students removed
+    :rtype: int
+    """
+
+    rows = Student.groups.through.objects.filter(
+        group=group, student_id__in=_id_query(students))
+    student_ids = list(rows.values_list('student_id', flat=True))
+
+    # Deleting by the subquery fails on MySQL if it reads the same table:
+    Student.groups.through.objects.filter(
+        group=group, student_id__in=student_ids).delete()
+    _audience_changed(student_ids)
+
+    return len(student_ids)
+
+
+@transaction.atomic
+def intersect_group(group, students):
+    """Remove all members of a group that are not among some students.
+
+    :param group: Group whose members are removed
+    :type group: Group
+    :param students: Students that remain members of the group
+    :return: Number of students removed
+    :rtype: int
+    """
+
+    rows = Student.groups.through.objects.filter(group=group) \
+        .exclude(student_id__in=_id_query(students))
+    student_ids = list(rows.values_list('student_id', flat=True))
+
+    # Deleting by the subquery fails on MySQL if it reads the same table:
+    Student.groups.through.objects.filter(
+        group=group, student_id__in=student_ids).delete()
+    _audience_changed(student_ids)
+
+    return len(student_ids)
+
+
+@transaction.atomic
+def set_group_members(group, students):
+    """Make some students the only members of a group.
+
+    :param group: Group whose members are replaced
+    :type group: Group
+    :param students: New members of the group
+    :return: Number of students removed and number of students added
+    :rtype: tuple
+    """
+
+    return intersect_group(group, students), \
+        add_students_to_group(students, group)
+
+
+def add_classes_to_group(class_groups, group):
+    """Add all students of some class groups to a group.
+
+    :param class_groups: Class groups whose students are added
+    :param group: Group the students are added to
+    :type group: Group
+    :return: Number of students added
+    :rtype: int
+    """
+
+    return add_students_to_group(
+        Student.objects.filter(class_group__in=_ids(class_groups)), group)
+
+
+@transaction.atomic
+def copy_letters(letters, classes, groups, user=None):
+    """Copy letters including their response fields to another audience.
+
+    The copies are created one by one, so that parents are notified as for
+    any other new letter. Their response fields and audience are created
+    with one bulk INSERT per table for all copies together.
+
+    :param letters: Letters to be copied
+    :param classes: Class groups concerned by the copies
+    :param groups: Groups concerned by the copies
+    :param user: User that is registered as creator of the copies
+    :type user: User
+    :return: List of the new Letter objects
+    :rtype: list
+    """
+
+    class_ids = _ids(classes)
+    group_ids = _ids(groups)
+
+    copies = {}
+    for letter in Letter.objects.filter(id__in=_ids(letters)):
+        original_id = letter.id
+        letter.pk = None
+        letter.created_by = user or letter.created_by
+        letter.save()
+        copies[original_id] = letter.id
+
+    for model in (ResponseTextField, ResponseBoolField, ResponseSelectionField):
+        fields = list(model.objects.filter(letter_id__in=copies))
+        for field in fields:
+            field.pk = None
+            field.letter_id = copies[field.letter_id]
+        model.objects.bulk_create(fields)
+
+    classes_through = Letter.classes_concerned.through
+    classes_through.objects.bulk_create(
+        classes_through(letter_id=letter_id, classgroup_id=c)
+        for letter_id in copies.values() for c in class_ids)
+
+    groups_through = Letter.groups_concerned.through
+    groups_through.objects.bulk_create(
+        groups_through(letter_id=letter_id, group_id=g)
+        for letter_id in copies.values() for g in group_ids)
+
+    return list(Letter.objects.filter(id__in=copies.values()))
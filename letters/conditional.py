@@ -0,0 +1,129 @@
+"""ETags for conditional GET requests to the parent pages.
+
+Parents reload their letters overview and letter pages frequently to see
+whether anything has changed. Computing an ETag from a few aggregate
+queries lets unchanged pages be answered with '304 Not Modified' before
+the view runs its queries and renders the page.
+
+Every ETag function returns None whenever a page must not be answered
+from the browser's cache, e.g. for POST requests or if there are messages
+waiting to be shown.
+"""
+
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Letter, Student, Response
+
+
+def _etag(*parts):
+    """Return an ETag for a tuple of values.
+
+    :return: Hash of the given values
+    :rtype: str
+    """
+
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def _cacheable(request):
+    """Return whether a response to a request may be revalidated.
+
+    :param request: Current request
+    :return: True if request is a GET or HEAD request by a logged in user
+        without pending messages
+    :rtype: bool
+    """
+
+    return request.method in ('GET', 'HEAD') \
+        and request.user.is_authenticated \
+        and not len(get_messages(request))
+
+
+def letters_etag(request):
+    """Return ETag for the letters overview.
+
+    The ETag changes whenever a letter concerning one of the user's
+    children is published, changed, deleted or viewed, and whenever the
+    children themselves change.
+
+    :param request: Current request
+    :return: ETag or None
+    :rtype: str
+    """
+
+    if not _cacheable(request):
+        return None
+
+    # Staff members see the letters they have created:
+    if request.user.is_staff:
+        letters = Letter.objects.filter(created_by=request.user).aggregate(
+            Count('id'), Max('id'), Max('updated_at'))
+        return _etag('staff', request.user.id, request.META.get('CSRF_COOKIE'),
+                     sorted(letters.items()))
+
+    if not hasattr(request.user, 'profile'):
+        return None
+
+    children = list(request.user.profile.children.order_by('id').values_list(
+        'id', 'first_name', 'last_name', 'class_group_id',
+        'class_group__name'))
+    child_ids = [child[0] for child in children]
+    group_ids = Student.groups.through.objects \
+        .filter(student_id__in=child_ids).values('group_id')
+
+    today = timezone.localdate()
+    letters = Letter.objects.filter(
+        Q(classes_concerned__in=[child[3] for child in children])
+        | Q(groups_concerned__in=group_ids),
+        date_published__lte=today,
+    ).aggregate(count=Count('id', distinct=True), version=Max('updated_at'))
+    viewed = Letter.students_viewed.through.objects \
+        .filter(student_id__in=child_ids).aggregate(Count('id'), Max('id'))
+
+    return _etag(request.user.id, request.META.get('CSRF_COOKIE'), today,
+                 children, sorted(letters.items()), sorted(viewed.items()))
+
+
+def letter_detail_etag(request, student_id, letter_id, confirmation=False):
+    """Return ETag for the detail page of a letter.
+
+    The ETag changes whenever the letter or its response fields are
+    changed and when a response has been submitted.
+    Whether the letter has been viewed is not part of the ETag, because it
+    is not shown on the page and the letter is marked as viewed on the
+    first, uncached request.
+
+    :param request: Current request
+    :param student_id: ID of student this letter is being viewed for
+    :type student_id: int
+    :param letter_id: ID of letter to be displayed
+    :type letter_id: int
+    :param confirmation: Whether the confirmation form is processed
+    :type confirmation: bool
+    :return: ETag or None
+    :rtype: str
+    """
+
+    if confirmation or not _cacheable(request) \
+            or not hasattr(request.user, 'profile'):
+        return None
+
+    # Never answer requests the user is not allowed to make from the cache:
+    if not request.user.profile.children.filter(id=student_id).exists():
+        return None
+
+    letter = Letter.objects.filter(id=letter_id).values_list(
+        'updated_at', 'date_published').first()
+    if letter is None:
+        return None
+
+    response = Response.objects.filter(student_id=student_id,
+                                       letter_id=letter_id) \
+        .values_list('id', 'response_date').first()
+
+    return _etag(request.user.id, request.META.get('CSRF_COOKIE'), student_id,
+                 letter, letter[1] <= timezone.localdate(), response)
@@ -0,0 +1,208 @@
+"""Events about new letters and confirmations for the letters app.
+
+Events are recorded by signal receivers once the transaction creating
+the letter or response has been committed. The ID of the latest event is
+kept in the cache, so that requests waiting for new events only query the
+database after something has actually happened.
+
+Parents are notified about new letters concerning their children and
+about confirmations submitted for their children; staff members about
+confirmations of the letters they have created.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Letter, Student, Response, Event
+
+LAST_EVENT_KEY = 'letters:last_event'
+
+
+def last_event_id():
+    """Return the ID of the latest event.
+
+    :return: ID of the latest event or 0 if there are none
+    :rtype: int
+    """
+
+    last = cache.get(LAST_EVENT_KEY)
+    if last is None:
+        last = Event.objects.aggregate(Max('id'))['id__max'] or 0
+        cache.set(LAST_EVENT_KEY, last, None)
+
+    return last
+
+
+def record_event(kind, letter_id, student_id=None):
+    """Record an event and delete events older than EVENTS_KEEP.
+
+    :param kind: Event.NEW_LETTER or Event.CONFIRMATION
+    :type kind: str
+    :param letter_id: ID of the letter concerned
+    :type letter_id: int
+    :param student_id: ID of the student a confirmation was submitted for
+    :type student_id: int
+    :return: Created event
+    :rtype: Event
+    """
+
+    event = Event.objects.create(kind=kind, letter_id=letter_id,
+                                 student_id=student_id)
+    Event.objects.filter(
+        created__lt=timezone.now() - settings.EVENTS_KEEP).delete()
+    cache.set(LAST_EVENT_KEY, event.id, None)
+
+    return event
+
+
+def record_events(kind, letter_id, student_ids):
+    """Record one event per student with a single INSERT.
+
+    :param kind: Event.NEW_LETTER or Event.CONFIRMATION
+    :type kind: str
+    :param letter_id: ID of the letter concerned
+    :type letter_id: int
+    :param student_ids: IDs of the students concerned
+    :type student_ids: list
+    """
+
+    Event.objects.bulk_create([Event(kind=kind, letter_id=letter_id,
+                                     student_id=student_id)
+                               for student_id in student_ids])
+    Event.objects.filter(
+        created__lt=timezone.now() - settings.EVENTS_KEEP).delete()
+    cache.set(LAST_EVENT_KEY,
+              Event.objects.aggregate(Max('id'))['id__max'] or 0, None)
+
+
+def events_for(user, after):
+    """Return all events for a user since a given event.
+
+    :param user: User the events are returned for
+    :type user: User
+    :param after: ID of the last event the user has already received
+    :type after: int
+    :return: List of dictionaries with the event's id, kind, letter and
+        the IDs of the students concerned, oldest first
+    :rtype: list
+    """
+
+    events = Event.objects.filter(id__gt=after).order_by('id')
+
+    if user.is_staff:
+        events = events.filter(kind=Event.CONFIRMATION,
+                               letter__created_by=user)
+        children = child_ids = []
+    else:
+        children = list(Student.objects.filter(profile__user=user)
+                        .values_list('id', 'class_group_id'))
+        child_ids = [child[0] for child in children]
+        group_ids = Student.groups.through.objects \
+            .filter(student_id__in=child_ids).values('group_id')
+
+        events = events.filter(
+            Q(kind=Event.NEW_LETTER,
+              letter__date_published__lte=timezone.localdate(),
+              letter__in=Letter.objects.filter(
+                  Q(classes_concerned__in=[child[1] for child in children])
+                  | Q(groups_concerned__in=group_ids)).values('id'))
+            | Q(kind=Event.CONFIRMATION, student__in=child_ids))
+
+    events = list(events.values('id', 'kind', 'letter_id', 'letter__name',
+                                'student_id'))
+
+    # Find out which children a new letter concerns:
+    concerned = defaultdict(set)
+    letter_ids = [e['letter_id'] for e in events
+                  if e['kind'] == Event.NEW_LETTER]
+    if letter_ids:
+        for child_id, class_id in children:
+            concerned[('class', class_id)].add(child_id)
+        for child_id, group_id in Student.groups.through.objects \
+                .filter(student_id__in=child_ids) \
+                .values_list('student_id', 'group_id'):
+            concerned[('group', group_id)].add(child_id)
+
+        for letter_id, class_id in Letter.classes_concerned.through.objects \
+                .filter(letter_id__in=letter_ids) \
+                .values_list('letter_id', 'classgroup_id'):
+            concerned[letter_id] |= concerned[('class', class_id)]
+        for letter_id, group_id in Letter.groups_concerned.through.objects \
+                .filter(letter_id__in=letter_ids) \
+                .values_list('letter_id', 'group_id'):
+            concerned[letter_id] |= concerned[('group', group_id)]
+
+    return [{
+        'id': e['id'],
+        'kind': e['kind'],
+        'letter': {'id': e['letter_id'], 'name': e['letter__name']},
+        'students': sorted(concerned[e['letter_id']])
+        if e['kind'] == Event.NEW_LETTER else [e['student_id']],
+    } for e in events]
+
+
+async def wait_for_events(user, after, timeout=None):
+    """Wait until there are events for a user.
+
+    The database is only queried when the ID of the latest event in the
+    cache has changed. Waiting does not occupy a thread, so any number of
+    clients can wait at once when the project is served via ASGI.
+
+    :param user: User the events are returned for
+    :type user: User
+    :param after: ID of the last event the user has already received
+    :type after: int
+    :param timeout: Seconds to wait at most; defaults to EVENTS_TIMEOUT
+    :type timeout: float
+    :return: List of events as returned by events_for; empty if there have
+        been no events until the timeout
+    :rtype: list
+    """
+
+    timeout = settings.EVENTS_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    checked = after
+
+    while True:
+        last = await sync_to_async(last_event_id)()
+        if last > checked:
+            events = await sync_to_async(events_for)(user, after)
+            if events:
+                return events
+            checked = last
+
+        if time.monotonic() >= deadline:
+            return []
+        await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+
+
+@receiver(post_save, sender=Letter)
+def record_new_letter(sender, instance, created, **kwargs):
+    """Record an event for a new letter.
+
+    The letter's audience is saved after the letter itself, so the
+    event is only recorded once the transaction has been committed.
+    """
+
+    if created:
+        transaction.on_commit(
+            lambda: record_event(Event.NEW_LETTER, instance.id))
+
+
+@receiver(post_save, sender=Response)
+def record_confirmation(sender, instance, created, **kwargs):
+    """Record an event for a new confirmation."""
+
+    if created:
+        transaction.on_commit(lambda: record_event(
+            Event.CONFIRMATION, instance.letter_id, instance.student_id))
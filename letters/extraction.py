@@ -0,0 +1,202 @@
+"""Text extraction from uploaded documents for the letters app.
+
+Saving a letter only adds it to a queue (ExtractionJob). The documents
+are processed later by 'manage.py extract_documents', so that reading
+large PDFs does not slow down saving letters in the admin.
+
+Every document is identified by the SHA-256 of its content. Text and
+page count are stored once per content in DocumentText, so documents
+that are uploaded again are not extracted again. Optimized variants of
+the documents are created at the same time (see optimization).
+"""
+
+import hashlib
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Letter, DocumentText, ExtractionJob
+from .optimization import optimize_document
+from .search import index_letters
+
+# Jobs are given up after failing this many times:
+MAX_ATTEMPTS = 3
+
+# Jobs started longer ago than this are assumed to have been abandoned
+# by a crashed worker:
+STALE_AFTER = timedelta(hours=1)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def hash_file(file):
+    """Return the SHA-256 of a file, reading it in chunks.
+
+    :param file: File opened in binary mode
+    :return: Hexadecimal digest
+    :rtype: str
+    """
+
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def extract_text(file):
+    """Return text and page count of a PDF file.
+
+    :param file: File opened in binary mode
+    :return: Tuple of text and number of pages; empty text and 0 pages if
+        the file is no PDF file
+    :rtype: tuple
+    """
+
+    from pypdf import PdfReader
+
+    file.seek(0)
+    if file.read(5) != b'%PDF-':
+        return "", 0
+
+    file.seek(0)
+    reader = PdfReader(file)
+    text = "\n".join(page.extract_text() or "" for page in reader.pages)
+
+    return text.strip(), len(reader.pages)
+
+
+def enqueue(letter_ids):
+    """Add letters to the extraction queue.
+
+    Letters that are already queued are processed again from scratch.
+
+    :param letter_ids: IDs of the letters
+    :type letter_ids: list
+    """
+
+    for letter_id in letter_ids:
+        ExtractionJob.objects.update_or_create(
+            letter_id=letter_id,
+            defaults={'created': timezone.now(), 'started': None,
+                      'attempts': 0, 'error': ''})
+
+
+def _claimable():
+    """Return all jobs a worker may start.
+
+    :return: QuerySet of ExtractionJob objects
+    """
+
+    return ExtractionJob.objects.filter(
+        Q(started__isnull=True) | Q(started__lt=timezone.now() - STALE_AFTER),
+        attempts__lt=MAX_ATTEMPTS)
+
+
+def process_job(job):
+    """Extract the text of a queued letter's document and optimize it.
+
+    :param job: Job to be processed
+    :type job: ExtractionJob
+    :return: 'extracted' if the text has been extracted, 'skipped' if the
+        document's content was known already
+    :rtype: str
+    """
+
+    letter = Letter.objects.only('document', 'document_hash') \
+        .get(id=job.letter_id)
+
+    with letter.document.open('rb') as file:
+        # Streamed documents have been hashed while uploading:
+        digest = letter.document_hash or hash_file(file)
+
+        if DocumentText.objects.filter(sha256=digest).exists():
+            result = 'skipped'
+        else:
+            text, pages = extract_text(file)
+            DocumentText.objects.get_or_create(
+                sha256=digest, defaults={'text': text, 'pages': pages})
+            result = 'extracted'
+
+        optimize_document(file, digest)
+
+    if digest != letter.document_hash:
+        # Saving the letter would add it to the queue again:
+        Letter.objects.filter(id=letter.id).update(document_hash=digest)
+
+    # Keep the job if the letter has been queued again in the meantime:
+    ExtractionJob.objects.filter(id=job.id, created=job.created).delete()
+
+    # Letters are indexed on save, before the text of a new document is
+    # known:
+    if digest != letter.document_hash or result == 'extracted':
+        index_letters([letter.id])
+
+    return result
+
+
+def process_queue(limit=None):
+    """Process queued letters, oldest first.
+
+    Every job is claimed with a conditional UPDATE first, so that several
+    workers can run at once. Failed jobs are retried up to MAX_ATTEMPTS
+    times by later runs.
+
+    :param limit: Maximum number of jobs processed
+    :type limit: int
+    :return: Dictionary counting the 'extracted', 'skipped' and 'failed'
+        jobs
+    :rtype: dict
+    """
+
+    counts = {'extracted': 0, 'skipped': 0, 'failed': 0}
+
+    for job in _claimable().order_by('created')[:limit]:
+        if not _claimable().filter(id=job.id) \
+                .update(started=timezone.now()):
+            # Another worker has claimed the job in the meantime:
+            continue
+
+        try:
+            counts[process_job(job)] += 1
+        except Exception as e:
+            ExtractionJob.objects.filter(id=job.id).update(
+                started=None, attempts=F('attempts') + 1, error=repr(e))
+            counts['failed'] += 1
+
+    return counts
+
+
+@receiver(pre_save, sender=Letter)
+def forget_replaced_document(sender, instance, **kwargs):
+    """Forget the hash of a letter's document once it has been replaced.
+
+    Text and optimized variant of the previous document must not be used
+    for the new one until the letter has been processed again. The hash
+    is kept if it has been replaced along with the document, i.e. by a
+    streamed upload.
+    """
+
+    if instance.pk is None or not instance.document_hash:
+        return
+
+    previous = Letter._base_manager.filter(pk=instance.pk) \
+        .values_list('document', 'document_hash').first()
+    if previous is not None and previous[0] != instance.document.name \
+            and previous[1] == instance.document_hash:
+        instance.document_hash = ''
+
+
+@receiver(post_save, sender=Letter)
+def enqueue_saved_letter(sender, instance, **kwargs):
+    """Queue a saved letter once the transaction has been committed.
+
+    Letters are queued on every save, as the previous document is not
+    known. Unchanged documents are recognized by their hash and skipped.
+    """
+
+    transaction.on_commit(lambda: enqueue([instance.id]))
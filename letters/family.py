@@ -0,0 +1,194 @@
+"""In-memory index of the parent-child relation of the elternbrief project.
+
+Resolving the parents of many students one by one costs one query per
+student. The family map loads the whole Profile.children relation with a
+single query into compact arrays and answers lookups in both directions
+without touching the database.
+
+The map is built lazily and rebuilt after any change of the relation.
+A version token kept in Django's cache lets all worker processes notice
+changes made by other processes, given that a shared cache is configured.
+Every school has a map of its own.
+"""
+
+from array import array
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .models import Profile, Student
+from .tenants import current_school_id, for_current_school
+
+CACHE_VERSION_KEY = 'letters:family_map_version'
+
+
+class _Index:
+    """Sorted mapping from integer ids to tuples of integer ids.
+
+    Keys are stored in a sorted array. The values belonging to the key at
+    position i are stored in values[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, pairs):
+        """Build index from (key, value) pairs sorted by key.
+
+        :param pairs: Iterable of (key, value) tuples sorted by key
+        """
+
+        self.keys = array('q')
+        self.offsets = array('q')
+        self.values = array('q')
+
+        for key, value in pairs:
+            if not self.keys or self.keys[-1] != key:
+                self.keys.append(key)
+                self.offsets.append(len(self.values))
+            self.values.append(value)
+        self.offsets.append(len(self.values))
+
+    def __getitem__(self, key):
+        """Return all values of a key.
+
+        :param key: Key to look up
+        :type key: int
+        :return: Tuple of all values belonging to the key
+        :rtype: tuple
+        """
+
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return ()
+
+        return tuple(self.values[self.offsets[i]:self.offsets[i + 1]])
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class FamilyMap:
+    """Index of all parent-child pairs in both directions."""
+
+    def __init__(self, version=None):
+        """Load all parent-child pairs with one query.
+
+        :param version: Cache version this map was built for
+        """
+
+        pairs = list(for_current_school(
+            Profile.children.through.objects.all(), 'profile__school')
+            .values_list('student', 'profile__user')
+            .order_by('student', 'profile__user'))
+
+        self.version = version
+        self.student_parents = _Index(pairs)
+        self.parent_students = _Index(sorted((p, s) for s, p in pairs))
+
+    def parents_of(self, student_id):
+        """Return ids of all parents of a student.
+
+        :param student_id: ID of the student
+        :type student_id: int
+        :return: Tuple of user ids
+        :rtype: tuple
+        """
+
+        return self.student_parents[student_id]
+
+    def children_of(self, user_id):
+        """Return ids of all children of a parent.
+
+        :param user_id: ID of the parent's user
+        :type user_id: int
+        :return: Tuple of student ids
+        :rtype: tuple
+        """
+
+        return self.parent_students[user_id]
+
+    def parents_for(self, student_ids):
+        """Return ids of the parents of many students.
+
+        :param student_ids: Iterable of student ids
+        :return: Dictionary mapping each student id to a tuple of user ids
+        :rtype: dict
+        """
+
+        return {s: self.student_parents[s] for s in student_ids}
+
+    def parent_users_for(self, student_ids):
+        """Return the parents of many students as User objects.
+
+        All users are fetched with one query.
+
+        :param student_ids: Iterable of student ids
+        :return: Dictionary mapping each student id to a list of User objects
+        :rtype: dict
+        """
+
+        parents = self.parents_for(student_ids)
+        users = User.objects.in_bulk(
+            list({u for user_ids in parents.values() for u in user_ids}))
+
+        return {s: [users[u] for u in user_ids if u in users]
+                for s, user_ids in parents.items()}
+
+
+# Family maps by school id:
+_family_maps = {}
+
+
+def family_map():
+    """Return the current family map, rebuilding it if it is outdated.
+
+    :return: Up-to-date FamilyMap
+    :rtype: FamilyMap
+    """
+
+    version = cache.get_or_set(CACHE_VERSION_KEY, lambda: uuid4().hex, None)
+    school_id = current_school_id()
+    if school_id not in _family_maps \
+            or _family_maps[school_id].version != version:
+        _family_maps[school_id] = FamilyMap(version)
+
+    return _family_maps[school_id]
+
+
+def invalidate_family_map():
+    """Mark the family map as outdated in all processes.
+
+    The version is changed again after the current transaction, as other
+    processes may have rebuilt the map from the old rows in the meantime.
+    """
+
+    _new_version()
+    transaction.on_commit(_new_version)
+
+
+def _new_version():
+    _family_maps.pop(current_school_id(), None)
+    cache.set(CACHE_VERSION_KEY, uuid4().hex, None)
+
+
+@receiver(m2m_changed, sender=Profile.children.through)
+def invalidate_on_children_changed(sender, action, **kwargs):
+    """Invalidate family map after children of a profile have changed."""
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_family_map()
+
+
+@receiver(post_delete, sender=Profile)
+@receiver(post_delete, sender=Student)
+def invalidate_on_delete(sender, **kwargs):
+    """Invalidate family map after a profile or student has been deleted.
+
+    Deleting either one removes rows of the relation without sending
+    m2m_changed.
+    """
+
+    invalidate_family_map()
@@ -1,9 +1,116 @@
 """Form for the elternbrief application"""
 
 from django import forms
+from django.contrib.admin.forms import AdminAuthenticationForm
+
+from .models import ClassGroup, Group, Letter
+from .throttling import throttled, MESSAGE as THROTTLED_MESSAGE
+from .uploads import DocumentField
 
 
 class UserImportForm(forms.Form):
     """Simple form for uploading csv files for importing users."""
     parents_file = forms.FileField(required=True, widget=forms.FileInput(attrs={'class': 'custom-file-input'}))
     students_file = forms.FileField(required=True, widget=forms.FileInput(attrs={'class': 'custom-file-input'}))
+
+
+class ResponseImportForm(forms.Form):
+    """Simple form for uploading csv files with paper responses to a letter."""
+    responses_file = forms.FileField(required=True, widget=forms.FileInput(attrs={'class': 'custom-file-input'}))
+
+
+class LetterForm(forms.ModelForm):
+    """Form for letters in the admin, storing documents while uploading."""
+    document = DocumentField(label="Dokument")
+
+    class Meta:
+        model = Letter
+        fields = '__all__'
+
+    def _post_clean(self):
+        super()._post_clean()
+
+        # Streamed documents have been hashed while uploading:
+        upload = self.files.get(self.add_prefix('document'))
+        if getattr(upload, 'sha256', None) and not upload.error:
+            self.instance.document_hash = upload.sha256
+
+
+class ThrottledAdminAuthenticationForm(AdminAuthenticationForm):
+    """Login form of the admin site rejecting throttled logins."""
+
+    def clean(self):
+        # Reject guessing before computing the password's hash:
+        if throttled(self.request, self.cleaned_data.get('username')):
+            raise forms.ValidationError(THROTTLED_MESSAGE, code='throttled')
+
+        return super().clean()
+
+
+class ClassGroupChoiceForm(forms.Form):
+    """Form for choosing a class group in admin actions."""
+    class_group = forms.ModelChoiceField(ClassGroup.objects.none(), label="Klasse")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Built per form, as the current school is not known on import:
+        self.fields['class_group'].queryset = ClassGroup.objects.order_by('name')
+
+
+class GroupChoiceForm(forms.Form):
+    """Form for choosing a group in admin actions."""
+    group = forms.ModelChoiceField(Group.objects.none(), label="Gruppe")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['group'].queryset = Group.objects.order_by('name')
+
+
+class GroupMembershipForm(forms.Form):
+    """Form for changing the members of groups by set operations in admin actions."""
+    ADD = 'add'
+    INTERSECT = 'intersect'
+    REMOVE = 'remove'
+    REPLACE = 'replace'
+    OPERATION_CHOICES = [
+        (ADD, "Hinzufügen (Vereinigung)"),
+        (INTERSECT, "Nur diese behalten (Schnittmenge)"),
+        (REMOVE, "Entfernen (Differenz)"),
+        (REPLACE, "Ersetzen"),
+    ]
+
+    operation = forms.ChoiceField(choices=OPERATION_CHOICES, label="Operation")
+    classes = forms.ModelMultipleChoiceField(ClassGroup.objects.none(), required=False,
+                                             label="Schüler der Klassen")
+    groups = forms.ModelMultipleChoiceField(Group.objects.none(), required=False,
+                                            label="Mitglieder der Gruppen")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['classes'].queryset = ClassGroup.objects.order_by('name')
+        self.fields['groups'].queryset = Group.objects.order_by('name')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('classes') and not cleaned_data.get('groups'):
+            raise forms.ValidationError("Bitte wählen Sie mindestens eine Klasse oder Gruppe aus.")
+        return cleaned_data
+
+
+class AudienceForm(forms.Form):
+    """Form for choosing the classes and groups a letter concerns in admin actions."""
+    classes = forms.ModelMultipleChoiceField(ClassGroup.objects.none(), required=False,
+                                             label="Betroffene Klassen")
+    groups = forms.ModelMultipleChoiceField(Group.objects.none(), required=False,
+                                            label="Betroffene Gruppen")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['classes'].queryset = ClassGroup.objects.order_by('name')
+        self.fields['groups'].queryset = Group.objects.order_by('name')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('classes') and not cleaned_data.get('groups'):
+            raise forms.ValidationError("Bitte wählen Sie mindestens eine Klasse oder Gruppe aus.")
+        return cleaned_data
@@ -0,0 +1,55 @@
+"""Additional indexes on the through tables of the letters app.
+
+Django indexes the tables of many-to-many relations by both columns in
+the order (source, target) only. The audience queries of Letter.students,
+Student.letters and the pages built on them look these tables up the
+other way round, e.g. all students of a group or all letters concerning
+a class. The composite indexes below let the database answer these
+lookups from the index alone.
+
+Automatically created through tables cannot declare indexes in their
+Meta class, so the indexes are created after 'manage.py migrate'.
+"""
+
+from django.db import connection
+from django.db.models import Index
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .models import Letter, Student
+
+THROUGH_INDEXES = [
+    (Student.groups.through,
+     Index(fields=['group', 'student'], name='letters_member_group_idx')),
+    (Letter.groups_concerned.through,
+     Index(fields=['group', 'letter'], name='letters_audience_group_idx')),
+    (Letter.classes_concerned.through,
+     Index(fields=['classgroup', 'letter'], name='letters_audience_class_idx')),
+]
+
+
+def create_indexes():
+    """Create all indexes that do not exist yet.
+
+    :return: Names of the created indexes
+    :rtype: list
+    """
+
+    created = []
+    with connection.cursor() as cursor, connection.schema_editor() as editor:
+        for model, index in THROUGH_INDEXES:
+            existing = connection.introspection.get_constraints(
+                cursor, model._meta.db_table)
+            if index.name not in existing:
+                editor.add_index(model, index)
+                created.append(index.name)
+
+    return created
+
+
+@receiver(post_migrate)
+def create_indexes_after_migrate(sender, **kwargs):
+    """Create the indexes after the letters app has been migrated."""
+
+    if sender.name == 'letters':
+        create_indexes()
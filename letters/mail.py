@@ -1,33 +1,240 @@
 """E-Mail funcionality for the letters app of the elternbrief project."""
 
 import os
+from collections import defaultdict
 
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Exists, F, Min, OuterRef
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
 
-from .models import Letter
+from .family import family_map
+from .models import Letter, Student, Profile, Response, PendingNotification
+from .tenants import current_hostname, for_current_school
+
+
+def read_template(name):
+    """Return the content of a mail template.
+
+    :param name: File name of the template inside mail_templates
+    :type name: str
+    :return: Content of the template
+    :rtype: str
+    """
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(f'{base_dir}/mail_templates/{name}', 'r') as f:
+        return f.read()
+
+
+def letter_recipients(letters, unconfirmed_only=False):
+    """Return all parents concerned by any of the given letters.
+
+    The audience of every letter is computed in the database as the union
+    of the parent-child pairs of its classes and groups.
+    Each (parent, student, letter) triple is returned exactly once, even if
+    a student is concerned by a letter through both class and group.
+
+    :param letters: Iterable of Letter objects or ids
+    :param unconfirmed_only: Whether to leave out students that already have
+        a Response for a letter
+    :type unconfirmed_only: bool
+    :return: Dictionary mapping user ids to dictionaries which map student ids
+        to lists of letter ids
+    :rtype: dict
+    """
+
+    letter_ids = [getattr(letter, 'id', letter) for letter in letters]
+    if not letter_ids:
+        return {}
+
+    def audience(path):
+        # Parent-child pairs concerned through one path of the letter:
+        query = Profile.children.through.objects.annotate(
+            parent=F('profile__user'),
+            child=F('student'),
+            letter=F(f'student__{path}'),
+        ).filter(
+            letter__in=letter_ids,
+        ).exclude(
+            profile__user__email='',
+        )
+
+        # Anti-join against existing responses:
+        if unconfirmed_only:
+            query = query.filter(
+                ~Exists(Response.objects.filter(letter=OuterRef('letter'),
+                                                student=OuterRef('child'))))
+
+        return query.values_list('parent', 'child', 'letter')
+
+    # UNION removes the duplicates of students reached by class and group:
+    rows = audience('class_group__letter').union(audience('groups__letter'))
+
+    recipients = defaultdict(lambda: defaultdict(list))
+    for parent_id, student_id, letter_id in rows:
+        recipients[parent_id][student_id].append(letter_id)
+
+    return recipients
+
+
+def build_messages(recipients, subject, template):
+    """Render one mail per parent listing letters grouped by child.
+
+    The placeholder [letters] in the template is replaced with the list of
+    letters, [domain] with the configured hostname.
+    Users, students and letters are fetched with one query each.
+
+    :param recipients: Dictionary as returned by letter_recipients
+    :param subject: Subject of every mail
+    :type subject: str
+    :param template: Name of the mail template to use
+    :type template: str
+    :return: List of EmailMessage objects
+    :rtype: list
+    """
+
+    if not recipients:
+        return []
+
+    template = read_template(template)
+
+    student_ids = {s for children in recipients.values() for s in children}
+    letter_ids = {letter_id for children in recipients.values()
+                  for child_letters in children.values()
+                  for letter_id in child_letters}
+
+    users = User.objects.in_bulk(list(recipients))
+    students = Student.objects.select_related('class_group') \
+        .in_bulk(list(student_ids))
+    letters = Letter.objects.in_bulk(list(letter_ids))
+
+    messages = []
+    for user_id, children in recipients.items():
+        lines = []
+        for student_id, child_letters in sorted(children.items()):
+            lines.append(f"{students[student_id]}:")
+            for letter_id in sorted(child_letters):
+                letter = letters[letter_id]
+                url = reverse('letters:letter_detail',
+                              kwargs={'student_id': student_id,
+                                      'letter_id': letter_id})
+                due = f" (fällig bis {letter.date_due:%d.%m.%Y})" \
+                    if letter.date_due else ""
+                lines.append(f"  - {letter}{due}: "
+                             f"https://{current_hostname()}{url}")
+            lines.append("")
+
+        msg = template
+        msg = msg.replace('[letters]', "\n".join(lines).rstrip())
+        msg = msg.replace('[domain]', current_hostname())
+
+        messages.append(EmailMessage(subject, msg, settings.EMAIL_HOST_USER,
+                                     [users[user_id].email]))
+
+    return messages
+
+
+def send_batched(messages):
+    """Send mails in batches over a single mail connection.
+
+    The batch size is determined by the MAIL_BATCH_SIZE setting.
+
+    :param messages: List of EmailMessage objects
+    :type messages: list
+    """
+
+    if not messages:
+        return
+
+    batch_size = settings.MAIL_BATCH_SIZE
+    with get_connection() as connection:
+        for i in range(0, len(messages), batch_size):
+            connection.send_messages(messages[i:i + batch_size])
+
+
+def send_digest(force=False, dry_run=False):
+    """Send one mail per parent for all pending new letter notifications.
+
+    Pending notifications are only sent once the oldest of them is older
+    than NEW_LETTER_DIGEST_WINDOW, unless force is set.
+    Notifications for letters that have not been published yet are kept
+    until their publication date.
+
+    :param force: Whether to ignore the digest window
+    :type force: bool
+    :param dry_run: Whether to only render the mails without sending them
+    :type dry_run: bool
+    :return: List of rendered EmailMessage objects
+    :rtype: list
+    """
+
+    pending = for_current_school(PendingNotification.objects.filter(
+        letter__date_published__lte=timezone.localdate()), 'letter__school')
+
+    oldest = pending.aggregate(oldest=Min('created'))['oldest']
+    if oldest is None or not force and \
+            timezone.now() - oldest < settings.NEW_LETTER_DIGEST_WINDOW:
+        return []
+
+    # Read once, so that notifications added meanwhile are kept for the
+    # next digest rather than deleted without being sent:
+    rows = list(pending.values_list('id', 'letter_id'))
+    notification_ids = [notification_id for notification_id, _ in rows]
+    letter_ids = {letter_id for _, letter_id in rows}
+
+    messages = build_messages(letter_recipients(letter_ids),
+                              "Neue Elternbriefe", 'new_letters_digest.txt')
+
+    if not dry_run:
+        send_batched(messages)
+        PendingNotification.objects.filter(id__in=notification_ids).delete()
+
+    return messages
+
+
+def send_new_letter_mails(letter):
+    """Send mail to parents of all students a letter concerns.
+
+    :param letter: The new letter
+    :type letter: Letter
+    """
+
+    template = read_template('new_letter.txt')
+
+    students = letter.students
+    parents = family_map().parent_users_for(s.id for s in students)
+
+    for student in students:
+        msg = template
+        msg = msg.replace('[student]', str(student))
+        msg = msg.replace('[domain]', current_hostname())
+        msg = msg.replace('[student_id]', str(student.id))
+        msg = msg.replace('[letter_id]', str(letter.id))
+
+        for parent in parents[student.id]:
+            parent.email_user(f"Neuer Brief für {student}", msg,
+                              settings.EMAIL_HOST_USER)
 
 
 @receiver(post_save, sender=Letter)
 def send_mail_on_new_letter(sender, instance, created, **kwargs):
-    """Send mail to parents of all students a letter concerns.
+    """Notify parents of all students a letter concerns.
 
     Called automatically every time a new letter is created.
+    Mails are only sent once the current transaction has been committed,
+    because the classes and groups concerned are saved after the letter.
+    If NEW_LETTER_DIGEST is set, only record the new letter so that it can be
+    included in the next digest mail.
     """
 
     if created:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        with open(f'{base_dir}/mail_templates/new_letter.txt', 'r') as f:
-            template = f.read()
-
-        for student in instance.students:
-            msg = template
-            msg = msg.replace('[student]', str(student))
-            msg = msg.replace('[domain]', settings.HOSTNAME)
-            msg = msg.replace('[student_id]', str(student.id))
-            msg = msg.replace('[letter_id]', str(instance.id))
-
-            for parent in student.parents:
-                parent.email_user(f"Neuer Brief für {student}", msg,
-                                  settings.EMAIL_HOST_USER)
+        if settings.NEW_LETTER_DIGEST:
+            PendingNotification.objects.create(letter=instance)
+        else:
+            transaction.on_commit(lambda: send_new_letter_mails(instance))
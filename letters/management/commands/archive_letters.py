@@ -0,0 +1,42 @@
+"""Management command for moving old letters to the archive."""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from letters.archive import letters_to_archive, archive_letters
+
+
+class Command(BaseCommand):
+    """Move letters older than ARCHIVE_LETTERS_AFTER to the archive.
+
+    Meant to be run periodically, e.g. by cron.
+    """
+
+    help = "Verschiebt alte Elternbriefe samt Rückmeldungen ins Archiv."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help="Mindestalter der Briefe in Tagen "
+                                 "(Standard: ARCHIVE_LETTERS_AFTER)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Briefe nur anzeigen, nicht archivieren")
+
+    def handle(self, *args, **options):
+        age = timedelta(days=options['days']) if options['days'] else None
+        letters = list(letters_to_archive(age))
+
+        if options['dry_run']:
+            for letter in letters:
+                self.stdout.write(f"{letter} ({letter.date_published})")
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(letters)} Briefe würden archiviert."))
+            return
+
+        start = time.perf_counter()
+        count = archive_letters(letters)
+        duration = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} Briefe in {duration:.2f}s archiviert."))
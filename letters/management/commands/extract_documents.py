@@ -0,0 +1,40 @@
+"""Management command for extracting the text of uploaded documents."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from letters.extraction import process_queue
+
+
+class Command(BaseCommand):
+    """Extract text and page count of all queued documents.
+
+    Meant to be run periodically, e.g. by cron, or continuously with
+    --interval.
+    """
+
+    help = "Extrahiert den Text neu hochgeladener Dokumente."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int,
+                            help="Höchstens so viele Dokumente bearbeiten")
+        parser.add_argument('--interval', type=int,
+                            help="Nicht beenden, sondern alle INTERVAL "
+                                 "Sekunden nach neuen Dokumenten sehen")
+
+    def handle(self, *args, **options):
+        while True:
+            start = time.perf_counter()
+            counts = process_queue(options['limit'])
+            duration = time.perf_counter() - start
+
+            if any(counts.values()) or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{counts['extracted']} Dokumente extrahiert, "
+                    f"{counts['skipped']} bereits bekannt, "
+                    f"{counts['failed']} fehlgeschlagen in {duration:.2f}s."))
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
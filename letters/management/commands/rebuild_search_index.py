@@ -0,0 +1,27 @@
+"""Management command for rebuilding the full-text search index."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from letters.search import create_index, rebuild_index
+
+
+class Command(BaseCommand):
+    """Rebuild the search index from all letters.
+
+    The index is kept up to date automatically. Rebuilding it is only
+    necessary for letters created before the index existed or changed
+    without sending signals, e.g. by QuerySet.update().
+    """
+
+    help = "Baut den Suchindex für alle Elternbriefe neu auf."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        create_index()
+        count = rebuild_index()
+        duration = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} Briefe in {duration:.2f}s indexiert."))
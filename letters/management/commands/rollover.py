@@ -0,0 +1,61 @@
+"""Management command for the end-of-year rollover of all classes."""
+
+import time
+
+from django.core.management.base import CommandError
+
+from letters.rollover import plan_rollover, apply_rollover
+from letters.tenants import SchoolCommand
+
+
+class Command(SchoolCommand):
+    """Advance all students to the next class and archive graduates.
+
+    By default the grade at the beginning of every class name is increased
+    by one (5a becomes 6a). Classes of the final grade graduate.
+    Single classes can be mapped explicitly with --map.
+    """
+
+    help = "Versetzt alle Schüler in die nächste Klasse (Schuljahreswechsel)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('final_grade', type=int,
+                            help="Abschlussjahrgang, dessen Schüler die Schule verlassen")
+        parser.add_argument('--map', action='append', default=[], metavar='ALT=NEU',
+                            help="Klasse ALT explizit nach NEU versetzen; "
+                                 "ohne NEU verlassen die Schüler die Schule")
+        parser.add_argument('--archive-class', metavar='NAME',
+                            help="Klasse für Abgänger (Standard: 'Abgänger <Jahr>')")
+        parser.add_argument('--keep-groups', action='store_true',
+                            help="Gruppenmitgliedschaften nicht löschen")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Änderungen nur anzeigen, nicht ausführen")
+
+    def handle(self, *args, **options):
+        overrides = {}
+        for mapping in options['map']:
+            if '=' not in mapping:
+                raise CommandError(f"Ungültige Zuordnung '{mapping}', erwartet ALT=NEU.")
+            old, new = mapping.split('=', 1)
+            overrides[old.strip()] = new.strip()
+
+        start = time.perf_counter()
+        plan = plan_rollover(options['final_grade'], overrides,
+                             options['archive_class'],
+                             reset_groups=not options['keep_groups'])
+        planned = time.perf_counter()
+
+        for line in plan.diff():
+            self.stdout.write(line)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Planung in {planned - start:.2f}s, nichts geändert."))
+            return
+
+        count = apply_rollover(plan)
+        applied = time.perf_counter()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} Schüler versetzt. Planung {planned - start:.2f}s, "
+            f"Ausführung {applied - planned:.2f}s."))
@@ -0,0 +1,38 @@
+"""Management command for sending digest mails about new letters."""
+
+import time
+
+from letters.mail import send_digest
+from letters.tenants import SchoolCommand
+
+
+class Command(SchoolCommand):
+    """Send one digest mail to every parent with new letters.
+
+    Only has an effect if NEW_LETTER_DIGEST is set.
+    Meant to be run periodically, e.g. by cron.
+    """
+
+    help = "Versendet gesammelte Benachrichtigungen über neue Elternbriefe."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Zeitfenster ignorieren und sofort versenden")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Mails nur erzeugen, nicht versenden")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        messages = send_digest(force=options['force'],
+                               dry_run=options['dry_run'])
+        duration = time.perf_counter() - start
+
+        if options['dry_run']:
+            for message in messages:
+                self.stdout.write(f"An: {', '.join(message.to)}")
+                self.stdout.write(message.body)
+                self.stdout.write("")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(messages)} Benachrichtigungen in {duration:.2f}s "
+            f"{'erzeugt' if options['dry_run'] else 'versendet'}."))
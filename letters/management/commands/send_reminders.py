@@ -0,0 +1,50 @@
+"""Management command for sending confirmation reminders to parents."""
+
+import time
+
+from letters.reminders import letters_due_for_reminder, send_reminders
+from letters.tenants import SchoolCommand
+
+
+class Command(SchoolCommand):
+    """Send one reminder mail to every parent with unconfirmed letters.
+
+    Meant to be run periodically, e.g. by cron.
+    """
+
+    help = "Erinnert Eltern per Mail an unbestätigte Elternbriefe."
+
+    def add_arguments(self, parser):
+        parser.add_argument('letter_ids', nargs='*', type=int,
+                            help="IDs der Briefe (Standard: alle offenen)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Mails nur erzeugen, nicht versenden")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        letters = None
+        if options['letter_ids']:
+            # Only letters of the current school that still accept
+            # confirmations:
+            letters = list(letters_due_for_reminder()
+                           .filter(id__in=options['letter_ids'])
+                           .values_list('id', flat=True))
+            skipped = sorted(set(options['letter_ids']) - set(letters))
+            if skipped:
+                self.stdout.write(self.style.WARNING(
+                    f"Übersprungen (nicht veröffentlicht, ohne Bestätigung, "
+                    f"abgelaufen oder unbekannt): "
+                    f"{', '.join(map(str, skipped))}"))
+
+        messages = send_reminders(letters, dry_run=options['dry_run'])
+        duration = time.perf_counter() - start
+
+        if options['dry_run']:
+            for message in messages:
+                self.stdout.write(f"An: {', '.join(message.to)}")
+                self.stdout.write(message.body)
+                self.stdout.write("")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(messages)} Erinnerungen in {duration:.2f}s "
+            f"{'erzeugt' if options['dry_run'] else 'versendet'}."))
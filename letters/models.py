@@ -7,22 +7,99 @@ import json
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.core.exceptions import ValidationError
 
+from .tenants import SchoolManager, current_school_id
 
-class Group(models.Model):
+
+class School(models.Model):
+    """A school using this deployment.
+
+    Requests are assigned to a school by the hostname they were sent to.
+    """
+
+    name = models.CharField("Name", max_length=100)
+    hostname = models.CharField("Hostname", max_length=253, unique=True)
+
+    class Meta:
+        verbose_name = "Schule"
+        verbose_name_plural = "Schulen"
+
+    def __str__(self):
+        """Return string representation of itself.
+
+        The string representation is the value of the name attribute.
+
+        :return: String representation of itself
+        :rtype: str
+        """
+
+        return self.name
+
+
+class SchoolModel(models.Model):
+    """Abstract base class of models whose objects belong to a school.
+
+    The default manager only returns objects of the current school and
+    new objects belong to the current school, see the tenants module.
+    """
+
+    school = models.ForeignKey(School, verbose_name="Schule", null=True,
+                               blank=True, editable=False,
+                               default=current_school_id,
+                               on_delete=models.CASCADE, related_name='+')
+
+    objects = SchoolManager()
+
+    # Fields that are unique within each school:
+    unique_per_school = ()
+
+    class Meta:
+        abstract = True
+
+    def validate_unique(self, exclude=None):
+        """Also check the fields unique per school without a school.
+
+        Django does not validate the conditional unique constraints for
+        objects that belong to no school, and MySQL does not create them.
+        """
+
+        super().validate_unique(exclude)
+
+        if self.school_id is not None:
+            return
+        for name in self.unique_per_school:
+            if name not in (exclude or ()) and type(self)._base_manager \
+                    .filter(school=None, **{name: getattr(self, name)}) \
+                    .exclude(pk=self.pk).exists():
+                raise ValidationError({name: self.unique_error_message(
+                    type(self), (name,))})
+
+
+class Group(SchoolModel):
     """An arbitrary group of students.
 
     Each group may have any number of students.
     Each student can be a member of any number of groups.
     """
 
-    name = models.CharField("Name", max_length=30, unique=True)
+    name = models.CharField("Name", max_length=30)
+
+    unique_per_school = ('name',)
 
     class Meta:
         verbose_name = "Gruppe"
         verbose_name_plural = "Gruppen"
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'name'],
+                                    name='letters_group_school_name'),
+            # NULL schools are not equal to each other in the one above:
+            models.UniqueConstraint(fields=['name'],
+                                    condition=models.Q(school=None),
+                                    name='letters_group_name'),
+        ]
 
     def __str__(self):
         """Return a string representation of itself.
@@ -35,18 +112,28 @@ class Group(models.Model):
         return self.name
 
 
-class ClassGroup(models.Model):
+class ClassGroup(SchoolModel):
     """A school class.
 
     Each school class can may have any number of students.
     Each student must be a member of exactly one school class.
     """
 
-    name = models.CharField("Name", max_length=30, unique=True)
+    name = models.CharField("Name", max_length=30)
+
+    unique_per_school = ('name',)
 
     class Meta:
         verbose_name = "Klasse"
         verbose_name_plural = "Klassen"
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'name'],
+                                    name='letters_classgroup_school_name'),
+            # NULL schools are not equal to each other in the one above:
+            models.UniqueConstraint(fields=['name'],
+                                    condition=models.Q(school=None),
+                                    name='letters_classgroup_name'),
+        ]
 
     def __str__(self):
         """Return string representation of itself.
@@ -60,7 +147,7 @@ class ClassGroup(models.Model):
         return self.name
 
 
-class Student(models.Model):
+class Student(SchoolModel):
     """A student."""
 
     first_name = models.CharField("Vorname", max_length=30)
@@ -72,6 +159,10 @@ class Student(models.Model):
     class Meta:
         verbose_name = "Schüler"
         verbose_name_plural = "Schüler"
+        indexes = [
+            models.Index(fields=['last_name', 'first_name']),
+            models.Index(fields=['school', 'last_name', 'first_name']),
+        ]
 
     def __str__(self):
         """Return string representation of itself.
@@ -116,7 +207,7 @@ class Student(models.Model):
         return list(User.objects.filter(profile__children=self))
 
 
-class Letter(models.Model):
+class Letter(SchoolModel):
     """A letter sent to parents.
 
     A letter object contains information on what should be displayed
@@ -127,8 +218,9 @@ class Letter(models.Model):
 
     name = models.CharField("Name", max_length=30)
     date_published = models.DateField("Veröffentlichungsdatum",
-                                      default=timezone.now)
-    date_due = models.DateField("Fällig bis", blank=True, null=True)
+                                      default=timezone.now, db_index=True)
+    date_due = models.DateField("Fällig bis", blank=True, null=True,
+                                db_index=True)
     teacher = models.CharField("Zuständige Lehrkraft", max_length=30,
                                blank=True)
     confirmation = models.BooleanField("Muss bestätigt werden", default=True)
@@ -145,10 +237,20 @@ class Letter(models.Model):
                                              related_name="letters_viewed")
     students_acknowledged = models.ManyToManyField(Student, through='Response',
                                                    related_name="letters_acknowledged")
+    # SHA-256 of the document, set while streaming the upload or once its
+    # text has been extracted:
+    document_hash = models.CharField("Prüfsumme des Dokuments", max_length=64,
+                                     blank=True, editable=False,
+                                     db_index=True)
+    # Also updated when one of the letter's response fields changes:
+    updated_at = models.DateTimeField("Zuletzt geändert", auto_now=True)
 
     class Meta:
         verbose_name = "Brief"
         verbose_name_plural = "Briefe"
+        indexes = [
+            models.Index(fields=['school', 'date_published']),
+        ]
 
     def __str__(self):
         """Return String representation of itself.
@@ -161,6 +263,18 @@ class Letter(models.Model):
 
         return self.name
 
+    @property
+    def version(self):
+        """Return a number that changes whenever this letter is changed.
+
+        Used as part of cache keys for rendered fragments of this letter.
+
+        :return: Version of this letter
+        :rtype: int
+        """
+
+        return int(self.updated_at.timestamp() * 1000000)
+
     @property
     def students(self):
         """Return all students that are concerned by this letter.
@@ -172,10 +286,10 @@ class Letter(models.Model):
         :rtype: set
         """
 
-        query = models.Q(class_group__in=self.classes_concerned.all()) \
-                | models.Q(groups__in=self.groups_concerned.all())
+        # The audience module depends on the models:
+        from .audience import audience_students
 
-        return set(Student.objects.filter(query))
+        return set(audience_students(self.id))
 
     @property
     def students_confirmed(self):
@@ -202,7 +316,9 @@ class Letter(models.Model):
         :rtype: set
         """
 
-        return self.students - self.students_confirmed
+        from .audience import outstanding_students
+
+        return set(outstanding_students(self.id))
 
 
 class ResponseTextField(models.Model):
@@ -216,6 +332,7 @@ class ResponseTextField(models.Model):
     description = models.CharField("Beschreibung", max_length=200)
     optional = models.BooleanField("Optional", default=True)
     letter = models.ForeignKey(Letter, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
 
     @property
     def name(self):
@@ -246,6 +363,7 @@ class ResponseBoolField(models.Model):
     description = models.CharField("Beschreibung", max_length=200)
     letter = models.ForeignKey(Letter, on_delete=models.CASCADE)
     must_be_true = models.BooleanField("Muss ausgewählt werden", default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Kontrollbox"
@@ -280,6 +398,7 @@ class ResponseSelectionField(models.Model):
     description = models.CharField("Beschreibung", max_length=200)
     options = models.TextField("Auswahlmöglichkeiten (kommagetrennt)")
     letter = models.ForeignKey(Letter, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Auswahlfeld"
@@ -322,7 +441,23 @@ class ResponseSelectionField(models.Model):
         return self.name
 
 
-class Profile(models.Model):
+@receiver(post_save, sender=ResponseTextField)
+@receiver(post_save, sender=ResponseBoolField)
+@receiver(post_save, sender=ResponseSelectionField)
+@receiver(post_delete, sender=ResponseTextField)
+@receiver(post_delete, sender=ResponseBoolField)
+@receiver(post_delete, sender=ResponseSelectionField)
+def touch_letter(sender, instance, **kwargs):
+    """Update a letter's modification time after one of its fields changed.
+
+    Called automatically every time a response field is saved or deleted.
+    """
+
+    Letter.objects.filter(pk=instance.letter_id) \
+        .update(updated_at=timezone.now())
+
+
+class Profile(SchoolModel):
     """Proxy model for the user model.
 
     Each Profile object is linked to exactly one user.
@@ -379,7 +514,7 @@ class Response(models.Model):
     # Values submitted by parents, encoded as JSON:
     content = models.TextField(default='{}')
 
-    def as_dict(self):
+    def as_dict(self, schema):
         """Return a dictionary containing this responses content.
 
         Return a dictionary that is ready to be used to fill a row in
@@ -393,6 +528,8 @@ class Response(models.Model):
         response's letter, with the corresponding value being whatever
         the parents filled in that field.
 
+        :param schema: Response schema of this response's letter
+        :type schema: ResponseSchema
         :return: Dictionary containing this response's content
         :rtype: dict
         """
@@ -408,11 +545,225 @@ class Response(models.Model):
             'class_grp': self.student.class_group,
             'confirmed': "Ja"
         }
+        data.update(schema.display(response_content))
+
+        return data
+
+
+class PendingNotification(models.Model):
+    """A new letter that has not been announced to parents yet.
+
+    Only used if NEW_LETTER_DIGEST is set. Pending notifications are
+    collected and sent as one digest mail per parent.
+    """
+
+    letter = models.ForeignKey(Letter, on_delete=models.CASCADE)
+    created = models.DateTimeField(default=timezone.now)
+
+
+class DocumentText(models.Model):
+    """Text extracted from an uploaded document.
+
+    Extracted by 'manage.py extract_documents'. Letters whose documents
+    have the same content share one DocumentText through their
+    document_hash.
+    """
+
+    sha256 = models.CharField("SHA-256", max_length=64, unique=True)
+    pages = models.PositiveIntegerField("Seiten", default=0)
+    text = models.TextField("Text", blank=True)
+    extracted = models.DateTimeField(default=timezone.now)
+
+
+class OptimizedDocument(models.Model):
+    """A variant of an uploaded document optimized for viewing in browsers.
+
+    Created by 'manage.py extract_documents' if DOCUMENT_OPTIMIZATION is
+    enabled. file is empty if the variant would not be smaller than the
+    original document.
+    """
+
+    sha256 = models.CharField("SHA-256", max_length=64, unique=True)
+    file = models.FileField("Datei", upload_to='documents/optimized/',
+                            blank=True)
+    size = models.PositiveIntegerField("Größe", default=0)
+    original_size = models.PositiveIntegerField("Ursprüngliche Größe",
+                                                default=0)
+    created = models.DateTimeField(default=timezone.now)
+
+
+class ExtractionJob(models.Model):
+    """A letter whose document has to be processed.
+
+    Created whenever a letter is saved and deleted once the text of its
+    document has been extracted.
+    """
+
+    letter = models.OneToOneField(Letter, on_delete=models.CASCADE)
+    created = models.DateTimeField(default=timezone.now)
+    # Set while a worker is processing the job:
+    started = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+
+class Event(models.Model):
+    """Something that happened to a letter, as reported by the events API.
+
+    Clients wait for new events instead of reloading pages to find out
+    whether anything has changed.
+    """
+
+    NEW_LETTER = 'letter'
+    CONFIRMATION = 'confirmation'
+    KIND_CHOICES = [
+        (NEW_LETTER, "Neuer Brief"),
+        (CONFIRMATION, "Bestätigung"),
+    ]
+
+    kind = models.CharField("Art", max_length=20, choices=KIND_CHOICES)
+    letter = models.ForeignKey(Letter, on_delete=models.CASCADE)
+    # Student a confirmation has been submitted for:
+    student = models.ForeignKey(Student, null=True, blank=True,
+                                on_delete=models.CASCADE)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class ArchivedLetter(SchoolModel):
+    """A letter that has been moved to the archive.
+
+    Archived letters are read-only. They keep everything needed to show
+    their results to staff members, while the tables used for current
+    letters stay small.
+    The letter's classes, groups and response fields are stored as JSON.
+    """
+
+    # ID of the letter before it was archived. Not unique, as databases
+    # may reuse the IDs of deleted letters:
+    original_id = models.IntegerField(db_index=True)
+    name = models.CharField("Name", max_length=30)
+    date_published = models.DateField("Veröffentlichungsdatum")
+    date_due = models.DateField("Fällig bis", blank=True, null=True)
+    teacher = models.CharField("Zuständige Lehrkraft", max_length=30,
+                               blank=True)
+    confirmation = models.BooleanField("Muss bestätigt werden")
+    document = models.FileField("Dokument")
+    created_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    date_archived = models.DateTimeField("Archiviert am", default=timezone.now)
+    # Names of all classes and groups concerned, encoded as JSON:
+    audience = models.TextField("Betroffene Klassen und Gruppen", default='{}')
+    # Name, description and type of all response fields, encoded as JSON:
+    response_fields = models.TextField(default='[]')
+
+    class Meta:
+        verbose_name = "Archivierter Brief"
+        verbose_name_plural = "Archivierte Briefe"
+
+    def __str__(self):
+        """Return String representation of itself.
+
+        The string representation is the value of the name attribute.
+
+        :return: String representation of itself
+        :rtype: str
+        """
+
+        return self.name
+
+
+class ArchivedResponse(models.Model):
+    """State of an archived letter for one student.
+
+    There is one ArchivedResponse for each student that was concerned by the
+    letter when it was archived, whether or not it had been confirmed.
+    The student's name and class are copied, so that the results stay
+    readable after the student has been deleted or moved.
+    """
+
+    letter = models.ForeignKey(ArchivedLetter, on_delete=models.CASCADE)
+    student = models.ForeignKey(Student, null=True, on_delete=models.SET_NULL)
+    last_name = models.CharField("Nachname", max_length=30)
+    first_name = models.CharField("Vorname", max_length=30)
+    class_group = models.CharField("Klasse", max_length=30)
+    viewed = models.BooleanField("Gelesen", default=False)
+    confirmed = models.BooleanField("Bestätigt", default=False)
+    response_date = models.DateField(null=True)
+    # Values submitted by parents, encoded as JSON:
+    content = models.TextField(default='{}')
+
+    def as_dict(self, response_fields):
+        """Return a dictionary containing this response's content.
+
+        The dictionary has the same format as the one returned by
+        Response.as_dict, so that it can fill a row in the results table.
+
+        :param response_fields: Response field definitions of the letter
+        :type response_fields: list
+        :return: Dictionary containing this response's content
+        :rtype: dict
+        """
+
+        data = {
+            'last_name': self.last_name,
+            'first_name': self.first_name,
+            'class_grp': self.class_group,
+            'confirmed': "Ja" if self.confirmed else "Nein"
+        }
+
+        if self.confirmed:
+            try:
+                response_content = json.loads(self.content)
+            except json.JSONDecodeError:
+                response_content = {}
 
-        for field in self.letter.responseboolfield_set.all():
-            data.update(
-                {field.name: "Ja" if response_content[field.name] else "Nein"})
-        for field in self.letter.responseselectionfield_set.all():
-            data.update({field.name: response_content[field.name]})
+            for field in response_fields:
+                value = response_content.get(field['name'])
+                if field['type'] == 'bool':
+                    value = "Ja" if value else "Nein"
+                data.update({field['name']: value})
 
         return data
+
+
+class LoginThrottle(SchoolModel):
+    """An IP address or username whose logins have been rejected.
+
+    Logins are rejected after too many failed attempts, see the throttling
+    module. The rejections themselves are counted in the cache, this only
+    records when they happened, once per LOGIN_FAILURES_WINDOW.
+    """
+
+    IP = 'ip'
+    USERNAME = 'username'
+    KIND_CHOICES = [
+        (IP, "IP-Adresse"),
+        (USERNAME, "Nutzername"),
+    ]
+
+    kind = models.CharField("Art", max_length=20, choices=KIND_CHOICES)
+    value = models.CharField("Wert", max_length=150)
+    first_rejected = models.DateTimeField("Zuerst abgewiesen",
+                                          default=timezone.now)
+    last_rejected = models.DateTimeField("Zuletzt abgewiesen",
+                                         default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Anmeldesperre"
+        verbose_name_plural = "Anmeldesperren"
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'kind', 'value'],
+                                    name='letters_loginthrottle_unique'),
+            models.UniqueConstraint(fields=['kind', 'value'],
+                                    condition=models.Q(school=None),
+                                    name='letters_loginthrottle_unique_'
+                                         'without_school'),
+        ]
+
+    def __str__(self):
+        """Return string representation of itself.
+
+        :return: Kind and value, e.g. 'IP-Adresse 192.0.2.1'
+        :rtype: str
+        """
+
+        return f"{self.get_kind_display()} {self.value}"
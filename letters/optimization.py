@@ -0,0 +1,144 @@
+"""Size optimization of uploaded documents for the letters app.
+
+Scanned letters are often several megabytes large, although parents only
+view them in the browser. When DOCUMENT_OPTIMIZATION is enabled,
+'manage.py extract_documents' additionally stores an optimized variant of
+every document, which is served instead of the original unless the
+original is requested explicitly.
+
+If pikepdf is installed, the variant is linearized, so that viewers can
+show the first page before the whole file has been loaded, and its
+streams are recompressed. Otherwise, pypdf recompresses the pages'
+content streams and, if Pillow is installed, the JPEG images of scans.
+Variants are only kept if they are smaller than the original.
+"""
+
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .models import OptimizedDocument
+
+
+def _optimize_with_pikepdf(file):
+    """Return a linearized and recompressed copy of a PDF file.
+
+    :param file: File opened in binary mode
+    :return: Content of the copy
+    :rtype: bytes
+    """
+
+    import pikepdf
+
+    output = io.BytesIO()
+    with pikepdf.open(file) as pdf:
+        pdf.remove_unreferenced_resources()
+        pdf.save(output, linearize=True, compress_streams=True,
+                 recompress_flate=True,
+                 object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+    return output.getvalue()
+
+
+def _optimize_with_pypdf(file):
+    """Return a recompressed copy of a PDF file.
+
+    :param file: File opened in binary mode
+    :return: Content of the copy
+    :rtype: bytes
+    """
+
+    from pypdf import PdfReader, PdfWriter
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        PIL = None
+
+    writer = PdfWriter(clone_from=PdfReader(file))
+    for page in writer.pages:
+        page.compress_content_streams(level=9)
+
+        if PIL is None:
+            continue
+        # Only recompress scans, as other images might lose transparency:
+        for image in page.images:
+            if not image.name.endswith('.jpg'):
+                continue
+            recompressed = io.BytesIO()
+            image.image.save(recompressed, 'JPEG',
+                             quality=settings.DOCUMENT_IMAGE_QUALITY)
+            if recompressed.tell() < len(image.data):
+                image.replace(image.image,
+                              quality=settings.DOCUMENT_IMAGE_QUALITY)
+
+    output = io.BytesIO()
+    writer.write(output)
+
+    return output.getvalue()
+
+
+def optimize_pdf(file):
+    """Return an optimized copy of a PDF file.
+
+    :param file: File opened in binary mode
+    :return: Content of the copy
+    :rtype: bytes
+    """
+
+    file.seek(0)
+    try:
+        import pikepdf  # noqa: F401
+    except ImportError:
+        return _optimize_with_pypdf(file)
+
+    return _optimize_with_pikepdf(file)
+
+
+def optimize_document(file, digest):
+    """Store the optimized variant of a document unless it is known already.
+
+    Documents that are no PDF files or whose variant would not be smaller
+    are recorded without a file, so that they are not processed again.
+
+    :param file: Document opened in binary mode
+    :param digest: SHA-256 of the document
+    :type digest: str
+    :return: Whether a new variant has been stored
+    :rtype: bool
+    """
+
+    if not settings.DOCUMENT_OPTIMIZATION \
+            or OptimizedDocument.objects.filter(sha256=digest).exists():
+        return False
+
+    original_size = file.seek(0, io.SEEK_END)
+    file.seek(0)
+    content = optimize_pdf(file) if file.read(5) == b'%PDF-' else b''
+
+    optimized = OptimizedDocument(sha256=digest, original_size=original_size)
+    if content and len(content) < original_size:
+        optimized.size = len(content)
+        optimized.file.save(f"{digest}.pdf", ContentFile(content), save=False)
+    optimized.save()
+
+    return bool(optimized.file)
+
+
+def optimized_document(digest):
+    """Return the optimized variant of a document if there is one.
+
+    :param digest: SHA-256 of the document
+    :type digest: str
+    :return: The variant's file or None
+    :rtype: FieldFile
+    """
+
+    if not digest:
+        return None
+
+    optimized = OptimizedDocument.objects.filter(sha256=digest) \
+        .exclude(file='').only('file').first()
+
+    return optimized.file if optimized else None
@@ -0,0 +1,109 @@
+"""Keyset pagination of the letters concerning a student.
+
+Letters are ordered from newest to oldest by (date_published, id).
+Instead of an offset, each page is identified by the key of the last
+letter on the previous page, so every page costs the same no matter how
+many letters a student has accumulated over the years.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Letter
+
+
+def student_letters(student, viewed=None):
+    """Return all published letters concerning a student, newest first.
+
+    Every letter is annotated with 'viewed', telling whether it has
+    already been viewed for that student.
+
+    :param student: Student whose letters are returned
+    :type student: Student
+    :param viewed: Only return letters that have (True) or have not (False)
+        been viewed yet; None returns all letters
+    :type viewed: bool
+    :return: QuerySet of Letter objects
+    """
+
+    query = Letter.objects.filter(
+        Q(classes_concerned=student.class_group_id)
+        | Q(groups_concerned__in=student.groups.values('id')),
+        date_published__lte=timezone.now(),
+    ).annotate(viewed=Exists(Letter.students_viewed.through.objects.filter(
+        letter_id=OuterRef('pk'), student_id=student.id)))
+
+    if viewed is not None:
+        query = query.filter(viewed=viewed)
+
+    return query.distinct().order_by('-date_published', '-id')
+
+
+def encode_cursor(letter):
+    """Return the key of a letter as a string.
+
+    :param letter: Letter object or dictionary as returned by values()
+    :return: Cursor pointing behind that letter
+    :rtype: str
+    """
+
+    if isinstance(letter, dict):
+        return f"{letter['date_published'].isoformat()}_{letter['id']}"
+
+    return f"{letter.date_published.isoformat()}_{letter.id}"
+
+
+def decode_cursor(cursor):
+    """Return publication date and id from a cursor string.
+
+    :param cursor: Cursor as returned by encode_cursor
+    :type cursor: str
+    :raises ValueError: Cursor is not valid
+    :return: Tuple of publication date and id
+    :rtype: tuple
+    """
+
+    date, letter_id = cursor.split('_')
+
+    return datetime.date.fromisoformat(date), int(letter_id)
+
+
+def letters_page(student, viewed=None, cursor=None, size=None, query=None):
+    """Return one page of letters concerning a student.
+
+    :param student: Student whose letters are returned
+    :type student: Student
+    :param viewed: Filter by view state, see student_letters
+    :type viewed: bool
+    :param cursor: Cursor of the last letter of the previous page; None
+        returns the first page
+    :type cursor: str
+    :param size: Number of letters per page; defaults to LETTERS_PAGE_SIZE
+    :type size: int
+    :param query: QuerySet returned by student_letters to paginate, e.g.
+        with further annotations or values(); must contain date_published
+        and id
+    :raises ValueError: Cursor is not valid
+    :return: Tuple of list of letters and cursor of the next page, which is
+        None if this is the last page
+    :rtype: tuple
+    """
+
+    size = size or settings.LETTERS_PAGE_SIZE
+    if query is None:
+        query = student_letters(student, viewed)
+
+    if cursor:
+        date, letter_id = decode_cursor(cursor)
+        query = query.filter(Q(date_published__lt=date)
+                             | Q(date_published=date, id__lt=letter_id))
+
+    # Fetch one more letter to find out whether there is another page:
+    letters = list(query[:size + 1])
+    if len(letters) > size:
+        return letters[:size], encode_cursor(letters[size - 1])
+
+    return letters, None
@@ -0,0 +1,75 @@
+"""Confirmation reminders for the letters app of the elternbrief project.
+
+Collects all parents that still have to confirm one or more letters for
+any of their children and sends each of them one combined reminder mail.
+"""
+
+from django.utils import timezone
+
+from .audience import outstanding_counts
+from .mail import letter_recipients, build_messages, send_batched
+from .models import Letter
+
+
+def outstanding_recipients(letters):
+    """Return all parents that still have to confirm any of the given letters.
+
+    Students that already have a Response for a letter are excluded with an
+    anti-join, so no student objects have to be compared in Python.
+
+    :param letters: Iterable of Letter objects or ids
+    :return: Dictionary mapping user ids to dictionaries which map student ids
+        to lists of outstanding letter ids
+    :rtype: dict
+    """
+
+    return letter_recipients(letters, unconfirmed_only=True)
+
+
+def letters_due_for_reminder():
+    """Return all published letters that still accept confirmations.
+
+    Letters without a deadline are included, as well as letters whose
+    deadline has not passed yet.
+
+    :return: QuerySet of Letter objects
+    """
+
+    today = timezone.localdate()
+
+    return Letter.objects.filter(
+        confirmation=True,
+        date_published__lte=today,
+    ).exclude(date_due__lt=today)
+
+
+def send_reminders(letters=None, dry_run=False):
+    """Send reminder mails for all outstanding confirmations.
+
+    Every parent receives one mail listing all outstanding letters of all
+    their children.
+
+    :param letters: Letters to remind of; defaults to all letters that
+        still accept confirmations
+    :param dry_run: Whether to only render the mails without sending them
+    :type dry_run: bool
+    :return: List of rendered EmailMessage objects
+    :rtype: list
+    """
+
+    if letters is None:
+        letters = letters_due_for_reminder().values_list('id', flat=True)
+
+    # Letters everyone has confirmed are left out before fetching parents:
+    counts = outstanding_counts(getattr(letter, 'id', letter)
+                                for letter in letters)
+    letters = [letter_id for letter_id, number in counts.items() if number]
+
+    messages = build_messages(outstanding_recipients(letters),
+                              "Erinnerung: Unbestätigte Elternbriefe",
+                              'reminder.txt')
+
+    if not dry_run:
+        send_batched(messages)
+
+    return messages
@@ -0,0 +1,333 @@
+"""Import of paper responses to a letter from csv files.
+
+Parents who return paper slips are entered by staff members in a
+spreadsheet, or exported from a scanned checklist, and uploaded on the
+results page of the letter. The first row of the csv file names the
+columns:
+
+* 'ID' with the ID of the student, or 'Nachname' and 'Vorname', and
+  optionally 'Klasse' if names are ambiguous
+* optionally 'Datum' with the date of the response (e.g. 24.12.2020)
+* one column per response field, named by its description
+
+The audience, the existing responses and the response schema of the
+letter are loaded once before reading the file, so that validating a
+row does not query the database. All responses are created with one
+INSERT in a single transaction, and only if no row is invalid.
+Students who have already responded are reported as conflicts and
+skipped.
+"""
+
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .audience import audience_students
+from .events import record_events
+from .models import Response, Event
+from .schema import response_schema, BOOL, SELECTION
+
+ID_COLUMNS = {'id', 'schüler-id'}
+LAST_NAME_COLUMNS = {'nachname', 'last_name'}
+FIRST_NAME_COLUMNS = {'vorname', 'first_name'}
+CLASS_COLUMNS = {'klasse', 'class'}
+DATE_COLUMNS = {'datum', 'date'}
+
+# Values of bool fields, e.g. ticked boxes of a scanned checklist:
+TRUE_VALUES = {'ja', 'j', 'x', '1', 'true', 'yes', '✓'}
+FALSE_VALUES = {'nein', 'n', '', '0', 'false', 'no'}
+
+DATE_FORMATS = ('%d.%m.%Y', '%Y-%m-%d')
+
+
+class ResponseImportError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        self.message = "\n".join(errors)
+        super().__init__(self.message)
+
+
+@dataclass
+class ResponseImport:
+    """Result of importing paper responses."""
+
+    # Students a response has been created for:
+    created: list = field(default_factory=list)
+    # Messages about rows that have been skipped:
+    conflicts: list = field(default_factory=list)
+
+
+def _key(value):
+    """Return a normalized cell for comparisons.
+
+    :type value: str
+    :rtype: str
+    """
+
+    return (value or "").strip().casefold()
+
+
+def _audience(letter):
+    """Return all students concerned by a letter.
+
+    :param letter: The letter
+    :type letter: Letter
+    :return: Dictionary mapping student IDs to dictionaries with 'id',
+        'first_name', 'last_name' and 'class_group_name'
+    :rtype: dict
+    """
+
+    return {s['id']: s for s in audience_students(letter.id)
+            .values('id', 'first_name', 'last_name',
+                    class_group_name=F('class_group__name'))}
+
+
+def _columns(header, schema):
+    """Map the columns of the csv file to what they contain.
+
+    :param header: First row of the csv file
+    :type header: list
+    :param schema: Response schema of the letter
+    :type schema: ResponseSchema
+    :raises ValueError: A column is unknown
+    :return: Dictionary mapping column indexes to 'id', 'last_name',
+        'first_name', 'class', 'date' or a SchemaField
+    :rtype: dict
+    """
+
+    fields = {}
+    for schema_field in schema.fields:
+        fields[_key(schema_field.description)] = schema_field
+        fields[schema_field.name] = schema_field
+
+    columns = {}
+    for index, name in enumerate(header):
+        name = _key(name)
+        for kind, names in (('id', ID_COLUMNS),
+                            ('last_name', LAST_NAME_COLUMNS),
+                            ('first_name', FIRST_NAME_COLUMNS),
+                            ('class', CLASS_COLUMNS),
+                            ('date', DATE_COLUMNS)):
+            if name in names:
+                columns[index] = kind
+                break
+        else:
+            if name not in fields:
+                raise ValueError(f"Unbekannte Spalte '{header[index]}'")
+            columns[index] = fields[name]
+
+    kinds = set(columns.values())
+    if 'id' not in kinds and not {'last_name', 'first_name'} <= kinds:
+        raise ValueError("Es fehlt die Spalte 'ID' oder die Spalten "
+                         "'Nachname' und 'Vorname'.")
+
+    return columns
+
+
+def _value(schema_field, cell):
+    """Convert a cell to the value of a response field.
+
+    :param schema_field: The response field
+    :type schema_field: SchemaField
+    :param cell: Content of the cell
+    :type cell: str
+    :raises ValueError: The cell contains no valid value
+    :return: Value to be validated by the response schema
+    """
+
+    if schema_field.type == BOOL:
+        if _key(cell) in TRUE_VALUES:
+            return True
+        if _key(cell) in FALSE_VALUES:
+            return False
+        raise ValueError(f"{schema_field.description}: '{cell}' ist weder "
+                         f"ja noch nein")
+
+    if schema_field.type == SELECTION:
+        # Options are matched regardless of case:
+        for option in schema_field.options:
+            if _key(option) == _key(cell):
+                return option
+
+    return cell.strip()
+
+
+def _date(cell):
+    """Parse the date of a response.
+
+    :type cell: str
+    :raises ValueError: The cell contains no valid date
+    :rtype: date
+    """
+
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(cell.strip(), date_format).date()
+        except ValueError:
+            pass
+
+    raise ValueError(f"'{cell}' ist kein gültiges Datum")
+
+
+class _StudentIndex:
+    """Lookup of the students of a letter's audience by ID or name."""
+
+    def __init__(self, audience):
+        self.audience = audience
+        self.names = {}
+        for student in audience.values():
+            self.names.setdefault(
+                (_key(student['last_name']), _key(student['first_name'])),
+                []).append(student)
+
+    def find(self, row):
+        """Return the student a row belongs to.
+
+        :param row: Dictionary with 'id' or 'last_name', 'first_name' and
+            optionally 'class'
+        :type row: dict
+        :raises ValueError: There is no such student in the audience or
+            the name is ambiguous
+        :rtype: dict
+        """
+
+        if row.get('id'):
+            try:
+                student = self.audience.get(int(row['id']))
+            except ValueError:
+                raise ValueError(f"{row['id']} ist keine gültige ID")
+            if student is None:
+                raise ValueError(f"Schüler mit ID {row['id']} ist von diesem "
+                                 f"Brief nicht betroffen")
+            return student
+
+        name = f"{row.get('first_name', '')} {row.get('last_name', '')}"
+        candidates = self.names.get((_key(row.get('last_name')),
+                                     _key(row.get('first_name'))), [])
+        if row.get('class'):
+            candidates = [s for s in candidates
+                          if _key(s['class_group_name']) == _key(row['class'])]
+
+        if not candidates:
+            raise ValueError(f"Schüler {name} ist von diesem Brief nicht "
+                             f"betroffen")
+        if len(candidates) > 1:
+            raise ValueError(f"Es gibt mehrere Schüler {name}, bitte die "
+                             f"Klasse oder die ID angeben")
+        return candidates[0]
+
+
+def read_responses(import_file, letter):
+    """Read and validate a csv file with paper responses to a letter.
+
+    :param import_file: UploadedFile object wrapping a csv file, UTF-8
+        encoded and separated by commas or semicolons
+    :param letter: The letter
+    :type letter: Letter
+    :raises ResponseImportError: The file or any of its rows is invalid
+    :return: Responses to be created and the conflicts found
+    :rtype: tuple
+    """
+
+    import_file.seek(0)
+    try:
+        # Spreadsheet programs often add a byte order mark:
+        text = import_file.read().decode('utf-8-sig')
+    except UnicodeError as e:
+        raise ResponseImportError([f"In {import_file.name}: {e}"])
+
+    try:
+        dialect = csv.Sniffer().sniff(text.partition("\n")[0], ',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(text), dialect)
+
+    schema = response_schema(letter.id)
+    try:
+        columns = _columns(next(reader, []), schema)
+    except ValueError as e:
+        raise ResponseImportError([f"In {import_file.name}:1: {e}"])
+
+    students = _StudentIndex(_audience(letter))
+    responded = dict(Response.objects.filter(letter=letter)
+                     .values_list('student_id', 'response_date'))
+
+    responses = []
+    conflicts = []
+    errors = []
+    seen = set()
+    for line, cells in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in cells):
+            continue
+        location = f"{import_file.name}:{line}"
+
+        try:
+            if len(cells) > len(columns):
+                raise ValueError("Zeile enthält zu viele Felder")
+
+            row = {}
+            values = {}
+            for index, cell in enumerate(cells):
+                column = columns[index]
+                if isinstance(column, str):
+                    row[column] = cell.strip()
+                else:
+                    values[column.name] = _value(column, cell)
+
+            student = students.find(row)
+            content = schema.validate(values)
+            date = _date(row['date']) if row.get('date') \
+                else timezone.localdate()
+        except ValueError as e:
+            errors.append(f"In {location}: {e}")
+            continue
+
+        name = f"{student['first_name']} {student['last_name']}"
+        if student['id'] in responded:
+            conflicts.append(f"In {location}: {name} hat bereits am "
+                             f"{responded[student['id']]:%d.%m.%Y} "
+                             f"bestätigt.")
+        elif student['id'] in seen:
+            conflicts.append(f"In {location}: {name} steht mehrfach in der "
+                             f"Datei.")
+        else:
+            seen.add(student['id'])
+            responses.append((student, content, date))
+
+    if errors:
+        raise ResponseImportError(errors)
+
+    return responses, conflicts
+
+
+@transaction.atomic
+def import_responses(import_file, letter):
+    """Create the responses of a csv file with paper responses to a letter.
+
+    :param import_file: UploadedFile object wrapping a csv file
+    :param letter: The letter
+    :type letter: Letter
+    :raises ResponseImportError: The file or any of its rows is invalid
+    :rtype: ResponseImport
+    """
+
+    responses, conflicts = read_responses(import_file, letter)
+
+    Response.objects.bulk_create(
+        [Response(letter=letter, student_id=student['id'], response_date=date,
+                  content=json.dumps(content))
+         for student, content, date in responses])
+
+    student_ids = [student['id'] for student, _, _ in responses]
+    transaction.on_commit(lambda: record_events(
+        Event.CONFIRMATION, letter.id, student_ids))
+
+    return ResponseImport([student for student, _, _ in responses],
+                          conflicts)
+
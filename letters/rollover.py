@@ -0,0 +1,172 @@
+"""End-of-year rollover for the letters app of the elternbrief project.
+
+At the end of a school year every student advances to the next class
+(e.g. 5a to 6a), students of the final grade leave school and group
+memberships start from scratch.
+
+The rollover is planned in memory first, so that it can be shown as a diff.
+Applying it takes a handful of statements in one transaction, no matter
+how many students there are:
+- one INSERT creating all missing classes,
+- one UPDATE moving all students at once,
+- one DELETE emptying all groups.
+Graduates are moved to an archive class, which no new letter will concern.
+"""
+
+import re
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, When, Value
+from django.utils import timezone
+
+from .models import ClassGroup, Student
+from .signals import audience_changed
+from .tenants import for_current_school
+
+# Class names consist of the grade followed by an arbitrary suffix:
+CLASS_NAME_REGEX = re.compile(r'^(\d+)(.*)$')
+
+
+@dataclass
+class RolloverPlan:
+    """Planned changes of an end-of-year rollover.
+
+    moves maps the names of all current classes whose students move to the
+    name of their new class. unchanged lists the names of all classes that
+    do not match the rule and are not mapped explicitly.
+    """
+
+    moves: dict = field(default_factory=dict)
+    unchanged: list = field(default_factory=list)
+    student_counts: dict = field(default_factory=dict)
+    archive_class: str = ""
+    group_memberships: int = 0
+
+    def diff(self):
+        """Return a human-readable list of all planned changes.
+
+        :return: List of lines
+        :rtype: list
+        """
+
+        lines = [f"{old} -> {new} ({self.student_counts.get(old, 0)} Schüler)"
+                 for old, new in sorted(self.moves.items())]
+        lines += [f"{name} bleibt unverändert "
+                  f"({self.student_counts.get(name, 0)} Schüler)"
+                  for name in sorted(self.unchanged)]
+        lines.append(f"{self.group_memberships} Gruppenmitgliedschaften "
+                     f"werden gelöscht")
+
+        return lines
+
+
+def next_class_name(name, final_grade):
+    """Return the name of the class following a class.
+
+    :param name: Name of the current class
+    :type name: str
+    :param final_grade: Last grade of the school
+    :type final_grade: int
+    :return: Name of the next class, '' for graduates, None if the name does
+        not contain a grade
+    :rtype: str
+    """
+
+    match = CLASS_NAME_REGEX.match(name)
+    if not match:
+        return None
+
+    grade = int(match.group(1))
+    if grade >= final_grade:
+        return ""
+
+    return f"{grade + 1}{match.group(2)}"
+
+
+def plan_rollover(final_grade, overrides=None, archive_class=None,
+                  reset_groups=True):
+    """Plan the rollover of all classes.
+
+    :param final_grade: Last grade of the school; its students graduate
+    :type final_grade: int
+    :param overrides: Dictionary mapping class names to the names of their
+        next classes, overriding the default rule; '' marks graduates
+    :type overrides: dict
+    :param archive_class: Name of the class graduates are moved to
+    :type archive_class: str
+    :param reset_groups: Whether all group memberships are deleted
+    :type reset_groups: bool
+    :return: Planned changes
+    :rtype: RolloverPlan
+    """
+
+    overrides = overrides or {}
+    archive_class = archive_class or \
+        f"Abgänger {timezone.localdate().year}"
+
+    plan = RolloverPlan(archive_class=archive_class)
+    plan.student_counts = dict(
+        Student.objects.values_list('class_group__name')
+        .annotate(count=Count('pk')).order_by())
+
+    for name in ClassGroup.objects.exclude(name=archive_class) \
+            .values_list('name', flat=True):
+        new_name = overrides[name] if name in overrides \
+            else next_class_name(name, final_grade)
+
+        if new_name is None or new_name == name:
+            plan.unchanged.append(name)
+        else:
+            plan.moves[name] = new_name or archive_class
+
+    if reset_groups:
+        plan.group_memberships = for_current_school(
+            Student.groups.through.objects.all(), 'group__school').count()
+
+    return plan
+
+
+@transaction.atomic
+def apply_rollover(plan):
+    """Apply a planned rollover.
+
+    :param plan: Planned changes as returned by plan_rollover
+    :type plan: RolloverPlan
+    :return: Number of students moved
+    :rtype: int
+    """
+
+    if not plan.moves and not plan.group_memberships:
+        return 0
+
+    # Create all classes that do not exist yet:
+    existing = set(ClassGroup.objects.filter(name__in=plan.moves.values())
+                   .values_list('name', flat=True))
+    ClassGroup.objects.bulk_create(
+        ClassGroup(name=name) for name in set(plan.moves.values()) - existing)
+
+    ids = dict(ClassGroup.objects.filter(
+        name__in=set(plan.moves) | set(plan.moves.values()))
+        .values_list('name', 'id'))
+
+    # Move all students at once, so that 5a -> 6a and 6a -> 7a do not
+    # interfere with each other:
+    students = Student.objects.filter(
+        class_group_id__in=[ids[old] for old in plan.moves])
+    student_ids = list(students.values_list('id', flat=True))
+    count = students.update(class_group=Case(
+        *(When(class_group_id=ids[old], then=Value(ids[new]))
+          for old, new in plan.moves.items()),
+        output_field=IntegerField()))
+
+    if plan.group_memberships:
+        for_current_school(Student.groups.through.objects.all(),
+                           'group__school').delete()
+        student_ids = list(Student.objects.values_list('id', flat=True))
+
+    # Letter audiences are rebuilt once for all affected students:
+    transaction.on_commit(lambda: audience_changed.send(
+        sender=Student, student_ids=student_ids))
+
+    return count
@@ -0,0 +1,235 @@
+"""Response schemas of letters for the letters app of the elternbrief project.
+
+The response fields of a letter (ResponseTextField, ResponseBoolField and
+ResponseSelectionField) are compiled into one ResponseSchema, which
+validates and normalizes submitted responses, provides the fields for
+rendering the confirmation form and formats responses for the results.
+Schemas are kept in Django's cache and removed from it whenever one of
+the letter's fields changes.
+"""
+
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Letter, ResponseTextField, ResponseBoolField, \
+    ResponseSelectionField
+
+CACHE_KEY = 'letters:schema:{}'
+
+TEXT = 'text'
+BOOL = 'bool'
+SELECTION = 'selection'
+
+
+@dataclass(frozen=True)
+class SchemaField:
+    """A response field of a letter."""
+
+    name: str
+    type: str
+    description: str
+    optional: bool = True
+    must_be_true: bool = False
+    options: tuple = ()
+
+    @property
+    def options_list(self):
+        """Return the options of a selection field.
+
+        :rtype: list
+        """
+
+        return list(self.options)
+
+    def definition(self):
+        """Return the definition of this field as used by the JSON API.
+
+        :return: Dictionary with name, type and description, as well as
+            the type's constraints
+        :rtype: dict
+        """
+
+        definition = {'name': self.name, 'type': self.type,
+                      'description': self.description}
+        if self.type == TEXT:
+            definition['optional'] = self.optional
+        elif self.type == BOOL:
+            definition['must_be_true'] = self.must_be_true
+        else:
+            definition['options'] = list(self.options)
+
+        return definition
+
+
+class ResponseSchema:
+    """All response fields of a letter."""
+
+    def __init__(self, fields):
+        """Create a schema.
+
+        :param fields: Text fields, bool fields and selection fields in
+            this order
+        :type fields: list
+        """
+
+        self.fields = tuple(fields)
+        self.text_fields = tuple(f for f in self.fields if f.type == TEXT)
+        self.bool_fields = tuple(f for f in self.fields if f.type == BOOL)
+        self.selection_fields = tuple(f for f in self.fields
+                                      if f.type == SELECTION)
+
+    @classmethod
+    def compile(cls, letter_id):
+        """Load the response fields of a letter with one query per type.
+
+        :param letter_id: ID of the letter
+        :type letter_id: int
+        :rtype: ResponseSchema
+        """
+
+        fields = [SchemaField(f"textfield-{f['id']}", TEXT, f['description'],
+                              optional=f['optional'])
+                  for f in ResponseTextField.objects.filter(letter_id=letter_id)
+                  .order_by('id').values('id', 'description', 'optional')]
+        fields += [SchemaField(f"boolfield-{f['id']}", BOOL, f['description'],
+                               must_be_true=f['must_be_true'])
+                   for f in ResponseBoolField.objects
+                   .filter(letter_id=letter_id).order_by('id')
+                   .values('id', 'description', 'must_be_true')]
+        fields += [SchemaField(f"selectionfield-{f['id']}", SELECTION,
+                               f['description'],
+                               options=tuple(o.strip() for o in
+                                             f['options'].split(",")))
+                   for f in ResponseSelectionField.objects
+                   .filter(letter_id=letter_id).order_by('id')
+                   .values('id', 'description', 'options')]
+
+        return cls(fields)
+
+    def definitions(self):
+        """Return the definitions of all fields as used by the JSON API.
+
+        :rtype: list
+        """
+
+        return [field.definition() for field in self.fields]
+
+    def from_post(self, post):
+        """Return the values submitted with the confirmation form.
+
+        Checkboxes are only submitted if they are checked.
+
+        :param post: POST data of the request
+        :type post: QueryDict
+        :return: Submitted values by field name
+        :rtype: dict
+        """
+
+        return {field.name: field.name in post if field.type == BOOL
+                else post.get(field.name) for field in self.fields}
+
+    def validate(self, data):
+        """Validate and normalize the values submitted for the fields.
+
+        Values of other keys are ignored.
+
+        :param data: Submitted values by field name
+        :type data: dict
+        :raises ValueError: A value is missing or invalid
+        :return: Response content by field name
+        :rtype: dict
+        """
+
+        content = {}
+        for field in self.fields:
+            value = data.get(field.name)
+
+            if field.type == TEXT:
+                value = str(value or "").strip()
+                if not value and not field.optional:
+                    raise ValueError(f"{field.description}: Pflichtfeld")
+            elif field.type == BOOL:
+                value = bool(value)
+                if not value and field.must_be_true:
+                    raise ValueError(f"{field.description}: Muss ausgewählt "
+                                     f"werden")
+            elif value not in field.options:
+                raise ValueError(f"{field.description}: Ungültige Auswahl")
+
+            content[field.name] = value
+
+        return content
+
+    def columns(self):
+        """Return the fields shown as columns of the results table.
+
+        :return: List of tuples of name and description
+        :rtype: list
+        """
+
+        return [(field.name, field.description) for field in self.fields
+                if field.type != TEXT]
+
+    def display(self, content):
+        """Return a response's values as shown in the results table.
+
+        :param content: Response content by field name
+        :type content: dict
+        :return: Human-readable values by field name
+        :rtype: dict
+        """
+
+        data = {}
+        for field in self.fields:
+            if field.type == BOOL:
+                data[field.name] = "Ja" if content.get(field.name) else "Nein"
+            elif field.type == SELECTION:
+                data[field.name] = content.get(field.name)
+
+        return data
+
+
+def response_schema(letter_id):
+    """Return the response schema of a letter, compiling it if necessary.
+
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :rtype: ResponseSchema
+    """
+
+    key = CACHE_KEY.format(letter_id)
+    schema = cache.get(key)
+    if schema is None:
+        schema = ResponseSchema.compile(letter_id)
+        cache.set(key, schema, settings.FRAGMENT_CACHE_TIMEOUT)
+
+    return schema
+
+
+@receiver(post_save, sender=ResponseTextField)
+@receiver(post_save, sender=ResponseBoolField)
+@receiver(post_save, sender=ResponseSelectionField)
+@receiver(post_delete, sender=ResponseTextField)
+@receiver(post_delete, sender=ResponseBoolField)
+@receiver(post_delete, sender=ResponseSelectionField)
+@receiver(post_save, sender=Letter)
+@receiver(post_delete, sender=Letter)
+def invalidate_schema(sender, instance, **kwargs):
+    """Remove a letter's schema from the cache after a field changed.
+
+    Saved and deleted letters are removed as well, as the IDs of deleted
+    letters may be used again.
+
+    The schema is removed once more after the transaction has been
+    committed, in case it was compiled from the old fields meanwhile.
+    """
+
+    key = CACHE_KEY.format(instance.letter_id if sender is not Letter
+                           else instance.id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,199 @@
+"""Full-text search over letters for the letters app of the elternbrief project.
+
+Name, teacher and the text of the document of every letter are kept in a
+search index, which is a SQLite FTS5 table or a MySQL table with a
+FULLTEXT index depending on the database in use.
+The index is created after 'manage.py migrate' and updated whenever a
+letter is saved or deleted and whenever the text of its document has
+been extracted.
+With other databases, letters are searched by name and teacher with
+simple LIKE queries.
+"""
+
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .models import Letter, DocumentText
+
+TABLE = 'letters_search'
+
+CREATE_TABLE = {
+    'sqlite': f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+              f"name, teacher, content, "
+              f"tokenize = 'unicode61 remove_diacritics 2')",
+    'mysql': f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+             f"letter_id INTEGER NOT NULL PRIMARY KEY, "
+             f"name VARCHAR(30) NOT NULL, teacher VARCHAR(30) NOT NULL, "
+             f"content LONGTEXT NOT NULL, "
+             f"FULLTEXT KEY {TABLE}_text (name, teacher, content)"
+             f") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4",
+}
+
+# Every query returns the IDs of all matching letters:
+MATCH = {
+    'sqlite': f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s",
+    'mysql': f"SELECT letter_id FROM {TABLE} "
+             f"WHERE MATCH (name, teacher, content) AGAINST (%s IN BOOLEAN MODE)",
+}
+
+DELETE = {
+    'sqlite': f"DELETE FROM {TABLE} WHERE rowid = %s",
+    'mysql': f"DELETE FROM {TABLE} WHERE letter_id = %s",
+}
+
+INSERT = {
+    'sqlite': f"INSERT INTO {TABLE} (rowid, name, teacher, content) "
+              f"VALUES (%s, %s, %s, %s)",
+    'mysql': f"REPLACE INTO {TABLE} (letter_id, name, teacher, content) "
+             f"VALUES (%s, %s, %s, %s)",
+}
+
+
+def _vendor():
+    """Return the database vendor if it supports a search index.
+
+    :return: 'sqlite', 'mysql' or None
+    :rtype: str
+    """
+
+    return connection.vendor if connection.vendor in CREATE_TABLE else None
+
+
+def _terms(query):
+    """Split a search query into words.
+
+    :param query: Search query entered by a user
+    :type query: str
+    :return: List of words
+    :rtype: list
+    """
+
+    return re.findall(r'\w+', query)
+
+
+def _match_expression(terms, vendor):
+    """Return a full-text query finding all words as prefixes.
+
+    :param terms: Words as returned by _terms
+    :type terms: list
+    :param vendor: Database vendor
+    :type vendor: str
+    :return: Query in the syntax of the database's full-text search
+    :rtype: str
+    """
+
+    if vendor == 'sqlite':
+        return " ".join(f'"{term}"*' for term in terms)
+
+    return " ".join(f"+{term}*" for term in terms)
+
+
+def create_index():
+    """Create the search index if it does not exist yet."""
+
+    vendor = _vendor()
+    if vendor:
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_TABLE[vendor])
+
+
+def index_letters(letter_ids):
+    """Add letters to the search index or update their entries.
+
+    Letters that do not exist anymore are removed from the index.
+
+    :param letter_ids: IDs of the letters
+    :type letter_ids: list
+    """
+
+    vendor = _vendor()
+    if not vendor:
+        return
+
+    letters = list(Letter.objects.filter(id__in=letter_ids)
+                   .values_list('id', 'name', 'teacher', 'document_hash'))
+    texts = dict(DocumentText.objects
+                 .filter(sha256__in=[letter[3] for letter in letters])
+                 .values_list('sha256', 'text'))
+
+    rows = [(letter_id, name, teacher, texts.get(document_hash, ""))
+            for letter_id, name, teacher, document_hash in letters]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(DELETE[vendor], [(i,) for i in letter_ids])
+        cursor.executemany(INSERT[vendor], rows)
+
+
+def rebuild_index():
+    """Rebuild the search index from all letters.
+
+    :return: Number of letters indexed
+    :rtype: int
+    """
+
+    if not _vendor():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+    letter_ids = list(Letter.objects.values_list('id', flat=True))
+    index_letters(letter_ids)
+
+    return len(letter_ids)
+
+
+def search(letters, query):
+    """Return the letters matching a search query.
+
+    Every word of the query has to appear in the letter's name, teacher or
+    document, possibly as the beginning of a longer word.
+
+    :param letters: QuerySet of letters to be searched, e.g. the letters a
+        user may see
+    :param query: Search query entered by a user
+    :type query: str
+    :return: QuerySet of matching letters
+    """
+
+    terms = _terms(query)
+    if not terms:
+        return letters.none()
+
+    vendor = _vendor()
+    if not vendor:
+        for term in terms:
+            letters = letters.filter(Q(name__icontains=term)
+                                     | Q(teacher__icontains=term))
+        return letters
+
+    return letters.filter(id__in=RawSQL(
+        MATCH[vendor], [_match_expression(terms, vendor)]))
+
+
+@receiver(post_migrate)
+def create_index_after_migrate(sender, **kwargs):
+    """Create the search index after the letters app has been migrated."""
+
+    if sender.name == 'letters':
+        create_index()
+
+
+@receiver(post_save, sender=Letter)
+def index_saved_letter(sender, instance, **kwargs):
+    """Update the search index once a saved letter has been committed."""
+
+    transaction.on_commit(lambda: index_letters([instance.id]))
+
+
+@receiver(post_delete, sender=Letter)
+def remove_deleted_letter(sender, instance, **kwargs):
+    """Remove a deleted letter from the search index."""
+
+    letter_id = instance.id
+    transaction.on_commit(lambda: index_letters([letter_id]))
@@ -0,0 +1,8 @@
+"""Custom signals of the letters app of the elternbrief project."""
+
+from django.dispatch import Signal
+
+# Sent once after the audience of letters may have changed in bulk, e.g.
+# because students were moved to another class or added to a group.
+# Provides the argument 'student_ids' with the ids of all affected students.
+audience_changed = Signal()
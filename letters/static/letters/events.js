@@ -0,0 +1,23 @@
+// Wait for new letters and confirmations and reload the page once there are any:
+(() => {
+    const url = document.currentScript.dataset.url;
+
+    function poll(cursor) {
+        const query = cursor === undefined ? "" : "?after=" + cursor;
+
+        fetch(url + query, {credentials: "same-origin"})
+            .then(response => response.json())
+            .then(data => {
+                if (data.events.length) {
+                    window.location.reload();
+                } else {
+                    // The server asks to wait if it cannot wait itself:
+                    setTimeout(() => poll(data.cursor), data.retry * 1000);
+                }
+            })
+            // Try again later if the server cannot be reached:
+            .catch(() => setTimeout(() => poll(cursor), 10000));
+    }
+
+    poll();
+})();
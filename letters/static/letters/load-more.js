@@ -0,0 +1,32 @@
+// Append the next page of letters to the list in front of a "load more" button:
+document.querySelectorAll(".load-more").forEach(button => {
+    button.addEventListener("click", () => {
+        const url = button.dataset.url + "&cursor=" + encodeURIComponent(button.dataset.cursor);
+        const list = button.previousElementSibling;
+
+        fetch(url, {credentials: "same-origin"})
+            .then(response => response.json())
+            .then(data => {
+                data.letters.forEach(letter => {
+                    const item = document.createElement("li");
+                    const link = document.createElement("a");
+                    item.className = "list-group-item";
+                    link.href = letter.url;
+                    if (!letter.viewed) {
+                        const icon = document.createElement("ion-icon");
+                        icon.setAttribute("name", "warning");
+                        link.append(icon, " ");
+                    }
+                    link.append(letter.name);
+                    item.append(link);
+                    list.append(item);
+                });
+
+                if (data.cursor) {
+                    button.dataset.cursor = data.cursor;
+                } else {
+                    button.remove();
+                }
+            });
+    });
+});
@@ -1,6 +1,9 @@
 const pdfUrl = document.querySelector(".pdf-link")["href"];
 const canvas = document.querySelector(".pdf-canvas");
 
+// The worker cannot be found by pdf.js itself, as the names of static files contain hashes:
+pdfjsLib.GlobalWorkerOptions.workerSrc = document.getElementById("pdfjs").dataset.workerSrc;
+
 const loadingTask = pdfjsLib.getDocument(pdfUrl);
 loadingTask.promise.then(pdf => {
     pdf.getPage(1).then(page => {
@@ -0,0 +1,175 @@
+"""Storage and serving of static files for the elternbrief project.
+
+'manage.py collectstatic' stores every static file under a name containing
+a hash of its content (e.g. custom.3d5a8f0e9b1c.css) next to the original,
+and precompresses text files with gzip and, if the brotli package is
+installed, with brotli.
+Files with hashed names never change, so StaticFilesMiddleware lets
+browsers cache them for STATIC_MAX_AGE. Other files, e.g. chunks loaded by
+the ionicons and pdf.js scripts themselves, have to be revalidated.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, \
+    staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only these files are worth compressing, others are compressed already:
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json',
+                         '.txt', '.html', '.ttf', '.eot')
+
+# Name of a file as stored by StaticFilesStorage.post_process:
+HASHED_NAME = re.compile(r'^(.*)\.[0-9a-f]{12}(\.[^./]+)$')
+
+
+def _compress(path):
+    """Store compressed variants of a file next to it.
+
+    A variant is only stored if it is noticeably smaller than the file.
+
+    :param path: Path of the file
+    :type path: str
+    """
+
+    with open(path, 'rb') as file:
+        content = file.read()
+
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content)
+
+    for extension, compressed in variants.items():
+        if len(compressed) < len(content) * 0.95:
+            with open(path + extension, 'wb') as file:
+                file.write(compressed)
+
+
+class StaticFilesStorage(ManifestStaticFilesStorage):
+    """Storage for static files with hashed and precompressed names.
+
+    Unlike ManifestStaticFilesStorage, files that have not been collected
+    yet, e.g. while running tests, are referred to by their original names
+    instead of raising an error.
+    """
+
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            # Files referenced by collected CSS files have to exist:
+            if getattr(self, 'collecting', False):
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        self.collecting = True
+        try:
+            yield from super().post_process(paths, dry_run, **options)
+        finally:
+            self.collecting = False
+
+        if dry_run:
+            return
+
+        # Compress original as well as hashed files:
+        for name in set(paths) | set(self.hashed_files.values()):
+            if name.endswith(COMPRESSED_EXTENSIONS):
+                _compress(self.path(name))
+
+
+def _is_hashed(name):
+    """Return whether a static file is stored under a hashed name.
+
+    :param name: Name of the file relative to STATIC_ROOT
+    :type name: str
+    :rtype: bool
+    """
+
+    match = HASHED_NAME.match(name)
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+
+    return bool(match) \
+        and hashed_files.get(match.group(1) + match.group(2)) == name
+
+
+def serve(request, name):
+    """Serve a file from STATIC_ROOT, compressed if the browser accepts it.
+
+    :param request: Current request
+    :param name: Name of the file relative to STATIC_ROOT
+    :type name: str
+    :return: The file or an empty response if the browser's copy is up to
+        date
+    """
+
+    path = safe_join(settings.STATIC_ROOT, name)
+    if not os.path.isfile(path):
+        raise Http404("Datei nicht gefunden")
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encoding = None
+    for extension, candidate in (('.br', 'br'), ('.gz', 'gzip')):
+        if candidate in accepted and os.path.isfile(path + extension):
+            path, encoding = path + extension, candidate
+            break
+
+    stat = os.stat(path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type,
+                                filename=os.path.basename(name))
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    if _is_hashed(name):
+        response['Cache-Control'] = f"public, max-age=" \
+            f"{int(settings.STATIC_MAX_AGE.total_seconds())}, immutable"
+    else:
+        response['Cache-Control'] = "public, no-cache"
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    return response
+
+
+class StaticFilesMiddleware:
+    """Middleware serving static files collected to STATIC_ROOT.
+
+    Requests for static files are answered before sessions and users are
+    loaded. Not used in debug mode, where 'manage.py runserver' serves
+    static files itself. Web servers in front of the project may serve
+    STATIC_ROOT directly instead, using the precompressed files.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path_info.startswith(settings.STATIC_URL) \
+                and request.method in ('GET', 'HEAD'):
+            return serve(request, request.path_info[len(settings.STATIC_URL):])
+
+        return self.get_response(request)
@@ -5,6 +5,8 @@ Contains class definitions for dynamically generating tables using
 the django_tables2 app.
 """
 
+import json
+
 import django_tables2 as tables
 
 
@@ -26,6 +28,31 @@ class LetterResultTable(tables.Table):
         }
 
 
+class ResponseColumn(tables.Column):
+    """Displays one response field of the rows of a LetterResultTable.
+
+    Reads the field from the row's response content, which is only decoded
+    for the rows actually displayed.
+    """
+
+    def __init__(self, schema, field_name, **kwargs):
+        super().__init__(accessor='content', orderable=False, empty_values=(),
+                         **kwargs)
+        self.schema = schema
+        self.field_name = field_name
+
+    def render(self, value):
+        if value is None:
+            return self.default
+
+        try:
+            content = json.loads(value)
+        except json.JSONDecodeError:
+            return self.default
+
+        return self.schema.display(content).get(self.field_name)
+
+
 class UserImportParentsTable(tables.Table):
     """Displays all the users that have been created via the user import feature."""
 
@@ -0,0 +1,221 @@
+"""Schools sharing one deployment of the elternbrief project.
+
+Every class group, group, student, letter and profile belongs to a school.
+The school of a request is determined by the hostname it was sent to and
+kept in a context variable while the request is handled. The default
+managers of these models only return objects of the current school, and
+new objects belong to it, so views, forms and the admin site need not
+know about schools at all.
+
+Without any School objects, e.g. for a single school, nothing is scoped
+and everything behaves as before.
+
+Keys of Django's cache are prefixed with the current school, so cached
+values and version tokens of one school are never invalidated by changes
+made in another one.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError, \
+    OutputWrapper
+from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.http import Http404
+
+SCHOOLS_KEY = 'letters:schools'
+
+_school_id = ContextVar('school_id', default=None)
+
+
+def current_school_id():
+    """Return the ID of the school the current request belongs to.
+
+    :return: ID of the current school or None if nothing is scoped
+    :rtype: int
+    """
+
+    return _school_id.get()
+
+
+@contextmanager
+def use_school(school_id):
+    """Scope all queries within the block to a school.
+
+    :param school_id: ID of the school or None to scope nothing
+    :type school_id: int
+    """
+
+    token = _school_id.set(school_id)
+    try:
+        yield
+    finally:
+        _school_id.reset(token)
+
+
+def for_current_school(queryset, path='school'):
+    """Filter a queryset by the current school, if there is one.
+
+    :param queryset: QuerySet to be filtered
+    :param path: Lookup path from the queryset's model to its school
+    :type path: str
+    :return: Filtered QuerySet
+    """
+
+    school_id = current_school_id()
+    if school_id is None:
+        return queryset
+
+    return queryset.filter(**{path: school_id})
+
+
+class SchoolManager(models.Manager):
+    """Manager returning the objects of the current school only."""
+
+    def get_queryset(self):
+        return for_current_school(super().get_queryset())
+
+
+def schools():
+    """Return all schools by hostname.
+
+    :return: Dictionary mapping hostnames to school ids
+    :rtype: dict
+    """
+
+    # The models depend on this module:
+    from .models import School
+
+    # Shared by all schools:
+    with use_school(None):
+        return cache.get_or_set(
+            SCHOOLS_KEY,
+            lambda: dict(School.objects.values_list('hostname', 'id')), None)
+
+
+@receiver(post_save, sender='letters.School')
+@receiver(post_delete, sender='letters.School')
+def forget_schools(sender, **kwargs):
+    """Reload the hostnames of all schools after one has changed."""
+
+    with use_school(None):
+        cache.delete(SCHOOLS_KEY)
+
+
+def current_hostname():
+    """Return the hostname of the current school.
+
+    :return: Hostname used in links, HOSTNAME if nothing is scoped
+    :rtype: str
+    """
+
+    school_id = current_school_id()
+    for hostname, i in schools().items():
+        if i == school_id:
+            return hostname
+
+    return settings.HOSTNAME
+
+
+def make_key(key, key_prefix, version):
+    """Return the key of a cache entry of the current school.
+
+    Used as KEY_FUNCTION of the cache.
+    """
+
+    school_id = current_school_id()
+    if school_id is None:
+        return f"{key_prefix}:{version}:{key}"
+
+    return f"{key_prefix}:{version}:school-{school_id}:{key}"
+
+
+class SchoolMiddleware:
+    """Scope every request to the school of its hostname.
+
+    Responds with 404 to requests for unknown hostnames once there is
+    any school.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        hostnames = schools()
+        if not hostnames:
+            return self.get_response(request)
+
+        school_id = hostnames.get(request.get_host().partition(':')[0])
+        if school_id is None:
+            raise Http404("Unbekannte Schule.")
+
+        with use_school(school_id):
+            return self.get_response(request)
+
+
+class SchoolBackend(ModelBackend):
+    """Authentication backend for users of the current school.
+
+    Extends Django's ModelBackend.
+    Users whose profile belongs to no school may log in at every school.
+    """
+
+    def user_can_authenticate(self, user):
+        if not super().user_can_authenticate(user):
+            return False
+
+        school_id = current_school_id()
+        profile = getattr(user, 'profile', None)
+
+        return school_id is None or profile is None \
+            or profile.school_id in (None, school_id)
+
+    def get_user(self, user_id):
+        user_model = get_user_model()
+        try:
+            user = user_model._default_manager.select_related('profile') \
+                .get(pk=user_id)
+        except user_model.DoesNotExist:
+            return None
+
+        return user if self.user_can_authenticate(user) else None
+
+
+class SchoolCommand(BaseCommand):
+    """Management command that is run once for every school.
+
+    Extends Django's BaseCommand.
+    With --school, the command is only run for the school of that
+    hostname. Without any School objects, it is run once unscoped.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument('--school', metavar='HOSTNAME',
+                            help="Nur für die Schule mit diesem Hostnamen")
+
+        return parser
+
+    def execute(self, *args, **options):
+        hostnames = schools()
+        if options.get('school'):
+            if options['school'] not in hostnames:
+                raise CommandError(f"Unbekannte Schule '{options['school']}'.")
+            hostnames = {options['school']: hostnames[options['school']]}
+
+        if not hostnames:
+            return super().execute(*args, **options)
+
+        if options.get('stdout'):
+            self.stdout = OutputWrapper(options['stdout'])
+
+        for hostname, school_id in sorted(hostnames.items()):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{hostname}:"))
+            with use_school(school_id):
+                super().execute(*args, **options)
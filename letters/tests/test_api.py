@@ -0,0 +1,109 @@
+import json
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from ..models import ClassGroup, Student, Letter, Response, ResponseBoolField, ResponseSelectionField
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        class_a = ClassGroup.objects.create(name="Class A")
+        class_b = ClassGroup.objects.create(name="Class B")
+        self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        self.other = Student.objects.create(first_name="Jane", last_name="Roe", class_group=class_b)
+
+        self.letter = Letter.objects.create(name="Test letter A", document="documents/test.pdf")
+        self.letter.classes_concerned.add(class_a)
+        self.bool_field = ResponseBoolField.objects.create(letter=self.letter, description="Agreed?",
+                                                           must_be_true=True)
+        self.selection_field = ResponseSelectionField.objects.create(letter=self.letter, description="Meal",
+                                                                     options="Meat, Vegetarian")
+        self.other_letter = Letter.objects.create(name="Test letter B", document="documents/test.pdf")
+        self.other_letter.classes_concerned.add(class_b)
+
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(self.student)
+        self.client.force_login(self.parent)
+
+        self.letter_url = f'/api/children/{self.student.id}/letters/{self.letter.id}/'
+
+    def test_login_required(self):
+        """Requests by anonymous users are answered with 401."""
+
+        self.client.logout()
+
+        self.assertEqual(self.client.get('/api/children/').status_code, 401)
+
+    def test_children(self):
+        """The user's children are listed with their class."""
+
+        self.assertEqual(self.client.get('/api/children/').json(), {'children': [
+            {'id': self.student.id, 'first_name': "John", 'last_name': "Doe", 'class_group_name': "Class A"},
+        ]})
+
+    def test_letters_with_flags(self):
+        """Letters of a child carry their viewed and confirmed flags."""
+
+        data = self.client.get(f'/api/children/{self.student.id}/letters/').json()
+
+        self.assertEqual([letter['id'] for letter in data['letters']], [self.letter.id])
+        self.assertFalse(data['letters'][0]['viewed'])
+        self.assertFalse(data['letters'][0]['confirmed'])
+        self.assertIsNone(data['cursor'])
+
+    def test_other_students_forbidden(self):
+        """Letters of students that are not the user's children are not returned."""
+
+        self.assertEqual(self.client.get(f'/api/children/{self.other.id}/letters/').status_code, 403)
+        self.assertEqual(
+            self.client.get(f'/api/children/{self.student.id}/letters/{self.other_letter.id}/').status_code, 404)
+
+    def test_letter_marks_viewed(self):
+        """Requesting a letter returns its fields and marks it as viewed."""
+
+        data = self.client.get(self.letter_url).json()
+
+        self.assertEqual([field['name'] for field in data['fields']],
+                         [self.bool_field.name, self.selection_field.name])
+        self.assertEqual(data['fields'][1]['options'], ["Meat", "Vegetarian"])
+        self.assertIn(self.student, self.letter.students_viewed.all())
+
+    def test_confirm(self):
+        """Valid values are stored as a response, invalid ones are rejected."""
+
+        url = self.letter_url + 'confirm/'
+
+        response = self.client.post(url, json.dumps({self.selection_field.name: "Fish"}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Response.objects.exists())
+
+        response = self.client.post(url, json.dumps({self.bool_field.name: True,
+                                                     self.selection_field.name: "Meat"}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(Response.objects.get().content),
+                         {self.bool_field.name: True, self.selection_field.name: "Meat"})
+
+        response = self.client.post(url, json.dumps({self.bool_field.name: True,
+                                                     self.selection_field.name: "Meat"}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+
+    def test_results_staff_only(self):
+        """Results list every student concerned and are only returned to staff members."""
+
+        url = f'/api/letters/{self.letter.id}/results/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        Response.objects.create(letter=self.letter, student=self.student,
+                                content=json.dumps({self.bool_field.name: True}))
+        staff = User.objects.create(username="staff", is_staff=True)
+        self.client.force_login(staff)
+
+        data = self.client.get(url).json()
+        self.assertEqual([(r['student']['id'], r['confirmed']) for r in data['results']],
+                         [(self.student.id, True)])
+        self.assertEqual(data['results'][0]['content'], {self.bool_field.name: True})
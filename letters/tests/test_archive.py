@@ -0,0 +1,126 @@
+import datetime
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth.models import User
+from django.contrib import admin
+
+from ..archive import letters_to_archive, archive_letters
+from ..models import ClassGroup, Group, Student, Letter, Response, ResponseBoolField, ArchivedLetter
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        self.class_a = ClassGroup.objects.create(name="Class A")
+        self.student_a = Student.objects.create(first_name="John", last_name="Doe", class_group=self.class_a)
+        self.student_b = Student.objects.create(first_name="Jane", last_name="Doe", class_group=self.class_a)
+
+        self.old_letter = Letter.objects.create(name="Old letter",
+                                                date_published=timezone.now() - datetime.timedelta(days=400))
+        self.old_letter.classes_concerned.add(self.class_a)
+        self.old_letter.students_viewed.add(self.student_a)
+        field = ResponseBoolField.objects.create(letter=self.old_letter, description="Agreed?")
+        Response.objects.create(letter=self.old_letter, student=self.student_a,
+                                content=json.dumps({field.name: True}))
+
+        self.new_letter = Letter.objects.create(name="New letter")
+        self.new_letter.classes_concerned.add(self.class_a)
+
+    def test_letters_to_archive(self):
+        """Only letters older than the given age are archived."""
+
+        self.assertQuerysetEqual(letters_to_archive(datetime.timedelta(days=365)), [self.old_letter.id],
+                                 lambda l: l.id)
+
+    def test_archive_letters(self):
+        """Archived letters are removed from the letter tables but keep their results."""
+
+        original_id = self.old_letter.id
+
+        self.assertEqual(archive_letters([self.old_letter]), 1)
+
+        self.assertFalse(Letter.objects.filter(id=original_id).exists())
+        self.assertFalse(Response.objects.filter(letter_id=original_id).exists())
+
+        archived = ArchivedLetter.objects.get(original_id=original_id)
+        rows = {r.first_name: r for r in archived.archivedresponse_set.all()}
+        self.assertTrue(rows["John"].confirmed)
+        self.assertTrue(rows["John"].viewed)
+        self.assertFalse(rows["Jane"].confirmed)
+        self.assertFalse(rows["Jane"].viewed)
+
+        [field] = json.loads(archived.response_fields)
+        self.assertEqual(rows["John"].as_dict([field])[field['name']], "Ja")
+
+    def test_archived_results_reachable(self):
+        """Staff members can still view the results of an archived letter under the same URL."""
+
+        original_id = self.old_letter.id
+        archive_letters([self.old_letter])
+
+        staff = User.objects.create_superuser("staff", "staff@example.com", "staff")
+        self.client.force_login(staff)
+        response = self.client.get(f'/letters/results/{original_id}/', follow=True)
+
+        archived = ArchivedLetter.objects.get(original_id=original_id)
+        self.assertRedirects(response, f'/letters/archive/{archived.id}/results/')
+        self.assertContains(response, "archiviert")
+        self.assertContains(response, "Jane")
+
+    def test_students_fetched_once_per_batch(self):
+        """The students of all letters of a batch are fetched with one query."""
+
+        group = Group.objects.create(name="Group A")
+        other = Student.objects.create(first_name="Max", last_name="Roe",
+                                       class_group=ClassGroup.objects.create(name="Class B"))
+        other.groups.add(group)
+        group_letter = Letter.objects.create(name="Group letter",
+                                             date_published=timezone.now() - datetime.timedelta(days=400))
+        group_letter.groups_concerned.add(group)
+
+        with CaptureQueriesContext(connection) as queries:
+            archive_letters([self.old_letter, group_letter])
+
+        student_queries = [q for q in queries if q['sql'].startswith('SELECT') and 'FROM "letters_student"' in q['sql']]
+        self.assertEqual(len(student_queries), 1)
+        self.assertEqual([r.first_name for r in ArchivedLetter.objects.get(name="Group letter").archivedresponse_set.all()],
+                         ["Max"])
+        self.assertEqual(ArchivedLetter.objects.get(name="Old letter").archivedresponse_set.count(), 2)
+
+    def test_reused_id(self):
+        """Letters whose ID had been used by an archived letter before can be archived as well."""
+
+        original_id = self.old_letter.id
+        archive_letters([self.old_letter])
+        reused = Letter.objects.create(id=original_id, name="Reused",
+                                       date_published=timezone.now() - datetime.timedelta(days=400))
+        archive_letters([reused])
+
+        self.assertEqual(ArchivedLetter.objects.filter(original_id=original_id).count(), 2)
+
+        self.client.force_login(User.objects.create_superuser("staff", "staff@example.com", "staff"))
+        self.assertContains(self.client.get(f'/letters/results/{original_id}/', follow=True), "Reused")
+
+    def test_archived_results_with_live_letter_reusing_id(self):
+        """The results of an archived letter stay reachable while a current letter uses its former ID."""
+
+        original_id = self.old_letter.id
+        archive_letters([self.old_letter])
+        archived = ArchivedLetter.objects.get(original_id=original_id)
+        Letter.objects.create(id=original_id, name="Live letter")
+
+        self.client.force_login(User.objects.create_superuser("staff", "staff@example.com", "staff"))
+
+        url = admin.site._registry[ArchivedLetter].get_view_on_site_url(archived)
+        response = self.client.get(url)
+        self.assertContains(response, "Old letter")
+        self.assertContains(response, "archiviert")
+        self.assertNotContains(response, "Live letter")
+
+        response = self.client.get(f'/letters/results/{original_id}/')
+        self.assertContains(response, "Live letter")
+        self.assertNotContains(response, "archiviert")
@@ -0,0 +1,117 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..audience import audience, bitmap, confirmed, count, members, outstanding, outstanding_counts
+from ..bulk import move_students
+from ..models import ClassGroup, Group, Student, Letter, Response
+
+
+class AudienceTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.class_a = ClassGroup.objects.create(name="Class A")
+        self.class_b = ClassGroup.objects.create(name="Class B")
+        self.group = Group.objects.create(name="Group")
+        self.john = Student.objects.create(first_name="John", last_name="Doe", class_group=self.class_a)
+        self.jane = Student.objects.create(first_name="Jane", last_name="Doe", class_group=self.class_b)
+        self.max = Student.objects.create(first_name="Max", last_name="Muster", class_group=self.class_b)
+        self.john.groups.add(self.group)
+        self.jane.groups.add(self.group)
+
+        self.letter = Letter.objects.create(name="Test letter", document="documents/test.pdf")
+        self.letter.classes_concerned.add(self.class_a)
+        self.letter.groups_concerned.add(self.group)
+
+    def test_bitmaps(self):
+        """Bitmaps contain exactly the given ids."""
+
+        ids = [0, 1, 7, 8, 100, 1000]
+
+        self.assertEqual(members(bitmap(ids)), ids)
+        self.assertEqual(count(bitmap(ids)), len(ids))
+        self.assertEqual(members(bitmap([])), [])
+
+    def test_audience(self):
+        """The audience is the union of classes and groups, outstanding students have not responded."""
+
+        Response.objects.create(letter=self.letter, student=self.jane)
+
+        self.assertEqual(members(audience(self.letter.id)), [self.john.id, self.jane.id])
+        self.assertEqual(members(confirmed(self.letter.id)), [self.jane.id])
+        self.assertEqual(members(outstanding(self.letter.id)), [self.john.id])
+        self.assertEqual(self.letter.students_not_confirmed, {self.john})
+
+    def test_outstanding_counts(self):
+        """Outstanding confirmations of several letters are counted with three queries."""
+
+        other = Letter.objects.create(name="Other letter", document="documents/other.pdf")
+        other.classes_concerned.add(self.class_b)
+        Response.objects.create(letter=self.letter, student=self.jane)
+        Response.objects.create(letter=other, student=self.jane)
+        Response.objects.create(letter=other, student=self.max)
+        outstanding_counts([self.letter.id, other.id])
+
+        with self.assertNumQueries(3):
+            counts = outstanding_counts([self.letter.id, other.id])
+
+        self.assertEqual(counts, {self.letter.id: 1, other.id: 0})
+
+    def test_counts_shown(self):
+        """Results page and overview show the numbers of confirmations."""
+
+        Response.objects.create(letter=self.letter, student=self.jane)
+        teacher = User.objects.create(username="teacher", is_staff=True)
+        Letter.objects.filter(id=self.letter.id).update(created_by=teacher)
+        self.client.force_login(teacher)
+
+        self.assertContains(self.client.get(f'/letters/results/{self.letter.id}/'), "1 bestätigt, 1 ausstehend")
+        self.assertEqual(self.client.get('/letters/').context['letters'][0].outstanding, 1)
+
+    def test_cached(self):
+        """Only the classes and groups of the letter are queried once the bitmaps are cached."""
+
+        audience(self.letter.id)
+
+        with self.assertNumQueries(2):
+            audience(self.letter.id)
+
+    def test_updated_on_membership_change(self):
+        """Bitmaps are rebuilt after students have joined groups or classes."""
+
+        audience(self.letter.id)
+
+        self.max.groups.add(self.group)
+        self.assertIn(self.max.id, members(audience(self.letter.id)))
+
+        self.group.student_set.remove(self.max)
+        self.assertNotIn(self.max.id, members(audience(self.letter.id)))
+
+        new = Student.objects.create(first_name="Erika", last_name="Muster", class_group=self.class_a)
+        self.assertIn(new.id, members(audience(self.letter.id)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            move_students([self.max], self.class_a)
+        self.assertIn(self.max.id, members(audience(self.letter.id)))
+
+    def test_results_paginated(self):
+        """The results page only fetches the students of the page shown, with subqueries instead of ids."""
+
+        Student.objects.bulk_create(Student(first_name=f"Student {i}", last_name="Muster", class_group=self.class_a)
+                                    for i in range(30))
+        Response.objects.create(letter=self.letter, student=self.max)
+        self.client.force_login(User.objects.create(username="teacher", is_staff=True))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/letters/results/{self.letter.id}/')
+
+        table = response.context['table']
+        self.assertEqual(table.paginator.count, 33)
+        self.assertEqual(len(table.page.object_list), 25)
+        # Students who responded after leaving the audience are shown first:
+        self.assertEqual(table.rows[0].get_cell('first_name'), "Max")
+        self.assertTrue(any('"letters_student"' in q['sql'] and q['sql'].endswith("LIMIT 25") for q in queries))
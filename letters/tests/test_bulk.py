@@ -0,0 +1,133 @@
+from django.db import connection
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from ..bulk import move_students, add_students_to_group, add_classes_to_group, copy_letters, students_in, \
+    remove_students_from_group, intersect_group, set_group_members
+from ..indexes import THROUGH_INDEXES
+from ..models import Group, ClassGroup, Student, Letter, ResponseBoolField, ResponseSelectionField
+
+
+class BulkTests(TestCase):
+
+    def setUp(self):
+        self.class_a = ClassGroup.objects.create(name="Class A")
+        self.class_b = ClassGroup.objects.create(name="Class B")
+        self.group_a = Group.objects.create(name="Group A")
+
+        self.students = [Student.objects.create(first_name=f"John {i}", last_name="Doe", class_group=self.class_a)
+                         for i in range(5)]
+
+    def test_move_students(self):
+        """All given students are moved to the new class group with one query."""
+
+        # One UPDATE, wrapped in a savepoint:
+        with self.assertNumQueries(3):
+            count = move_students([s.id for s in self.students[:3]], self.class_b)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(Student.objects.filter(class_group=self.class_b).count(), 3)
+
+    def test_add_students_to_group_skips_members(self):
+        """Students that already are members of the group are not added again."""
+
+        self.students[0].groups.add(self.group_a)
+
+        count = add_students_to_group(Student.objects.all(), self.group_a)
+
+        self.assertEqual(count, 4)
+        self.assertEqual(self.group_a.student_set.count(), 5)
+
+    def test_add_classes_to_group(self):
+        """All students of the given class groups are added to the group."""
+
+        Student.objects.create(first_name="Jane", last_name="Doe", class_group=self.class_b)
+
+        count = add_classes_to_group([self.class_a], self.group_a)
+
+        self.assertEqual(count, 5)
+        self.assertFalse(self.group_a.student_set.filter(class_group=self.class_b).exists())
+
+    def test_set_operations(self):
+        """Group members are added, intersected, removed and replaced by whole classes and groups."""
+
+        jane = Student.objects.create(first_name="Jane", last_name="Doe", class_group=self.class_b)
+        group_b = Group.objects.create(name="Group B")
+        self.students[0].groups.add(group_b)
+        jane.groups.add(group_b)
+
+        self.assertEqual(set(students_in([self.class_a], [group_b])), set(self.students) | {jane})
+
+        add_classes_to_group([self.class_a], self.group_a)
+        self.assertEqual(intersect_group(self.group_a, students_in(groups=[group_b])), 4)
+        self.assertEqual(list(self.group_a.student_set.all()), [self.students[0]])
+
+        self.assertEqual(set_group_members(self.group_a, students_in([self.class_b])), (1, 1))
+        self.assertEqual(list(self.group_a.student_set.all()), [jane])
+
+        # Only DELETE and the query for the removed students, within a savepoint:
+        with self.assertNumQueries(4):
+            self.assertEqual(remove_students_from_group(students_in(groups=[group_b]), self.group_a), 1)
+        self.assertFalse(self.group_a.student_set.exists())
+
+    def test_admin_action(self):
+        """The admin action applies the chosen operation to all selected groups."""
+
+        self.client.force_login(User.objects.create(username="admin", is_staff=True, is_superuser=True))
+        self.client.post('/admin/letters/group/', {
+            'action': 'change_members', '_selected_action': [self.group_a.id], 'apply': "1",
+            'operation': 'add', 'classes': [self.class_a.id]})
+
+        self.assertEqual(self.group_a.student_set.count(), 5)
+
+    def test_through_indexes(self):
+        """The through tables are indexed for lookups by group and class."""
+
+        with connection.cursor() as cursor:
+            for model, index in THROUGH_INDEXES:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                self.assertIn(index.name, constraints)
+
+    def test_copy_letters(self):
+        """Copies of a letter have the same response fields but a new audience."""
+
+        letter = Letter.objects.create(name="Test letter A")
+        letter.classes_concerned.add(self.class_a)
+        ResponseBoolField.objects.create(letter=letter, description="Agreed?")
+        ResponseSelectionField.objects.create(letter=letter, description="Option", options="A, B")
+
+        [copy] = copy_letters([letter], [self.class_b], [self.group_a])
+
+        self.assertNotEqual(copy.id, letter.id)
+        self.assertEqual(copy.name, letter.name)
+        self.assertQuerysetEqual(copy.classes_concerned.all(), [self.class_b.id], lambda c: c.id)
+        self.assertQuerysetEqual(copy.groups_concerned.all(), [self.group_a.id], lambda g: g.id)
+        self.assertEqual(copy.responseboolfield_set.get().description, "Agreed?")
+        self.assertEqual(copy.responseselectionfield_set.get().options_list, ["A", "B"])
+        self.assertQuerysetEqual(letter.classes_concerned.all(), [self.class_a.id], lambda c: c.id)
+
+
+class BulkAdminActionTests(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_superuser("staff", "staff@example.com", "staff")
+        self.client.force_login(self.staff)
+
+        self.class_a = ClassGroup.objects.create(name="Class A")
+        self.class_b = ClassGroup.objects.create(name="Class B")
+        self.students = [Student.objects.create(first_name=f"John {i}", last_name="Doe", class_group=self.class_a)
+                         for i in range(3)]
+
+    def test_move_to_class_group(self):
+        """The action first asks for the class group and then moves the students."""
+
+        data = {'action': 'move_to_class_group', '_selected_action': [s.id for s in self.students]}
+
+        response = self.client.post('/admin/letters/student/', data)
+        self.assertTemplateUsed(response, 'admin/letters/bulk_action.html')
+        self.assertFalse(Student.objects.filter(class_group=self.class_b).exists())
+
+        response = self.client.post('/admin/letters/student/',
+                                    {**data, 'apply': 'Ausführen', 'class_group': self.class_b.id})
+        self.assertRedirects(response, '/admin/letters/student/')
+        self.assertEqual(Student.objects.filter(class_group=self.class_b).count(), 3)
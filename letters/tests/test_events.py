@@ -0,0 +1,91 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+
+from ..events import record_event, last_event_id
+from ..models import ClassGroup, Group, Student, Letter, Event
+
+
+@override_settings(EVENTS_TIMEOUT=0)
+class EventTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        class_a = ClassGroup.objects.create(name="Class A")
+        class_b = ClassGroup.objects.create(name="Class B")
+        self.group = Group.objects.create(name="Group A")
+        self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        class_c = ClassGroup.objects.create(name="Class C")
+        self.sibling = Student.objects.create(first_name="Jane", last_name="Doe", class_group=class_c)
+        self.sibling.groups.add(self.group)
+        self.other = Student.objects.create(first_name="Max", last_name="Roe", class_group=class_b)
+
+        self.letter = Letter.objects.create(name="Test letter A", document="documents/test.pdf")
+        self.letter.classes_concerned.add(class_a)
+        self.letter.groups_concerned.add(self.group)
+        self.other_letter = Letter.objects.create(name="Test letter B", document="documents/test.pdf")
+        self.other_letter.classes_concerned.add(class_b)
+
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(self.student, self.sibling)
+        self.client.force_login(self.parent)
+
+        # Letters created above have not been announced, as the test's transaction is never committed:
+        self.cursor = self.client.get('/api/events/').json()['cursor']
+
+    def poll(self):
+        return self.client.get('/api/events/', {'after': self.cursor}).json()
+
+    def test_no_events(self):
+        """Without new events, the cursor stays the same."""
+
+        self.assertEqual(self.poll(), {'events': [], 'cursor': self.cursor, 'retry': 60})
+
+    def test_new_letter(self):
+        """New letters are reported with all children they concern."""
+
+        record_event(Event.NEW_LETTER, self.other_letter.id)
+        event = record_event(Event.NEW_LETTER, self.letter.id)
+
+        data = self.poll()
+        self.assertEqual(data['cursor'], event.id)
+        self.assertEqual(data['events'], [{
+            'id': event.id, 'kind': Event.NEW_LETTER,
+            'letter': {'id': self.letter.id, 'name': "Test letter A"},
+            'students': sorted([self.student.id, self.sibling.id]),
+        }])
+
+    def test_confirmation(self):
+        """Confirmations are reported to parents and to the letter's creator only."""
+
+        staff = User.objects.create(username="staff", is_staff=True)
+        self.letter.created_by = staff
+        self.letter.save()
+
+        record_event(Event.CONFIRMATION, self.letter.id, self.other.id)
+        event = record_event(Event.CONFIRMATION, self.letter.id, self.student.id)
+
+        self.assertEqual([e['id'] for e in self.poll()['events']], [event.id])
+
+        self.client.force_login(staff)
+        self.assertEqual(len(self.poll()['events']), 2)
+
+    def test_last_event_without_cache(self):
+        """The latest event is read from the database if the cache is empty."""
+
+        event = record_event(Event.NEW_LETTER, self.letter.id)
+        cache.clear()
+
+        self.assertEqual(last_event_id(), event.id)
+
+    @override_settings(EVENTS_TIMEOUT=30)
+    def test_no_waiting_without_long_poll(self):
+        """Without EVENTS_LONG_POLL, requests return at once and overviews do not wait for events."""
+
+        self.assertEqual(self.poll()['retry'], 60)
+        self.assertNotContains(self.client.get('/letters/'), "events.js")
+
+        with self.settings(EVENTS_LONG_POLL=True, EVENTS_TIMEOUT=0):
+            self.assertEqual(self.poll()['retry'], 0)
+            self.assertContains(self.client.get('/letters/'), "events.js")
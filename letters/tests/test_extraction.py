@@ -0,0 +1,162 @@
+import hashlib
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from ..extraction import enqueue, process_queue, MAX_ATTEMPTS
+from ..models import Letter, DocumentText, ExtractionJob, OptimizedDocument
+from ..optimization import optimized_document
+from ..search import search
+
+
+def make_pdf(text):
+    """Return a minimal PDF file with one page showing a line of text."""
+
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, content in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, content)
+
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    return pdf
+
+
+class ExtractionTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def create_letter(self, content, name="test.pdf"):
+        letter = Letter.objects.create(name="Test letter", document=SimpleUploadedFile(name, content))
+        # Letters are queued once the transaction has been committed:
+        enqueue([letter.id])
+        return letter
+
+    def test_extract_text(self):
+        """Text and page count are extracted and the letter becomes searchable by its content."""
+
+        letter = self.create_letter(make_pdf("Ausflug in den Zoo"))
+
+        self.assertEqual(process_queue(), {'extracted': 1, 'skipped': 0, 'failed': 0})
+
+        letter.refresh_from_db()
+        document = DocumentText.objects.get(sha256=letter.document_hash)
+        self.assertEqual(document.text, "Ausflug in den Zoo")
+        self.assertEqual(document.pages, 1)
+        self.assertFalse(ExtractionJob.objects.exists())
+        self.assertEqual(list(search(Letter.objects.all(), "zoo")), [letter])
+
+    def test_same_content_skipped(self):
+        """Documents with known content are not extracted again."""
+
+        content = make_pdf("Elternabend")
+        self.create_letter(content)
+        process_queue()
+
+        copy = self.create_letter(content, name="copy.pdf")
+        self.assertEqual(process_queue(), {'extracted': 0, 'skipped': 1, 'failed': 0})
+
+        copy.refresh_from_db()
+        self.assertEqual(DocumentText.objects.get().sha256, copy.document_hash)
+
+    def test_known_hash_not_computed_again(self):
+        """Documents hashed while uploading are not read again to hash them."""
+
+        content = make_pdf("Ausflug in den Zoo")
+        letter = Letter.objects.create(name="Test letter", document=SimpleUploadedFile("test.pdf", content),
+                                       document_hash=hashlib.sha256(content).hexdigest())
+        enqueue([letter.id])
+
+        with mock.patch('letters.extraction.hash_file') as hash_file:
+            self.assertEqual(process_queue(), {'extracted': 1, 'skipped': 0, 'failed': 0})
+
+        hash_file.assert_not_called()
+        self.assertEqual(DocumentText.objects.get(sha256=letter.document_hash).text, "Ausflug in den Zoo")
+        self.assertEqual(list(search(Letter.objects.all(), "zoo")), [letter])
+
+    def test_failed_jobs_retried(self):
+        """Documents that cannot be read are retried up to MAX_ATTEMPTS times."""
+
+        letter = self.create_letter(make_pdf("Elternabend"))
+        letter.document.storage.delete(letter.document.name)
+
+        for _ in range(MAX_ATTEMPTS):
+            self.assertEqual(process_queue()['failed'], 1)
+        self.assertEqual(process_queue(), {'extracted': 0, 'skipped': 0, 'failed': 0})
+
+        job = ExtractionJob.objects.get()
+        self.assertEqual(job.attempts, MAX_ATTEMPTS)
+        self.assertTrue(job.error)
+
+    def test_other_files(self):
+        """Files that are no PDF files are stored without text."""
+
+        letter = self.create_letter(b"plain text", name="test.txt")
+        process_queue()
+
+        letter.refresh_from_db()
+        self.assertEqual(DocumentText.objects.get(sha256=letter.document_hash).pages, 0)
+
+    def test_optimized_variant(self):
+        """A smaller variant of every document is stored once per content."""
+
+        content = make_pdf("Ausflug in den Zoo " * 500)
+        letter = self.create_letter(content)
+        process_queue()
+
+        letter.refresh_from_db()
+        optimized = OptimizedDocument.objects.get(sha256=letter.document_hash)
+        self.assertEqual(optimized.original_size, len(content))
+        self.assertLess(optimized.size, len(content))
+        with optimized.file.open('rb') as file:
+            self.assertTrue(file.read().startswith(b"%PDF-"))
+
+        with override_settings(DOCUMENT_OPTIMIZATION=False):
+            other = self.create_letter(make_pdf("Elternabend " * 500))
+            process_queue()
+        other.refresh_from_db()
+        self.assertFalse(OptimizedDocument.objects.filter(sha256=other.document_hash).exists())
+
+    def test_replaced_document(self):
+        """The optimized variant of a replaced document is no longer served."""
+
+        letter = self.create_letter(make_pdf("Ausflug in den Zoo " * 500))
+        process_queue()
+        letter.refresh_from_db()
+
+        letter.document = SimpleUploadedFile("new.pdf", make_pdf("Elternabend"))
+        letter.save()
+
+        self.assertEqual(Letter.objects.get().document_hash, "")
+        self.assertIsNone(optimized_document(letter.document_hash))
+
+    def test_other_files_not_optimized(self):
+        """Files that are no PDF files are recorded without a variant."""
+
+        letter = self.create_letter(b"plain text", name="test.txt")
+        process_queue()
+
+        letter.refresh_from_db()
+        self.assertFalse(OptimizedDocument.objects.get(sha256=letter.document_hash).file)
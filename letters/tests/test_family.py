@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from ..family import family_map, invalidate_family_map
+from ..models import ClassGroup, Student
+
+
+class FamilyMapTests(TestCase):
+
+    def setUp(self):
+        # Make sure that no map built during another test is reused:
+        invalidate_family_map()
+
+        dummy_class = ClassGroup.objects.create(name="Dummy Class")
+        self.student_a = Student.objects.create(first_name="John Jr.", last_name="Doe", class_group=dummy_class)
+        self.student_b = Student.objects.create(first_name="Jane", last_name="Doe", class_group=dummy_class)
+        self.student_c = Student.objects.create(first_name="Max", last_name="Mustermann", class_group=dummy_class)
+
+        self.user_a = User.objects.create(username="user_a", email="user_a@example.com")
+        self.user_b = User.objects.create(username="user_b", email="user_b@example.com")
+
+        self.user_a.profile.children.add(self.student_a, self.student_b)
+        self.user_b.profile.children.add(self.student_a)
+
+    def test_lookups_in_both_directions(self):
+        """Parents of students and children of parents are resolved correctly."""
+
+        self.assertCountEqual(family_map().parents_of(self.student_a.id), [self.user_a.id, self.user_b.id])
+        self.assertCountEqual(family_map().parents_of(self.student_b.id), [self.user_a.id])
+        self.assertEqual(family_map().parents_of(self.student_c.id), ())
+        self.assertCountEqual(family_map().children_of(self.user_a.id), [self.student_a.id, self.student_b.id])
+
+    def test_bulk_lookup_needs_no_queries(self):
+        """Once built, the map resolves parents of many students without querying the database."""
+
+        family_map()
+
+        with self.assertNumQueries(0):
+            parents = family_map().parents_for([self.student_a.id, self.student_b.id, self.student_c.id])
+
+        self.assertEqual(parents[self.student_b.id], (self.user_a.id,))
+        self.assertEqual(parents[self.student_c.id], ())
+
+    def test_invalidated_on_children_changed(self):
+        """Adding or removing children rebuilds the map."""
+
+        family_map()
+        self.user_b.profile.children.add(self.student_c)
+        self.assertEqual(family_map().parents_of(self.student_c.id), (self.user_b.id,))
+
+        self.user_a.profile.children.remove(self.student_b)
+        self.assertEqual(family_map().parents_of(self.student_b.id), ())
+
+    def test_invalidated_after_commit(self):
+        """Maps built before a change has been committed are rebuilt afterwards."""
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user_b.profile.children.add(self.student_c)
+            # E.g. built by another process from the uncommitted rows:
+            built_before_commit = family_map()
+
+        self.assertIsNot(family_map(), built_before_commit)
@@ -0,0 +1,76 @@
+import datetime
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth.models import User
+
+from ..mail import send_digest
+from ..models import ClassGroup, Student, Letter, PendingNotification
+
+
+@override_settings(NEW_LETTER_DIGEST=True)
+class DigestTests(TestCase):
+
+    def setUp(self):
+        # Two siblings in different classes with the same parent:
+        self.class_a = ClassGroup.objects.create(name="Class A")
+        self.class_b = ClassGroup.objects.create(name="Class B")
+
+        self.student_a = Student.objects.create(first_name="John", last_name="Doe", class_group=self.class_a)
+        self.student_b = Student.objects.create(first_name="Jane", last_name="Doe", class_group=self.class_b)
+
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(self.student_a, self.student_b)
+
+    def create_letter(self, name, *classes, **kwargs):
+        letter = Letter.objects.create(name=name, **kwargs)
+        letter.classes_concerned.add(*classes)
+        return letter
+
+    def test_new_letter_is_queued(self):
+        """Creating a letter records a pending notification instead of sending mails."""
+
+        letter = self.create_letter("Test letter A", self.class_a)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertQuerysetEqual(PendingNotification.objects.all(), [letter.id], lambda n: n.letter_id)
+
+    def test_digest_one_mail_per_parent(self):
+        """Several new letters for several children result in one mail per parent."""
+
+        self.create_letter("Test letter A", self.class_a)
+        self.create_letter("Test letter B", self.class_a, self.class_b)
+        self.create_letter("Test letter C", self.class_b)
+
+        send_digest(force=True)
+
+        self.assertEqual(len(mail.outbox), 1)
+        for name in ("Test letter A", "Test letter B", "Test letter C"):
+            self.assertIn(name, mail.outbox[0].body)
+        self.assertFalse(PendingNotification.objects.exists())
+
+    def test_digest_waits_for_window(self):
+        """Pending notifications are kept until the digest window has passed."""
+
+        self.create_letter("Test letter A", self.class_a)
+
+        with self.settings(NEW_LETTER_DIGEST_WINDOW=datetime.timedelta(hours=1)):
+            send_digest()
+        self.assertEqual(len(mail.outbox), 0)
+
+        PendingNotification.objects.update(created=timezone.now() - datetime.timedelta(hours=2))
+        with self.settings(NEW_LETTER_DIGEST_WINDOW=datetime.timedelta(hours=1)):
+            send_digest()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_digest_skips_unpublished_letters(self):
+        """Letters that have not been published yet stay pending."""
+
+        self.create_letter("Test letter A", self.class_a,
+                           date_published=timezone.now() + datetime.timedelta(days=1))
+
+        send_digest(force=True)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(PendingNotification.objects.exists())
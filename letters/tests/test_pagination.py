@@ -0,0 +1,92 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth.models import User
+
+from ..models import Group, ClassGroup, Student, Letter
+from ..pagination import letters_page
+
+
+class LettersPageTests(TestCase):
+
+    def setUp(self):
+        class_a = ClassGroup.objects.create(name="Class A")
+        group_a = Group.objects.create(name="Group A")
+        self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        self.student.groups.add(group_a)
+
+        # Five letters on two days, some concerning both class and group:
+        today = timezone.now()
+        self.letters = []
+        for i in range(5):
+            letter = Letter.objects.create(name=f"Test letter {i}",
+                                           date_published=today - datetime.timedelta(days=i // 3))
+            letter.classes_concerned.add(class_a)
+            if i % 2:
+                letter.groups_concerned.add(group_a)
+            self.letters.append(letter)
+
+        # A letter that has not been published yet:
+        future = Letter.objects.create(name="Future letter", date_published=today + datetime.timedelta(days=1))
+        future.classes_concerned.add(class_a)
+
+    def test_pages_cover_all_letters_once(self):
+        """Following the cursors returns every published letter exactly once, newest first."""
+
+        seen = []
+        page, cursor = letters_page(self.student, size=2)
+        seen += page
+        while cursor:
+            page, cursor = letters_page(self.student, cursor=cursor, size=2)
+            seen += page
+
+        self.assertEqual([l.id for l in seen], [l.id for l in (self.letters[2], self.letters[1], self.letters[0],
+                                                                self.letters[4], self.letters[3])])
+
+    def test_filter_by_viewed(self):
+        """Letters can be filtered by whether they have been viewed for that student."""
+
+        self.letters[1].students_viewed.add(self.student)
+
+        unread, _ = letters_page(self.student, viewed=False)
+        read, _ = letters_page(self.student, viewed=True)
+
+        self.assertNotIn(self.letters[1], unread)
+        self.assertEqual(read, [self.letters[1]])
+        self.assertTrue(read[0].viewed)
+
+
+@override_settings(LETTERS_PAGE_SIZE=2)
+class LettersMoreViewTests(TestCase):
+
+    def setUp(self):
+        class_a = ClassGroup.objects.create(name="Class A")
+        self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        for i in range(3):
+            Letter.objects.create(name=f"Test letter {i}").classes_concerned.add(class_a)
+
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(self.student)
+
+    def test_load_more(self):
+        """The overview shows the first page, the JSON endpoint the rest."""
+
+        self.client.force_login(self.parent)
+
+        response = self.client.get('/letters/')
+        cursor = response.context['letters'][self.student.id]['unread_next']
+        self.assertEqual(len(response.context['letters'][self.student.id]['unread']), 2)
+
+        response = self.client.get(f'/letters/{self.student.id}/more/', {'viewed': '0', 'cursor': cursor})
+        self.assertEqual([l['name'] for l in response.json()['letters']], ["Test letter 0"])
+        self.assertIsNone(response.json()['cursor'])
+
+    def test_load_more_other_child(self):
+        """Parents cannot load letters of students that are not their children."""
+
+        other = User.objects.create(username="other", email="other@example.com")
+        self.client.force_login(other)
+
+        response = self.client.get(f'/letters/{self.student.id}/more/', {'viewed': '0'})
+        self.assertEqual(response.status_code, 404)
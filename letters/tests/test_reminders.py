@@ -0,0 +1,93 @@
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from ..models import Group, ClassGroup, Student, Letter, Response
+from ..reminders import outstanding_recipients, send_reminders
+
+
+class ReminderTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        # Two siblings in different classes, one of them also in a group:
+        self.class_a = ClassGroup.objects.create(name="Class A")
+        self.class_b = ClassGroup.objects.create(name="Class B")
+        self.group_a = Group.objects.create(name="Group A")
+
+        self.student_a = Student.objects.create(first_name="John", last_name="Doe", class_group=self.class_a)
+        self.student_b = Student.objects.create(first_name="Jane", last_name="Doe", class_group=self.class_b)
+        self.student_a.groups.add(self.group_a)
+
+        # Users without children, so that user and student ids differ:
+        for i in range(3):
+            User.objects.create(username=f"other_{i}", email=f"other_{i}@example.com")
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(self.student_a, self.student_b)
+
+        # A letter that concerns student_a through both class and group:
+        self.letter_a = Letter.objects.create(name="Test letter A")
+        self.letter_a.classes_concerned.add(self.class_a)
+        self.letter_a.groups_concerned.add(self.group_a)
+
+        # A letter that concerns both siblings:
+        self.letter_b = Letter.objects.create(name="Test letter B")
+        self.letter_b.classes_concerned.add(self.class_a, self.class_b)
+
+    def test_outstanding_recipients_deduplicated(self):
+        """Every outstanding (parent, student, letter) triple is returned exactly once."""
+
+        recipients = outstanding_recipients([self.letter_a, self.letter_b])
+
+        self.assertEqual(set(recipients), {self.parent.id})
+        self.assertCountEqual(recipients[self.parent.id][self.student_a.id], [self.letter_a.id, self.letter_b.id])
+        self.assertCountEqual(recipients[self.parent.id][self.student_b.id], [self.letter_b.id])
+
+    def test_outstanding_recipients_without_confirmed(self):
+        """Students that have already confirmed a letter are not returned for that letter."""
+
+        Response.objects.create(letter=self.letter_b, student=self.student_b)
+
+        recipients = outstanding_recipients([self.letter_a, self.letter_b])
+
+        self.assertNotIn(self.student_b.id, recipients[self.parent.id])
+
+    def test_send_reminders_one_mail_per_parent(self):
+        """A parent with several outstanding letters receives one combined mail."""
+
+        send_reminders([self.letter_a.id, self.letter_b.id])
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["parent@example.com"])
+        self.assertIn("Test letter A", mail.outbox[0].body)
+        self.assertIn("Test letter B", mail.outbox[0].body)
+
+    def test_send_reminders_skips_confirmed_letters(self):
+        """Letters that have been confirmed for all students are left out."""
+
+        Response.objects.create(letter=self.letter_a, student=self.student_a)
+
+        with mock.patch('letters.reminders.letter_recipients', return_value={}) as recipients:
+            send_reminders([self.letter_a.id, self.letter_b.id])
+
+        recipients.assert_called_once_with([self.letter_b.id], unconfirmed_only=True)
+
+    def test_command_skips_letters_not_due(self):
+        """Letters passed to the command are skipped unless they still accept confirmations."""
+
+        self.letter_b.confirmation = False
+        self.letter_b.save()
+
+        out = StringIO()
+        call_command('send_reminders', str(self.letter_a.id), str(self.letter_b.id), stdout=out)
+
+        self.assertIn(f"Übersprungen (nicht veröffentlicht, ohne Bestätigung, abgelaufen oder unbekannt): "
+                      f"{self.letter_b.id}", out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertNotIn("Test letter B", mail.outbox[0].body)
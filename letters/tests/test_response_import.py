@@ -0,0 +1,99 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from ..models import ClassGroup, Group, Student, Letter, Response, ResponseBoolField, ResponseSelectionField
+from ..response_import import import_responses, ResponseImportError
+
+
+def csv_file(text):
+    return SimpleUploadedFile("responses.csv", text.encode())
+
+
+class ResponseImportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        class_a = ClassGroup.objects.create(name="5a")
+        class_b = ClassGroup.objects.create(name="5b")
+        group = Group.objects.create(name="Choir")
+        self.john = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        self.jane = Student.objects.create(first_name="Jane", last_name="Doe", class_group=class_a)
+        self.other_john = Student.objects.create(first_name="John", last_name="Doe", class_group=class_b)
+        self.other_john.groups.add(group)
+        self.outsider = Student.objects.create(first_name="Max", last_name="Muster", class_group=class_b)
+
+        self.letter = Letter.objects.create(name="Trip", document="documents/test.pdf")
+        self.letter.classes_concerned.add(class_a)
+        self.letter.groups_concerned.add(group)
+        self.agreed = ResponseBoolField.objects.create(letter=self.letter, description="Einverstanden",
+                                                       must_be_true=True)
+        self.meal = ResponseSelectionField.objects.create(letter=self.letter, description="Essen",
+                                                          options="Fleisch, Vegetarisch")
+
+    def test_import(self):
+        """Rows are matched by ID or name and class and created with one query for all rows."""
+
+        text = "Nachname;Vorname;Klasse;Datum;Einverstanden;Essen\n" \
+               "Doe;John;5a;01.02.2021;x;vegetarisch\n" \
+               "doe;jane;;;ja;Fleisch\n" \
+               "Doe;John;5b;;ja;Fleisch\n"
+
+        # Schema, audience, existing responses and one INSERT within a savepoint:
+        with self.assertNumQueries(8):
+            result = import_responses(csv_file(text), self.letter)
+
+        self.assertEqual(len(result.created), 3)
+        response = Response.objects.get(student=self.john)
+        self.assertEqual(str(response.response_date), "2021-02-01")
+        self.assertEqual(json.loads(response.content), {self.agreed.name: True, self.meal.name: "Vegetarisch"})
+
+    def test_conflicts_skipped(self):
+        """Students who have already responded or appear twice are reported and skipped."""
+
+        Response.objects.create(letter=self.letter, student=self.jane)
+        text = f"ID,Einverstanden,Essen\n{self.jane.id},x,Fleisch\n{self.john.id},x,Fleisch\n{self.john.id},x,Fleisch\n"
+
+        result = import_responses(csv_file(text), self.letter)
+
+        self.assertEqual([s['id'] for s in result.created], [self.john.id])
+        self.assertEqual(len(result.conflicts), 2)
+        self.assertEqual(Response.objects.count(), 2)
+
+    def test_invalid_rows(self):
+        """Nothing is imported if any row is invalid, and all invalid rows are reported."""
+
+        text = "Nachname,Vorname,Einverstanden,Essen\n" \
+               "Doe,Jane,x,Fleisch\n" \
+               "Doe,John,x,Fleisch\n" \
+               "Muster,Max,x,Fleisch\n" \
+               "Doe,Jane,,Fleisch\n" \
+               "Doe,Jane,x,Fisch\n"
+
+        with self.assertRaises(ResponseImportError) as context:
+            import_responses(csv_file(text), self.letter)
+
+        # Ambiguous name, student not concerned, unticked box and unknown option:
+        self.assertEqual(len(context.exception.errors), 4)
+        self.assertFalse(Response.objects.exists())
+
+    def test_unknown_column(self):
+        """Columns that are no response field are rejected."""
+
+        with self.assertRaises(ResponseImportError):
+            import_responses(csv_file(f"ID,Einverstanden,Unbekannt\n{self.jane.id},x,y\n"), self.letter)
+
+    def test_upload(self):
+        """Staff members upload the file on the results page."""
+
+        self.client.force_login(User.objects.create(username="teacher", is_staff=True))
+        response = self.client.post(f'/letters/results/{self.letter.id}/import/',
+                                    {'responses_file': csv_file(f"ID,Einverstanden,Essen\n{self.jane.id},x,Fleisch\n")},
+                                    follow=True)
+
+        self.assertContains(response, "1 Bestätigungen wurden importiert.")
+        self.assertTrue(Response.objects.filter(student=self.jane).exists())
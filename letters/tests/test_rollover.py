@@ -0,0 +1,48 @@
+from django.test import TestCase
+
+from ..models import Group, ClassGroup, Student
+from ..rollover import next_class_name, plan_rollover, apply_rollover
+
+
+class RolloverTests(TestCase):
+
+    def setUp(self):
+        self.classes = {name: ClassGroup.objects.create(name=name) for name in ("5a", "6a", "10a", "Förderklasse")}
+        self.students = {name: Student.objects.create(first_name="John", last_name=f"Doe {name}", class_group=c)
+                         for name, c in self.classes.items()}
+
+        group = Group.objects.create(name="Group A")
+        for student in self.students.values():
+            student.groups.add(group)
+
+    def test_next_class_name(self):
+        """The grade is increased by one, the final grade graduates and names without grade are kept."""
+
+        self.assertEqual(next_class_name("5a", 10), "6a")
+        self.assertEqual(next_class_name("9 Latein", 10), "10 Latein")
+        self.assertEqual(next_class_name("10a", 10), "")
+        self.assertIsNone(next_class_name("Förderklasse", 10))
+
+    def test_apply_rollover(self):
+        """Students of consecutive classes do not move twice, graduates are archived, groups are emptied."""
+
+        plan = plan_rollover(10, archive_class="Abgänger")
+        self.assertEqual(plan.moves, {"5a": "6a", "6a": "7a", "10a": "Abgänger"})
+        self.assertEqual(plan.unchanged, ["Förderklasse"])
+
+        self.assertEqual(apply_rollover(plan), 3)
+
+        class_names = {name: Student.objects.get(pk=s.pk).class_group.name for name, s in self.students.items()}
+        self.assertEqual(class_names, {"5a": "6a", "6a": "7a", "10a": "Abgänger", "Förderklasse": "Förderklasse"})
+        self.assertFalse(Student.groups.through.objects.exists())
+
+    def test_overrides_and_keep_groups(self):
+        """Explicit mappings override the rule and group memberships can be kept."""
+
+        plan = plan_rollover(10, overrides={"Förderklasse": "", "6a": "6a"}, archive_class="Abgänger",
+                             reset_groups=False)
+        apply_rollover(plan)
+
+        self.assertEqual(Student.objects.get(pk=self.students["Förderklasse"].pk).class_group.name, "Abgänger")
+        self.assertEqual(Student.objects.get(pk=self.students["6a"].pk).class_group.name, "6a")
+        self.assertEqual(Student.groups.through.objects.count(), 4)
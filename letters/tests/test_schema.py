@@ -0,0 +1,101 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase
+
+from ..models import ClassGroup, Student, Letter, Response, ResponseTextField, ResponseBoolField, \
+    ResponseSelectionField
+from ..schema import response_schema
+
+
+class ResponseSchemaTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.letter = Letter.objects.create(name="Test letter", document="documents/test.pdf")
+        self.text = ResponseTextField.objects.create(letter=self.letter, description="Name", optional=False)
+        self.bool = ResponseBoolField.objects.create(letter=self.letter, description="Agreed?", must_be_true=True)
+        self.selection = ResponseSelectionField.objects.create(letter=self.letter, description="Meal",
+                                                               options="Meat, Vegetarian")
+
+    def test_validate(self):
+        """Values are normalized and checked against the fields' constraints."""
+
+        schema = response_schema(self.letter.id)
+        valid = {self.text.name: " Jane ", self.bool.name: 1, self.selection.name: "Vegetarian", "other": "x"}
+
+        self.assertEqual(schema.validate(valid),
+                         {self.text.name: "Jane", self.bool.name: True, self.selection.name: "Vegetarian"})
+        for name, value in ((self.text.name, ""), (self.bool.name, False), (self.selection.name, "Fish")):
+            with self.assertRaises(ValueError):
+                schema.validate(dict(valid, **{name: value}))
+
+    def test_checkboxes_from_post(self):
+        """Checked checkboxes count as True, whatever value they submit."""
+
+        schema = response_schema(self.letter.id)
+        post = QueryDict(f"{self.text.name}=Jane&{self.bool.name}=")
+
+        self.assertIs(schema.from_post(post)[self.bool.name], True)
+        self.assertIs(schema.from_post(QueryDict())[self.bool.name], False)
+
+    def test_cached_until_field_changes(self):
+        """The schema is compiled once and again after a field has changed."""
+
+        response_schema(self.letter.id)
+        with self.assertNumQueries(0):
+            response_schema(self.letter.id)
+
+        self.selection.options = "Meat, Vegetarian, Fish"
+        self.selection.save()
+        self.assertEqual(response_schema(self.letter.id).selection_fields[0].options, ("Meat", "Vegetarian", "Fish"))
+
+        self.bool.delete()
+        self.assertEqual(response_schema(self.letter.id).bool_fields, ())
+
+
+class ConfirmationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        class_a = ClassGroup.objects.create(name="Class A")
+        self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        self.letter = Letter.objects.create(name="Test letter", document="documents/test.pdf")
+        self.letter.classes_concerned.add(class_a)
+        self.field = ResponseBoolField.objects.create(letter=self.letter, description="Agreed?", must_be_true=True)
+
+        parent = User.objects.create(username="parent")
+        parent.profile.children.add(self.student)
+        self.client.force_login(parent)
+
+        self.url = f'/letters/{self.student.id}/{self.letter.id}/confirm/'
+
+    def test_invalid_confirmation_rejected(self):
+        """Confirmations violating the schema are not stored."""
+
+        response = self.client.post(self.url, {'boolfield-999': "on"}, follow=True)
+
+        self.assertContains(response, "Muss ausgewählt werden")
+        self.assertFalse(Response.objects.exists())
+
+    def test_confirmation_normalized(self):
+        """Only the letter's fields are stored, checked checkboxes as True."""
+
+        self.client.post(self.url, {self.field.name: "", 'boolfield-999': "on"})
+
+        self.assertEqual(json.loads(Response.objects.get().content), {self.field.name: True})
+
+    def test_results(self):
+        """The results show the values of the stored responses."""
+
+        self.client.post(self.url, {self.field.name: ""})
+        self.client.force_login(User.objects.create(username="teacher", is_staff=True))
+
+        response = self.client.get(f'/letters/results/{self.letter.id}/')
+
+        self.assertContains(response, "Agreed?")
+        self.assertEqual(response.context['table'].rows[0].get_cell(self.field.name), "Ja")
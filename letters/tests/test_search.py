@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from ..models import ClassGroup, Student, Letter
+from ..search import index_letters, rebuild_index, search
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        class_a = ClassGroup.objects.create(name="Class A")
+        class_b = ClassGroup.objects.create(name="Class B")
+        self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+
+        self.trip = Letter.objects.create(name="Ausflug Zoo", teacher="Müller", document="documents/test.pdf")
+        self.trip.classes_concerned.add(class_a)
+        self.exam = Letter.objects.create(name="Klassenarbeit", teacher="Schmidt", document="documents/test.pdf")
+        self.exam.classes_concerned.add(class_a)
+        self.other = Letter.objects.create(name="Ausflug Museum", teacher="Müller", document="documents/test.pdf")
+        self.other.classes_concerned.add(class_b)
+
+        # Signals only update the index once the transaction has been committed:
+        rebuild_index()
+
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(self.student)
+
+    def test_search_name_and_teacher(self):
+        """All words have to appear in name or teacher, possibly as a prefix."""
+
+        self.assertEqual(set(search(Letter.objects.all(), "ausflug")), {self.trip, self.other})
+        self.assertEqual(list(search(Letter.objects.all(), "Ausfl Zoo")), [self.trip])
+        self.assertEqual(list(search(Letter.objects.all(), "schmidt")), [self.exam])
+        self.assertEqual(list(search(Letter.objects.all(), "mueller muller")), [])
+        self.assertEqual(list(search(Letter.objects.all(), "  ")), [])
+
+    def test_index_updated(self):
+        """Changed and deleted letters are updated in the index."""
+
+        self.exam.name = "Elternabend"
+        self.exam.save()
+        index_letters([self.exam.id])
+        self.assertEqual(list(search(Letter.objects.all(), "elternabend")), [self.exam])
+
+        exam_id = self.exam.id
+        self.exam.delete()
+        index_letters([exam_id])
+        self.assertEqual(list(search(Letter.objects.all(), "elternabend")), [])
+
+    def test_special_characters(self):
+        """Queries containing the full-text search syntax do not cause errors."""
+
+        self.assertEqual(list(search(Letter.objects.all(), 'Zoo" * (^')), [self.trip])
+
+    def test_parent_search_scoped(self):
+        """Parents only find letters concerning their children."""
+
+        self.client.force_login(self.parent)
+        response = self.client.get('/letters/search/', {'q': "Ausflug"})
+
+        self.assertContains(response, "Ausflug Zoo")
+        self.assertNotContains(response, "Ausflug Museum")
@@ -0,0 +1,65 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class StaticFilesTests(TestCase):
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+        with open(os.path.join(self.source, 'style.css'), 'w') as file:
+            file.write("body { background: url('logo.svg'); }\n" * 100)
+        with open(os.path.join(self.source, 'logo.svg'), 'w') as file:
+            file.write("<svg></svg>")
+
+        static = self.settings(
+            STATIC_ROOT=self.static_root, STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'])
+        static.enable()
+        self.addCleanup(static.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_hashed_and_compressed(self):
+        """Collected files get hashed names, references are rewritten and text files are compressed."""
+
+        url = staticfiles_storage.url('style.css')
+        self.assertRegex(url, r'^/static/style\.[0-9a-f]{12}\.css$')
+
+        with open(os.path.join(self.static_root, url[len('/static/'):] + '.gz'), 'rb') as file:
+            content = gzip.decompress(file.read()).decode()
+        self.assertIn(staticfiles_storage.url('logo.svg')[len('/static/'):], content)
+
+    def test_hashed_files_cached(self):
+        """Hashed files may be cached forever and are served compressed."""
+
+        response = self.client.get(staticfiles_storage.url('style.css'), HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_other_files_revalidated(self):
+        """Files requested by their original names have to be revalidated."""
+
+        response = self.client.get('/static/style.css')
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        self.assertNotIn('Content-Encoding', response)
+
+        response = self.client.get('/static/style.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_file(self):
+        """Missing files are not found and paths outside STATIC_ROOT are rejected."""
+
+        self.assertEqual(self.client.get('/static/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../settings.py').status_code, 400)
@@ -0,0 +1,134 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command, CommandError
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+
+from ..admin import EstimatedCountPaginator
+from ..models import School, ClassGroup, Student, Letter
+from ..tenants import use_school
+
+
+@override_settings(ALLOWED_HOSTS=['a.example.org', 'b.example.org', 'c.example.org'])
+class TenantTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.school_a = School.objects.create(name="School A", hostname="a.example.org")
+        self.school_b = School.objects.create(name="School B", hostname="b.example.org")
+
+        with use_school(self.school_a.id):
+            self.class_a = ClassGroup.objects.create(name="5a")
+            self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=self.class_a)
+            self.letter_a = Letter.objects.create(name="Letter A", document="documents/test.pdf")
+            self.teacher_a = User.objects.create(username="teacher_a", is_staff=True)
+        with use_school(self.school_b.id):
+            self.class_b = ClassGroup.objects.create(name="5a")
+            self.letter_b = Letter.objects.create(name="Letter B", document="documents/test.pdf")
+
+    def tearDown(self):
+        # The hostnames of the schools are cached beyond the test's transaction:
+        cache.clear()
+
+    def test_objects_scoped(self):
+        """New objects belong to the current school and only its objects are returned."""
+
+        self.assertEqual(self.student.school, self.school_a)
+        self.assertEqual(self.teacher_a.profile.school, self.school_a)
+
+        with use_school(self.school_b.id):
+            self.assertEqual(list(Letter.objects.all()), [self.letter_b])
+            self.assertFalse(Student.objects.exists())
+
+        self.assertEqual(ClassGroup.objects.count(), 2)
+
+    def test_names_unique_per_school(self):
+        """Names of classes may only be used once per school."""
+
+        with use_school(self.school_a.id), self.assertRaises(ValidationError):
+            ClassGroup(name="5a").full_clean()
+
+        ClassGroup.objects.create(name="5a")
+        with self.assertRaises(ValidationError):
+            ClassGroup(name="5a").full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ClassGroup.objects.create(name="5a")
+
+    def test_requests_by_hostname(self):
+        """Requests only see the school of their hostname, users only log in at their school."""
+
+        self.client.force_login(self.teacher_a)
+
+        response = self.client.get(f'/letters/results/{self.letter_a.id}/', HTTP_HOST='a.example.org')
+        self.assertContains(response, "Letter A")
+        response = self.client.get(f'/letters/results/{self.letter_b.id}/', HTTP_HOST='a.example.org')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(f'/letters/results/{self.letter_b.id}/', HTTP_HOST='b.example.org')
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(self.client.get('/', HTTP_HOST='c.example.org').status_code, 404)
+
+    def test_admin_actions_scoped(self):
+        """Admin actions only offer and accept classes of the current school."""
+
+        with use_school(self.school_a.id):
+            admin = User.objects.create(username="admin_a", is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+
+        def post(url, action, selected, **data):
+            return self.client.post(url, {'action': action, '_selected_action': [selected], **data},
+                                    HTTP_HOST='a.example.org')
+
+        response = post('/admin/letters/student/', 'move_to_class_group', self.student.id)
+        self.assertEqual(list(response.context['form'].fields['class_group'].queryset), [self.class_a])
+
+        response = post('/admin/letters/student/', 'move_to_class_group', self.student.id,
+                        apply='1', class_group=self.class_b.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.class_group, self.class_a)
+
+        response = post('/admin/letters/letter/', 'copy_to_audience', self.letter_a.id,
+                        apply='1', classes=[self.class_b.id])
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(Letter.objects.count(), 2)
+
+    def test_estimated_count_per_school(self):
+        """Admin changelists of a school use a cached count of its objects instead of the whole table's estimate."""
+
+        with use_school(self.school_a.id), mock.patch('letters.admin.ESTIMATED_COUNT_THRESHOLD', 0):
+            self.assertEqual(EstimatedCountPaginator(Letter.objects.order_by('id'), 10).count, 1)
+
+            Letter.objects.create(name="Letter C", document="documents/test.pdf")
+            # Cached, but still only the letters of the school:
+            with self.assertNumQueries(0):
+                self.assertEqual(EstimatedCountPaginator(Letter.objects.order_by('id'), 10).count, 1)
+
+            # Filtered lists are counted:
+            self.assertEqual(EstimatedCountPaginator(Letter.objects.filter(name__startswith="Letter"), 10).count, 2)
+
+    def test_cache_per_school(self):
+        """Cache entries of one school are not visible to another one."""
+
+        with use_school(self.school_a.id):
+            cache.set('key', "a")
+        with use_school(self.school_b.id):
+            self.assertIsNone(cache.get('key'))
+
+    def test_command_per_school(self):
+        """Commands are run once for every school or for the one given."""
+
+        out = StringIO()
+        call_command('send_reminders', '--dry-run', stdout=out)
+        self.assertIn("a.example.org:", out.getvalue())
+        self.assertIn("b.example.org:", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('send_reminders', '--school', 'c.example.org', stdout=out)
@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..models import LoginThrottle
+from ..throttling import failures, rejections
+
+
+@override_settings(LOGIN_FAILURES_PER_IP=5, LOGIN_FAILURES_PER_USERNAME=3)
+class LoginThrottlingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="parent", password="secret")
+
+    def login(self, username, password="wrong", ip='192.0.2.1'):
+        return self.client.post('/login/', {'LoginFormUsername': username, 'LoginFormPassword': password},
+                                REMOTE_ADDR=ip, follow=True)
+
+    def test_username_throttled(self):
+        """After too many failures for a username, even the right password is rejected without checking it."""
+
+        for i in range(3):
+            self.login("Parent", ip=f'192.0.2.{i}')
+
+        with mock.patch('letters.views.authenticate') as authenticate:
+            response = self.login("parent", "secret", ip='198.51.100.1')
+
+        authenticate.assert_not_called()
+        self.assertContains(response, "Zu viele fehlgeschlagene Anmeldeversuche")
+        self.assertEqual(rejections(LoginThrottle.USERNAME, "parent"), 1)
+
+    def test_rejections_written_once_per_window(self):
+        """Rejected logins are counted in the cache and written to the database once per window."""
+
+        for i in range(5):
+            self.login("Parent")
+
+        with self.assertNumQueries(0):
+            self.login("parent")
+
+        throttle = LoginThrottle.objects.get()
+        self.assertEqual((throttle.kind, throttle.value), (LoginThrottle.USERNAME, "parent"))
+        self.assertEqual(rejections(LoginThrottle.USERNAME, "parent"), 3)
+
+    def test_ip_throttled(self):
+        """After too many failures from one IP address, logins from it are rejected for any username."""
+
+        for i in range(5):
+            self.login(f"user{i}")
+
+        response = self.login("parent", "secret")
+        self.assertContains(response, "Zu viele fehlgeschlagene Anmeldeversuche")
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+        response = self.login("parent", "secret", ip='198.51.100.1')
+        self.assertIn('_auth_user_id', self.client.session)
+
+    def test_successful_login_resets_username(self):
+        """A successful login forgets the failures for its username."""
+
+        self.login("parent")
+        self.login("parent", "secret")
+
+        self.assertEqual(failures(LoginThrottle.USERNAME, "parent"), 0)
+
+    def test_admin_lifts_throttle(self):
+        """Staff members see throttled logins in the admin site and can lift them."""
+
+        for i in range(4):
+            self.login("parent")
+        self.client.force_login(User.objects.create(username="admin", is_staff=True, is_superuser=True))
+
+        response = self.client.get('/admin/letters/loginthrottle/')
+        self.assertContains(response, "Nutzername parent")
+
+        self.client.post('/admin/letters/loginthrottle/', {
+            'action': 'lift', '_selected_action': [LoginThrottle.objects.get().id]})
+        self.assertFalse(LoginThrottle.objects.exists())
+        self.assertEqual(failures(LoginThrottle.USERNAME, "parent"), 0)
+
+    def test_admin_login_throttled(self):
+        """The login form of the admin site is throttled as well."""
+
+        for i in range(3):
+            self.client.post('/admin/login/', {'username': "parent", 'password': "wrong"})
+
+        response = self.client.post('/admin/login/', {'username': "parent", 'password': "secret"})
+        self.assertContains(response, "Zu viele fehlgeschlagene Anmeldeversuche")
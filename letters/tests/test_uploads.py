@@ -0,0 +1,108 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+
+from ..models import ClassGroup, Letter
+
+
+class DocumentUploadTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.class_group = ClassGroup.objects.create(name="Class A")
+        self.client.force_login(User.objects.create_superuser("staff", "staff@example.com", "staff"))
+
+    def stored_files(self):
+        return [os.path.relpath(os.path.join(root, name), self.media_root)
+                for root, dirs, files in os.walk(self.media_root) for name in files]
+
+    def post(self, content, name="Test letter", content_type='application/pdf', follow=False, client=None):
+        data = {
+            'name': name, 'confirmation': 'on', 'teacher': "",
+            'document': SimpleUploadedFile("brief.pdf", content, content_type=content_type),
+            'date_published': '2020-01-01', 'date_due': '',
+            'classes_concerned': [self.class_group.id],
+        }
+        for prefix in ('responseboolfield_set', 'responseselectionfield_set'):
+            data.update({f'{prefix}-TOTAL_FORMS': 0, f'{prefix}-INITIAL_FORMS': 0})
+
+        return (client or self.client).post('/admin/letters/letter/add/', data, follow=follow)
+
+    def test_document_stored_once(self):
+        """The document is written to its final location only, and the throughput is reported."""
+
+        content = b"%PDF-1.4\n" + b"x" * 200000
+        response = self.post(content, follow=True)
+
+        self.assertRedirects(response, '/admin/letters/letter/')
+        letter = Letter.objects.get()
+        self.assertRegex(letter.document.name, r'^documents/\d{4}/\d\d/\d\d/brief\.pdf$')
+        self.assertEqual(self.stored_files(), [letter.document.name])
+        with letter.document.open('rb') as file:
+            self.assertEqual(file.read(), content)
+        self.assertEqual(letter.document_hash, hashlib.sha256(content).hexdigest())
+
+        self.assertContains(response, "MB/s")
+
+    def test_no_pdf_rejected(self):
+        """Files that are no PDF files are rejected without being stored."""
+
+        response = self.post(b"plain text")
+
+        self.assertContains(response, "Die Datei ist keine PDF-Datei.")
+        self.assertFalse(Letter.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+        response = self.post(b"%PDF-1.4\n", content_type='text/plain')
+        self.assertContains(response, "Bitte laden Sie eine PDF-Datei hoch.")
+
+    @override_settings(DOCUMENT_MAX_SIZE=100000)
+    def test_large_document_rejected(self):
+        """Documents larger than DOCUMENT_MAX_SIZE are rejected and partial files deleted."""
+
+        response = self.post(b"%PDF-1.4\n" + b"x" * 300000)
+
+        self.assertContains(response, "Die Datei ist größer als")
+        self.assertEqual(self.stored_files(), [])
+
+    def test_invalid_form_deletes_document(self):
+        """Stored documents are deleted if the letter cannot be saved."""
+
+        response = self.post(b"%PDF-1.4\n", name="")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Letter.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_csrf_rejected_document_deleted(self):
+        """Documents of staff members' requests rejected by CSRF protection are not kept."""
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(User.objects.get(username="staff"))
+        response = self.post(b"%PDF-1.4\n", client=client)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_anonymous_document_not_stored(self):
+        """Documents posted by anonymous clients are never stored, whichever URL they are posted to."""
+
+        client = Client(enforce_csrf_checks=True)
+        document = SimpleUploadedFile("evil.pdf", b"%PDF-1.4\n" + b"x" * 100000, content_type='application/pdf')
+        response = client.post('/', {'document': document})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.logout()
+        self.post(b"%PDF-1.4\n" + b"x" * 100000)
+
+        self.assertEqual(self.stored_files(), [])
@@ -0,0 +1,174 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.contrib.auth.models import User
+
+from ..models import ClassGroup, Student, Letter, ResponseBoolField, OptimizedDocument
+
+
+class LetterDetailTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        class_a = ClassGroup.objects.create(name="Class A")
+        self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        self.letter = Letter.objects.create(name="Test letter A", document="documents/test.pdf")
+        self.letter.classes_concerned.add(class_a)
+        self.field = ResponseBoolField.objects.create(letter=self.letter, description="Agreed?")
+
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(self.student)
+        self.client.force_login(self.parent)
+
+        self.url = f'/letters/{self.student.id}/{self.letter.id}/'
+
+    def test_field_change_updates_letter_version(self):
+        """Saving a response field changes the version of its letter."""
+
+        version = self.letter.version
+
+        self.field.description = "Changed"
+        self.field.save()
+        self.letter.refresh_from_db()
+
+        self.assertNotEqual(self.letter.version, version)
+
+    def test_fragments_cached_until_field_changes(self):
+        """The letter's fields are rendered from the cache until one of them is changed."""
+
+        self.assertContains(self.client.get(self.url), "Agreed?")
+
+        # Changes that do not go through save() do not invalidate the cache:
+        ResponseBoolField.objects.filter(pk=self.field.pk).update(description="Changed")
+        self.assertContains(self.client.get(self.url), "Agreed?")
+
+        self.field.refresh_from_db()
+        self.field.save()
+        self.assertContains(self.client.get(self.url), "Changed")
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        class_a = ClassGroup.objects.create(name="Class A")
+        self.student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        self.letter = Letter.objects.create(name="Test letter A", document="documents/test.pdf")
+        self.letter.classes_concerned.add(class_a)
+
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(self.student)
+        self.client.force_login(self.parent)
+
+        self.detail_url = f'/letters/{self.student.id}/{self.letter.id}/'
+
+    def revalidate(self, url):
+        # The first response sets the CSRF cookie, which is part of the ETag:
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_overview_not_modified(self):
+        """The overview is answered with 304 as long as nothing has changed."""
+
+        self.assertEqual(self.revalidate('/letters/').status_code, 304)
+
+    def test_new_letter_changes_overview(self):
+        """Publishing a letter for a child changes the ETag of the overview."""
+
+        etag = self.client.get('/letters/')['ETag']
+        self.client.get(self.detail_url)
+
+        letter = Letter.objects.create(name="Test letter B", document="documents/test.pdf")
+        letter.classes_concerned.add(self.student.class_group)
+
+        response = self.client.get('/letters/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Test letter B")
+
+    def test_viewing_letter_changes_overview(self):
+        """Viewing a letter changes the ETag of the overview."""
+
+        etag = self.client.get('/letters/')['ETag']
+        self.client.get(self.detail_url)
+
+        self.assertEqual(self.client.get('/letters/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unchanged_detail_not_modified(self):
+        """A letter is only rendered again once it has been changed."""
+
+        self.assertEqual(self.revalidate(self.detail_url).status_code, 304)
+
+        etag = self.client.get(self.detail_url)['ETag']
+        self.letter.name = "Changed"
+        self.letter.save()
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_no_etag_for_other_students(self):
+        """Pages of students who are not the user's children carry no ETag."""
+
+        other = Student.objects.create(first_name="Jane", last_name="Doe", class_group=self.student.class_group)
+
+        response = self.client.get(f'/letters/{other.id}/{self.letter.id}/')
+        self.assertFalse(response.has_header('ETag'))
+
+
+class LetterDocumentTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        class_a = ClassGroup.objects.create(name="Class A")
+        student = Student.objects.create(first_name="John", last_name="Doe", class_group=class_a)
+        self.letter = Letter.objects.create(name="Test letter A",
+                                            document=SimpleUploadedFile("test.pdf", b"%PDF-1.4 test"))
+        self.letter.classes_concerned.add(class_a)
+
+        self.parent = User.objects.create(username="parent", email="parent@example.com")
+        self.parent.profile.children.add(student)
+
+        self.url = f'/letters/document/{self.letter.id}/'
+
+    def test_parent_downloads_document(self):
+        """Parents of a student concerned by a letter may download its document."""
+
+        self.client.force_login(self.parent)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.4 test")
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_optimized_variant(self):
+        """The optimized variant is served unless the original is requested."""
+
+        Letter.objects.filter(id=self.letter.id).update(document_hash="a" * 64)
+        OptimizedDocument.objects.create(sha256="a" * 64, size=9,
+                                         file=SimpleUploadedFile("a.pdf", b"%PDF-opt"))
+
+        self.client.force_login(self.parent)
+        response = self.client.get(self.url)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-opt")
+        self.assertIn('filename="test.pdf"', response['Content-Disposition'])
+
+        response = self.client.get(self.url + '?original')
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.4 test")
+
+    def test_other_parent_denied(self):
+        """Other parents cannot download the document."""
+
+        self.client.force_login(User.objects.create(username="other"))
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_login_required(self):
+        """Anonymous users are redirected to the start page."""
+
+        self.assertRedirects(self.client.get(self.url), '/')
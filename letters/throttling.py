@@ -0,0 +1,250 @@
+"""Throttling of failed logins for the letters app of the elternbrief project.
+
+Checking a password means computing an expensive hash on purpose, so a
+burst of guessed credentials keeps all workers busy. Failed logins are
+therefore counted per client IP address and per username, and further
+attempts are rejected before the password is checked once one of them
+has failed too often within LOGIN_FAILURES_WINDOW.
+
+The counters are kept in the cache configured by LOGIN_THROTTLE_CACHE as
+sliding windows: the count of the current window is added to the count
+of the previous window, weighted by how much of it still overlaps. Each
+window costs one cache entry per IP address or username, which expires
+on its own.
+
+Rejections are counted the same way. The first rejection of each window
+is also recorded in a LoginThrottle object, so staff members can review
+and lift throttles in the admin site, while a burst of rejected logins
+costs no more than one database write per window.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import LoginThrottle
+
+FAILURES_KEY = 'letters:login_failures:{}:{}:{}'
+REJECTIONS_KEY = 'letters:login_rejections:{}:{}:{}'
+
+MESSAGE = "Zu viele fehlgeschlagene Anmeldeversuche. Bitte versuchen Sie es " \
+          "später erneut."
+
+
+def client_ip(request):
+    """Return the IP address of a request's client.
+
+    If the project is served behind a reverse proxy, the proxy has to
+    set REMOTE_ADDR to the client's address.
+
+    :param request: Current request
+    :rtype: str
+    """
+
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _cache():
+    return caches[settings.LOGIN_THROTTLE_CACHE]
+
+
+def _window():
+    """Return the current window and how much of it has elapsed.
+
+    :return: Tuple of window number and elapsed fraction between 0 and 1
+    :rtype: tuple
+    """
+
+    seconds = settings.LOGIN_FAILURES_WINDOW.total_seconds()
+    now = time.time()
+
+    return int(now // seconds), now % seconds / seconds
+
+
+def _key(key, kind, value, window):
+    # Usernames may contain characters not allowed in cache keys:
+    digest = hashlib.sha256(value.encode()).hexdigest()[:32]
+    return key.format(kind, digest, window)
+
+
+def _limit(kind):
+    return settings.LOGIN_FAILURES_PER_IP if kind == LoginThrottle.IP \
+        else settings.LOGIN_FAILURES_PER_USERNAME
+
+
+def _value(kind, value):
+    # Usernames differing in case only are counted together:
+    return value if kind == LoginThrottle.IP else value.casefold()
+
+
+def _count(key, kind, value):
+    """Return a count within the sliding window.
+
+    :param key: Format of the count's cache keys
+    :type key: str
+    :return: Weighted count of the previous and the current window
+    :rtype: float
+    """
+
+    value = _value(kind, value)
+    window, elapsed = _window()
+    previous_key = _key(key, kind, value, window - 1)
+    current_key = _key(key, kind, value, window)
+    counts = _cache().get_many([previous_key, current_key])
+
+    return counts.get(previous_key, 0) * (1 - elapsed) \
+        + counts.get(current_key, 0)
+
+
+def _increment(key, kind, value):
+    """Increment a count of the current window.
+
+    :param key: Format of the count's cache keys
+    :type key: str
+    :return: Whether this was the first increment within the window
+    :rtype: bool
+    """
+
+    value = _value(kind, value)
+    window, _ = _window()
+    key = _key(key, kind, value, window)
+    # Counts are needed during the following window as well:
+    timeout = 2 * settings.LOGIN_FAILURES_WINDOW.total_seconds()
+
+    cache = _cache()
+    if cache.add(key, 1, timeout):
+        return True
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The entry has expired meanwhile:
+        return cache.add(key, 1, timeout)
+
+    return False
+
+
+def failures(kind, value):
+    """Return the number of recent failed logins.
+
+    :param kind: LoginThrottle.IP or LoginThrottle.USERNAME
+    :type kind: str
+    :param value: IP address or username
+    :type value: str
+    :return: Failed logins within the sliding window
+    :rtype: float
+    """
+
+    return _count(FAILURES_KEY, kind, value)
+
+
+def rejections(kind, value):
+    """Return the number of recently rejected logins.
+
+    :param kind: LoginThrottle.IP or LoginThrottle.USERNAME
+    :type kind: str
+    :param value: IP address or username
+    :type value: str
+    :return: Rejected logins within the sliding window
+    :rtype: float
+    """
+
+    return _count(REJECTIONS_KEY, kind, value)
+
+
+def record_failure(kind, value):
+    """Count a failed login.
+
+    :param kind: LoginThrottle.IP or LoginThrottle.USERNAME
+    :type kind: str
+    :param value: IP address or username
+    :type value: str
+    """
+
+    _increment(FAILURES_KEY, kind, value)
+
+
+def reset(kind, value):
+    """Forget all failed and rejected logins of an IP address or username.
+
+    :param kind: LoginThrottle.IP or LoginThrottle.USERNAME
+    :type kind: str
+    :param value: IP address or username
+    :type value: str
+    """
+
+    value = _value(kind, value)
+    window, _ = _window()
+    _cache().delete_many([_key(key, kind, value, w)
+                          for key in (FAILURES_KEY, REJECTIONS_KEY)
+                          for w in (window - 1, window)])
+
+
+def _record_rejection(kind, value):
+    """Count a rejected login of an IP address or username.
+
+    Only the first rejection within a window is recorded in the
+    LoginThrottle object of its cause.
+    """
+
+    if not _increment(REJECTIONS_KEY, kind, value):
+        return
+
+    value = _value(kind, value)
+    now = timezone.now()
+    if LoginThrottle.objects.filter(kind=kind, value=value) \
+            .update(last_rejected=now):
+        return
+
+    try:
+        with transaction.atomic():
+            LoginThrottle.objects.create(kind=kind, value=value,
+                                         first_rejected=now,
+                                         last_rejected=now)
+    except IntegrityError:
+        # Created by a concurrent request:
+        pass
+
+
+def throttled(request, username):
+    """Check whether a login has to be rejected without checking the password.
+
+    Rejections are recorded in LoginThrottle objects.
+
+    :param request: Current request
+    :param username: Username entered by the client
+    :type username: str
+    :return: Whether the login has to be rejected
+    :rtype: bool
+    """
+
+    for kind, value in ((LoginThrottle.IP, client_ip(request)),
+                        (LoginThrottle.USERNAME, username or '')):
+        if value and failures(kind, value) >= _limit(kind):
+            _record_rejection(kind, value)
+            return True
+
+    return False
+
+
+@receiver(user_login_failed)
+def count_failed_login(sender, credentials, request=None, **kwargs):
+    """Count a failed login for the client's IP address and the username."""
+
+    if request is not None:
+        record_failure(LoginThrottle.IP, client_ip(request))
+    if credentials.get('username'):
+        record_failure(LoginThrottle.USERNAME, credentials['username'])
+
+
+@receiver(user_logged_in)
+def reset_username_on_login(sender, user, request=None, **kwargs):
+    """Forget the failed logins for a username once its user logged in."""
+
+    reset(LoginThrottle.USERNAME, user.get_username())
@@ -0,0 +1,276 @@
+"""Streaming upload of letter documents for the letters app.
+
+Django's default upload handlers buffer uploaded files in memory or in a
+temporary file, which the storage then copies to its final location.
+DocumentUploadHandler instead writes every chunk of a letter's document
+directly to its final location in the media directory, computing hash
+and size on the way. Type and size limits are checked with the first
+chunks, so invalid files are never written completely.
+
+The handler is not registered in FILE_UPLOAD_HANDLERS, as it would then
+store documents posted to any URL by anyone. Views accepting documents
+are decorated with streams_documents instead, which adds the handler for
+staff members only and deletes stored documents that have not become
+part of a letter. The handler only handles fields named 'document'.
+Forms have to use DocumentField, which accepts the already stored file
+without copying it again. LetterForm stores the hash with the letter,
+so that the document is not read again to identify its content.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from functools import wraps
+
+from django import forms
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, \
+    StopFutureHandlers
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+logger = logging.getLogger(__name__)
+
+FIELD_NAME = 'document'
+
+
+@dataclass
+class UploadStats:
+    """Statistics of a streamed upload."""
+
+    name: str
+    size: int
+    sha256: str
+    duration: float
+
+    @property
+    def throughput(self):
+        """Return the upload throughput.
+
+        :return: Throughput in megabytes per second
+        :rtype: float
+        """
+
+        return self.size / 1000000 / max(self.duration, 1e-6)
+
+    def __str__(self):
+        return f"{os.path.basename(self.name)}: {self.size / 1000000:.1f} MB " \
+               f"in {self.duration:.2f}s ({self.throughput:.1f} MB/s)"
+
+
+class StreamedUploadedFile(UploadedFile):
+    """A file that has been written to its final location while uploading.
+
+    storage_name is the file's name in the default storage. If the file
+    has been rejected, error holds the reason and nothing is stored.
+    """
+
+    def __init__(self, storage_name, name, content_type, size, sha256,
+                 error=None):
+        super().__init__(None, name, content_type, size)
+        self.storage_name = storage_name
+        self.sha256 = sha256
+        self.error = error
+
+
+class DocumentUploadHandler(FileUploadHandler):
+    """Upload handler streaming letter documents to the media directory."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        self.request_length = content_length
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+
+        self.active = field_name == FIELD_NAME and _local_storage()
+        if not self.active:
+            return
+
+        self.storage_name = None
+        self.destination = None
+        self.error = None
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.start = time.perf_counter()
+
+        if self.content_type not in settings.DOCUMENT_CONTENT_TYPES:
+            self.error = "Bitte laden Sie eine PDF-Datei hoch."
+        # The request is hardly larger than the document:
+        elif self.request_length > settings.DOCUMENT_MAX_SIZE + 64 * 1024:
+            self.error = _too_large()
+        else:
+            self._open_destination()
+
+        raise StopFutureHandlers()
+
+    def _open_destination(self):
+        """Reserve the document's final name and open it for writing."""
+
+        from .models import Letter
+
+        field = Letter._meta.get_field(FIELD_NAME)
+        while True:
+            name = default_storage.get_available_name(
+                field.generate_filename(None, self.file_name))
+            path = default_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                # Fails if another upload has taken the name meanwhile:
+                self.destination = open(path, 'xb')
+                break
+            except FileExistsError:
+                continue
+
+        self.storage_name = name
+
+    def _reject(self, error):
+        """Stop writing the document and delete what has been written."""
+
+        self.error = error
+        self._discard()
+
+    def _discard(self):
+        """Delete the partially written document."""
+
+        if self.destination:
+            self.destination.close()
+            self.destination = None
+            default_storage.delete(self.storage_name)
+            self.storage_name = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.error:
+            return None
+
+        if start == 0 and not raw_data.startswith(b'%PDF-'):
+            self._reject("Die Datei ist keine PDF-Datei.")
+            return None
+
+        self.size += len(raw_data)
+        if self.size > settings.DOCUMENT_MAX_SIZE:
+            self._reject(_too_large())
+            return None
+
+        self.sha256.update(raw_data)
+        self.destination.write(raw_data)
+
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+
+        if self.destination:
+            self.destination.close()
+            self.destination = None
+
+        if self.error:
+            return StreamedUploadedFile(None, self.file_name,
+                                        self.content_type, self.size, None,
+                                        self.error)
+
+        stats = UploadStats(self.storage_name, self.size,
+                            self.sha256.hexdigest(),
+                            time.perf_counter() - self.start)
+        logger.info("Dokument hochgeladen: %s", stats)
+        if not hasattr(self.request, 'document_uploads'):
+            self.request.document_uploads = []
+        self.request.document_uploads.append(stats)
+
+        return StreamedUploadedFile(self.storage_name, self.file_name,
+                                    self.content_type, self.size,
+                                    stats.sha256)
+
+    def upload_interrupted(self):
+        if getattr(self, 'active', False):
+            self._discard()
+
+
+class DocumentField(forms.FileField):
+    """Form field for documents uploaded by DocumentUploadHandler.
+
+    Cleans a streamed file to its name in the storage, so that the model
+    field refers to the stored file instead of saving it a second time.
+    """
+
+    def clean(self, data, initial=None):
+        if isinstance(data, StreamedUploadedFile):
+            if data.error:
+                raise forms.ValidationError(data.error)
+            return data.storage_name
+
+        return super().clean(data, initial)
+
+
+def streams_documents(view):
+    """Decorate a view to stream documents uploaded by staff members.
+
+    DocumentUploadHandler has to be added before the request's body is
+    read, which CsrfViewMiddleware would do, so the decorated view is
+    exempt from the middleware and checks the CSRF token itself.
+    Documents that are not used by any letter once the view has returned,
+    e.g. because the form was invalid, are deleted.
+
+    Documents are only streamed if STREAM_DOCUMENT_UPLOADS is enabled.
+    """
+
+    protected_view = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if settings.STREAM_DOCUMENT_UPLOADS and request.user.is_active \
+                and request.user.is_staff:
+            request.upload_handlers.insert(0, DocumentUploadHandler(request))
+
+        try:
+            return protected_view(request, *args, **kwargs)
+        finally:
+            _delete_unused(getattr(request, 'document_uploads', []))
+
+    return wrapper
+
+
+def _delete_unused(uploads):
+    """Delete stored documents that are not used by any letter.
+
+    :param uploads: UploadStats of the stored documents
+    :type uploads: list
+    """
+
+    from .models import Letter
+
+    for upload in uploads:
+        if not Letter.objects.filter(document=upload.name).exists():
+            default_storage.delete(upload.name)
+
+
+def _local_storage():
+    """Return whether the default storage stores files in the file system.
+
+    :rtype: bool
+    """
+
+    try:
+        default_storage.path('')
+    except NotImplementedError:
+        return False
+
+    return True
+
+
+def _too_large():
+    """Return the error message for documents exceeding the size limit.
+
+    :rtype: str
+    """
+
+    return f"Die Datei ist größer als " \
+           f"{settings.DOCUMENT_MAX_SIZE // 1000000} MB."
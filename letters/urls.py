@@ -4,7 +4,7 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 
-from . import views
+from . import api, views
 
 app_name = 'letters'
 urlpatterns = [
@@ -12,14 +12,33 @@ urlpatterns = [
     path('login/', views.login, name='login'),
     path('logout/', views.logout, name='logout'),
     path('letters/', views.letters, name='letters'),
+    path('letters/search/', views.search, name='search'),
+    path('letters/<int:student_id>/more/', views.letters_more,
+         name='letters_more'),
     path('letters/<int:student_id>/<int:letter_id>/', views.letter_detail,
          name='letter_detail'),
     path('letters/<int:student_id>/<int:letter_id>/confirm/',
          views.letter_detail, {'confirmation': True},
          name='letter_confirm'),
+    path('letters/document/<int:letter_id>/', views.letter_document,
+         name='letter_document'),
     path('letters/results/<int:letter_id>/', views.letter_result,
          name='letter_result'),
+    path('letters/archive/<int:archived_id>/results/',
+         views.archived_letter_result, name='archived_letter_result'),
+    path('letters/results/<int:letter_id>/import/',
+         views.letter_result_import, name='letter_result_import'),
     path('letters/user_import/', views.user_import, name='user_import'),
+    path('api/children/', api.children, name='api_children'),
+    path('api/children/<int:student_id>/letters/', api.letters,
+         name='api_letters'),
+    path('api/children/<int:student_id>/letters/<int:letter_id>/',
+         api.letter, name='api_letter'),
+    path('api/children/<int:student_id>/letters/<int:letter_id>/confirm/',
+         api.confirm, name='api_confirm'),
+    path('api/letters/<int:letter_id>/results/', api.results,
+         name='api_results'),
+    path('api/events/', api.events, name='api_events'),
 ]
 
 # Allow uploaded files to be served as static files while DEBUG is on.
@@ -153,7 +153,7 @@ def read_students(import_file: UploadedFile):
 
         # Make sure that id of parent_1 is valid and there is a user with that import_id:
         try:
-            if not User.objects.filter(profile__import_id=int(row['parent_1'])):
+            if not Profile.objects.filter(import_id=int(row['parent_1'])):
                 raise UnknownIDError(row['parent_1'], f"{import_file.name}:{line_count}")
         except ValueError:
             raise InvalidIDError(row['parent_1'], f"{import_file.name}:{line_count}")
@@ -161,7 +161,7 @@ def read_students(import_file: UploadedFile):
         # If there is a parent_2, make sure that their id is valid and there is a user with that import_id:
         if 'parent_2' in row.keys():
             try:
-                if not User.objects.filter(profile__import_id=int(row['parent_2'])):
+                if not Profile.objects.filter(import_id=int(row['parent_2'])):
                     raise UnknownIDError(row['parent_2'], f"{import_file.name}:{line_count}")
             except ValueError:
                 raise InvalidIDError(row['parent_2'], f"{import_file.name}:{line_count}")
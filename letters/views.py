@@ -1,18 +1,38 @@
-"""View definitions for the letters app of the elternbrief project."""
+"""View definitions for the letters app of the elternbrief project.
+
+The tables and csv imports of the staff pages are imported within their
+views on first use, so worker processes start without them.
+"""
 
 import json
+import os
+
+from asgiref.sync import sync_to_async
 
+from django.conf import settings
+from django.http import JsonResponse, FileResponse, Http404
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login as dj_login, \
     logout as dj_logout
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django_tables2 import RequestConfig, Column
 
-from .models import Letter, Response
-from .tables import *
-from .forms import UserImportForm
-from .user_import import *
+from .models import Letter, Response, ArchivedLetter, Student, Profile
+from .audience import audience, confirmed, count, outstanding_counts, \
+    result_students
+from .conditional import letters_etag, letter_detail_etag
+from .forms import UserImportForm, ResponseImportForm
+from .optimization import optimized_document
+from .pagination import letters_page, student_letters
+from .schema import response_schema
+from .search import search as search_letters
+from .throttling import throttled, MESSAGE as THROTTLED_MESSAGE
 
 
 def index(request):
@@ -25,6 +45,9 @@ def index(request):
     return render(request, 'letters/index.html')
 
 
+# Browsers have to revalidate the page on every request:
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=letters_etag)
 def letters(request):
     """Render overview of available letters.
 
@@ -39,7 +62,12 @@ def letters(request):
 
     # Show special page if user is staff member:
     if request.user.is_staff:
-        letters_list = Letter.objects.filter(created_by=request.user)
+        letters_list = list(Letter.objects.filter(created_by=request.user))
+        # Counted on the cached audiences, without fetching any students:
+        counts = outstanding_counts(letter.id for letter in letters_list
+                                    if letter.confirmation)
+        for letter in letters_list:
+            letter.outstanding = counts.get(letter.id)
         context = {
             'letters': letters_list
         }
@@ -51,11 +79,23 @@ def letters(request):
         # Make sure that the User has an associated Profile object:
         if hasattr(request.user, 'profile'):
             # Retrieve list of all students the user is allowed to view letters for:
-            children_list = request.user.profile.children.all()
+            children_list = request.user.profile.children.all() \
+                .select_related('class_group')
+
+            # First page of unread and of read letters for every child:
+            pages = {}
+            for child in children_list:
+                unread, unread_next = letters_page(child, viewed=False)
+                read, read_next = letters_page(child, viewed=True)
+                pages[child.id] = {'unread': unread, 'unread_next': unread_next,
+                                   'read': read, 'read_next': read_next}
+
             context = {
                 'children_list': children_list,
                 # Dictionary of ids of all children and the letters that concern them:
-                'letters': {child.id: child.letters for child in children_list}
+                'letters': pages,
+                # Waiting for new letters would occupy a worker under WSGI:
+                'wait_for_events': settings.EVENTS_LONG_POLL,
             }
 
             return render(request, 'letters/letters_index.html', context)
@@ -75,6 +115,85 @@ def letters(request):
     return redirect('letters:index')
 
 
+def search(request):
+    """Render letters matching a search query.
+
+    Staff members search all letters, other users the published letters
+    concerning their children.
+
+    :param request: Current request
+    :return: Search results page
+    """
+
+    if not request.user.is_authenticated:
+        messages.error(request,
+                       "Bitte loggen Sie sich ein, um Briefe zu durchsuchen!")
+        return redirect('letters:index')
+
+    query = request.GET.get('q', '').strip()
+    context = {'query': query}
+
+    if request.user.is_staff:
+        context['letters'] = search_letters(Letter.objects.all(), query) \
+            .order_by('-date_published', '-id')[:settings.LETTERS_PAGE_SIZE]
+    else:
+        children_list = Student.objects \
+            .filter(profile__user=request.user).select_related('class_group')
+        context['results'] = [
+            (child, search_letters(student_letters(child), query)
+             [:settings.LETTERS_PAGE_SIZE])
+            for child in children_list
+        ]
+
+    return render(request, 'letters/search.html', context)
+
+
+def letters_more(request, student_id: int):
+    """Return the next page of letters concerning a student as JSON.
+
+    Used for loading more letters on the letters overview without
+    reloading the page.
+    Expects the GET parameters 'viewed' ('0' or '1') and 'cursor', as
+    returned for the previous page.
+
+    :param request: Current request
+    :param student_id: ID of student whose letters are returned
+    :type student_id: int
+    :return: JSON response containing the letters and the next cursor
+    """
+
+    if not request.user.is_authenticated or \
+            not hasattr(request.user, 'profile'):
+        return JsonResponse({'error': "Nicht eingeloggt."}, status=403)
+
+    student = get_object_or_404(request.user.profile.children, pk=student_id)
+
+    try:
+        page, cursor = letters_page(student,
+                                    viewed=request.GET.get('viewed') == '1',
+                                    cursor=request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'error': "Ungültiger Cursor."}, status=400)
+
+    return JsonResponse({
+        'letters': [
+            {
+                'id': letter.id,
+                'name': letter.name,
+                'date_published': letter.date_published,
+                'viewed': letter.viewed,
+                'url': reverse('letters:letter_detail',
+                               kwargs={'student_id': student.id,
+                                       'letter_id': letter.id}),
+            }
+            for letter in page
+        ],
+        'cursor': cursor,
+    })
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=letter_detail_etag)
 def letter_detail(request, student_id: int, letter_id: int,
                   confirmation=False):
     """Render detailed information about a certain letter.
@@ -134,15 +253,17 @@ def letter_detail(request, student_id: int, letter_id: int,
             return redirect('letters:letter_detail', student_id=student_id,
                             letter_id=letter_id)
 
-        fields = {f"boolfield-{field.id}": False for field in
-                  list(letter.responseboolfield_set.all())}
-        fields.update({key: request.POST[key] for key in request.POST.keys() if
-                       "field-" in key})
-        response_content = json.dumps(fields)
+        schema = response_schema(letter_id)
+        try:
+            content = schema.validate(schema.from_post(request.POST))
+        except ValueError as e:
+            messages.error(request, str(e))
 
-        Response.objects.create(letter=Letter.objects.get(id=letter_id),
-                                student=Student.objects.get(id=student_id),
-                                content=response_content).save()
+            return redirect('letters:letter_detail', student_id=student_id,
+                            letter_id=letter_id)
+
+        Response.objects.create(letter=letter, student=student,
+                                content=json.dumps(content))
 
         messages.success(request, "Brief wurde erfolgreich bestätigt!")
 
@@ -160,19 +281,88 @@ def letter_detail(request, student_id: int, letter_id: int,
     except Response.DoesNotExist:
         response = None
 
-    context = {'student': student, 'letter': letter, 'response': response}
+    context = {'student': student, 'letter': letter, 'response': response,
+               'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT}
 
     # If letter needs confirmation, add all response fields to context:
     if not response and letter.confirmation:
+        schema = response_schema(letter_id)
         context.update(
-            {"text_fields": list(letter.responsetextfield_set.all()),
-             "bool_fields": list(letter.responseboolfield_set.all()),
-             "selection_fields": list(
-                 letter.responseselectionfield_set.all())})
+            {"text_fields": schema.text_fields,
+             "bool_fields": schema.bool_fields,
+             "selection_fields": schema.selection_fields})
 
     return render(request, 'letters/letter_detail.html', context)
 
 
+def _open_document(user, letter_id, original=False):
+    """Open the document of a letter if a user may read it.
+
+    Staff members may read all documents, parents the documents of
+    published letters concerning one of their children.
+    The optimized variant of the document is opened if there is one.
+
+    :param user: Current user
+    :type user: User
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :param original: Whether to open the original document in any case
+    :type original: bool
+    :return: Opened document and the name of the original document or
+        None if the user may not read it
+    :rtype: tuple
+    """
+
+    letters = Letter.objects.filter(id=letter_id)
+    if not user.is_staff:
+        letters = letters.filter(
+            Q(classes_concerned__student__profile__user=user)
+            | Q(groups_concerned__student__profile__user=user),
+            date_published__lte=timezone.localdate())
+
+    letter = letters.only('document', 'document_hash').first()
+    if letter is None:
+        return None
+
+    document = None if original \
+        else optimized_document(letter.document_hash)
+    if document is None:
+        document = letter.document
+
+    return document.open('rb'), os.path.basename(letter.document.name)
+
+
+async def letter_document(request, letter_id: int):
+    """Serve the document of a letter.
+
+    The view is asynchronous, so that downloads of large documents do not
+    occupy a worker when the project is served via ASGI.
+    The optimized variant of the document is served unless the query
+    parameter 'original' is given.
+
+    :param request: Current request
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: Document of the letter
+    """
+
+    # Loading the user queries the database:
+    user = await sync_to_async(
+        lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        messages.error(request,
+                       "Bitte loggen Sie sich ein, um den Brief zu betrachten!")
+        return redirect('letters:index')
+
+    document = await sync_to_async(_open_document)(
+        user, letter_id, 'original' in request.GET)
+    if document is None:
+        raise Http404("Dokument nicht gefunden")
+
+    file, name = document
+    return FileResponse(file, filename=name)
+
+
 @staff_member_required
 def letter_result(request, letter_id):
     """Render information about the responses to a letter.
@@ -187,30 +377,116 @@ def letter_result(request, letter_id):
     :return: Results page of that letter
     """
 
+    from .tables import LetterResultTable, ResponseColumn
+
+    try:
+        letter = Letter.objects.get(pk=letter_id)
+    except Letter.DoesNotExist:
+        # The letter may have been moved to the archive, the latest one if
+        # its ID has been reused:
+        archived = ArchivedLetter.objects.filter(original_id=letter_id) \
+            .order_by('-date_archived', '-id').first()
+        if archived is None:
+            raise Http404("Brief nicht gefunden")
+        return redirect('letters:archived_letter_result',
+                        archived_id=archived.id)
+
+    schema = response_schema(letter_id)
+    content = Response.objects.filter(letter_id=letter_id,
+                                      student=OuterRef('pk')).values('content')
+    # Ordered and paginated by the database, so only the rows of the page
+    # shown are fetched:
+    data = result_students(letter_id).values(
+        'last_name', 'first_name', class_grp=F('class_group__name'),
+        confirmed=Case(When(responded=True, then=Value("Ja")),
+                       default=Value("Nein")),
+        content=Subquery(content[:1])) \
+        .order_by('-responded', 'class_group__name', 'last_name', 'first_name')
+
+    extra_columns = [(name, ResponseColumn(schema, name,
+                                           verbose_name=description))
+                     for name, description in schema.columns()]
+    table = LetterResultTable(data, extra_columns=extra_columns)
+
+    RequestConfig(request).configure(table)
+
+    students = audience(letter_id)
+    responses = confirmed(letter_id)
+
+    return render(request, 'letters/letter_result.html',
+                  {'table': table, 'letter': letter,
+                   'confirmed_count': count(responses),
+                   'outstanding_count': count(students & ~responses),
+                   'import_form': ResponseImportForm()})
+
+
+@staff_member_required
+@require_POST
+def letter_result_import(request, letter_id):
+    """Import paper responses to a letter from a csv file.
+
+    See response_import for the format of the file.
+
+    :param request: Current request
+    :param letter_id: ID of the letter
+    :type letter_id: int
+    :return: Results page of that letter
+    """
+
+    from .response_import import import_responses, ResponseImportError
+
     letter = get_object_or_404(Letter, pk=letter_id)
+    form = ResponseImportForm(request.POST, request.FILES)
+
+    if not letter.confirmation:
+        messages.error(request, "Dieser Brief muss nicht bestätigt werden!")
+    elif not form.is_valid():
+        messages.error(request, "Bitte wählen Sie eine gültige csv-Datei aus.")
+    else:
+        try:
+            result = import_responses(request.FILES['responses_file'], letter)
+        except ResponseImportError as e:
+            for error in e.errors:
+                messages.error(request, error)
+        else:
+            messages.success(request, f"{len(result.created)} Bestätigungen "
+                                      f"wurden importiert.")
+            for conflict in result.conflicts:
+                messages.warning(request, conflict)
+
+    return redirect('letters:letter_result', letter_id=letter_id)
+
+
+@staff_member_required
+def archived_letter_result(request, archived_id):
+    """Render information about the responses to an archived letter.
+
+    Archived letters have their own URL, as the ID of the original letter
+    may have been reused by a current one.
+    May only be viewed by staff members.
 
-    data = [r.as_dict() for r in
-            Response.objects.filter(letter__pk=letter_id)] + [
-               {
-                   'last_name': s.last_name,
-                   'first_name': s.first_name,
-                   'class_grp': s.class_group,
-                   'confirmed': "Nein"
-               }
-               for s in letter.students_not_confirmed
-           ]
-
-    extra_columns = [(field.name, Column(verbose_name=field.description)) for
-                     field in
-                     letter.responseboolfield_set.all()] + \
-                    [(field.name, Column(verbose_name=field.description)) for
-                     field in
-                     letter.responseselectionfield_set.all()]
+    :param request: Current request
+    :param archived_id: ID of the archived letter
+    :type archived_id: int
+    :return: Results page of that letter
+    """
+
+    from .tables import LetterResultTable
+
+    letter = get_object_or_404(ArchivedLetter, pk=archived_id)
+    response_fields = json.loads(letter.response_fields)
+
+    data = [r.as_dict(response_fields) for r in
+            letter.archivedresponse_set.all()]
+
+    extra_columns = [(field['name'], Column(verbose_name=field['description']))
+                     for field in response_fields if field['type'] != 'text']
     table = LetterResultTable(data, extra_columns=extra_columns)
 
     RequestConfig(request).configure(table)
 
-    return render(request, 'letters/letter_result.html', {'table': table})
+    return render(request, 'letters/letter_result.html',
+                  {'table': table, 'letter': letter, 'archived': True})
 
 
 def login(request):
@@ -225,6 +501,12 @@ def login(request):
         # Retrieve credentials from POST arguments:
         username = request.POST['LoginFormUsername']
         password = request.POST['LoginFormPassword']
+
+        # Reject guessing before computing the password's hash:
+        if throttled(request, username):
+            messages.error(request, THROTTLED_MESSAGE)
+            return redirect('letters:index')
+
         # Check whether the credentials are correct:
         user = authenticate(request, username=username, password=password)
 
@@ -264,6 +546,10 @@ def user_import(request):
     :return: User import page
     """
 
+    from .tables import UserImportParentsTable, UserImportStudentsTable
+    from .user_import import UserImportError, read_parents, read_students, \
+        create_parent, create_student
+
     if request.method == 'POST':
         # Bind data to form:
         form = UserImportForm(request.POST, request.FILES)